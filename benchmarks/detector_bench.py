@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+HTTP detector micro-benchmark
+per-request scan cost as the rule count grows, for the Aho-Corasick
+detector, one combined regex and the old loop of substring checks
+
+    python benchmarks/detector_bench.py --rules 10 100 1000 5000
+"""
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from honeypot.detection import HTTPDetector, Rule, load_rules
+
+REGEX_MAX_RULES = 1000
+
+# (path, query, body) triples shaped like what scanners send
+REQUESTS = [
+    ("/", "", ""),
+    ("/wp-login.php", "", "log=admin&pwd=123456&wp-submit=log+in&redirect_to=/wp-admin/"),
+    ("/index.php", "id=1' or 1=1-- union select username,password from wp_users", ""),
+    ("/cgi-bin/../../../../etc/passwd", "", ""),
+    ("/search", "q=" + "a" * 200, ""),
+    ("/api/v1/upload", "", "data=" + "x" * 1000 + "${jndi:ldap://example/a}"),
+]
+
+
+def synthetic_rules(base, count, seed=1):
+    """The real rules padded with random tokens up to count rules"""
+    rng = random.Random(seed)
+    rules = list(base)[:count]
+    while len(rules) < count:
+        token = "".join(rng.choices(string.ascii_lowercase + "/_-.=", k=rng.randint(5, 16)))
+        rules.append(Rule(f"synthetic-{len(rules)}", rng.choice(("path", "query", "body", "any")), token))
+    return rules
+
+
+class NaiveDetector:
+    """The original approach: lower() each field, one `in` check per rule"""
+    def __init__(self, rules):
+        self.rules = rules
+
+    def scan(self, path="", query="", body=""):
+        fields = {"path": path.lower(), "query": query.lower(), "body": body.lower()}
+        hits = []
+        for rule in self.rules:
+            haystacks = fields.values() if rule.scope == "any" else (fields[rule.scope],)
+            if any(rule.pattern in haystack for haystack in haystacks):
+                hits.append(rule.id)
+        return hits
+
+
+class RegexDetector:
+    """One alternation per scope, the regex engine tries each branch in turn"""
+    def __init__(self, rules):
+        self.rules = rules
+        self.compiled = {}
+        for scope in ("path", "query", "body"):
+            groups = "|".join(
+                f"(?P<r{i}>{re.escape(r.pattern)})" for i, r in enumerate(rules) if r.scope in (scope, "any")
+            )
+            if groups:
+                self.compiled[scope] = re.compile(groups, re.IGNORECASE)
+
+    def scan(self, path="", query="", body=""):
+        hits = set()
+        for scope, text in (("path", path), ("query", query), ("body", body)):
+            pattern = self.compiled.get(scope)
+            if pattern is None or not text:
+                continue
+            # finditer reports non-overlapping matches only, like most regex setups
+            for match in pattern.finditer(text):
+                hits.add(self.rules[int(match.lastgroup[1:])].id)
+        return list(hits)
+
+
+def time_detector(detector, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for path, query, body in REQUESTS:
+            detector.scan(path, query, body)
+    return (time.perf_counter() - start) / (rounds * len(REQUESTS))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP detector micro-benchmark")
+    parser.add_argument("--rules", type=int, nargs="*", default=[10, 100, 1000, 5000],
+                        help="rule counts to test (default: 10 100 1000 5000)")
+    parser.add_argument("--rounds", type=int, default=200, help="passes over the sample requests (default: 200)")
+    args = parser.parse_args()
+
+    base = load_rules()
+    print(f"{'rules':>6} {'build ms':>9} {'aho-corasick us':>16} {'regex us':>10} {'naive us':>10}")
+    for count in args.rules:
+        rules = synthetic_rules(base, count)
+
+        start = time.perf_counter()
+        detector = HTTPDetector(rules)
+        build = time.perf_counter() - start
+
+        aho = time_detector(detector, args.rounds)
+        naive = time_detector(NaiveDetector(rules), args.rounds)
+        # the alternation gets so slow past this point that it only stalls the run
+        if count <= REGEX_MAX_RULES:
+            regex = f"{time_detector(RegexDetector(rules), args.rounds) * 1e6:>10.1f}"
+        else:
+            regex = f"{'-':>10}"
+        print(f"{count:>6} {build * 1000:>9.1f} {aho * 1e6:>16.1f} {regex} {naive * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+HTTP engine benchmark
+serves the WordPress app with each engine and hammers it from a local
+asyncio client, reporting req/s and latency percentiles. Clients reuse
+their connection whenever the server allows keep-alive
+
+    python benchmarks/http_engine_bench.py --requests 5000 --concurrency 50
+    python benchmarks/http_engine_bench.py --delay 0.3   # with the artificial delay
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from honeypot import http_honeypot
+
+ENGINES = ("werkzeug", "async")
+PATHS = ("/", "/wp-login.php", "/wp-admin", "/xmlrpc.php")
+
+
+def run_server(engine, port, delay):
+    logger = logging.getLogger("bench")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    if not delay:
+        # measure the engine itself, without the per-route latency
+        load_personas = http_honeypot.load_personas
+
+        def without_delays(root, logger):
+            personas = load_personas(root, logger)
+            for persona in personas.values():
+                persona.delays = {}
+            return personas
+        http_honeypot.load_personas = without_delays
+    args = argparse.Namespace(http_port=port, http_engine=engine, http_delay=delay, http_delay_jitter=0.0)
+    http_honeypot.start_http_honeypot(args, logger)
+
+
+async def fetch(conn, host, port, path):
+    """Send one GET, reconnecting first if needed. Returns the connection to reuse, or None"""
+    if conn is None:
+        conn = await asyncio.open_connection(host, port)
+    reader, writer = conn
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n".encode())
+    head = await reader.readuntil(b"\r\n\r\n")
+
+    length = None
+    keep_alive = True
+    for line in head.decode("latin-1").split("\r\n")[1:]:
+        name, _, value = line.partition(":")
+        name = name.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "connection" and value.strip().lower() == "close":
+            keep_alive = False
+
+    if length is None:
+        await reader.read()
+        keep_alive = False
+    else:
+        await reader.readexactly(length)
+
+    if not keep_alive:
+        writer.close()
+        return None
+    return conn
+
+
+async def client(host, port, counter, total, latencies, errors):
+    conn = None
+    while counter[0] < total:
+        path = PATHS[counter[0] % len(PATHS)]
+        counter[0] += 1
+        start = time.perf_counter()
+        try:
+            conn = await fetch(conn, host, port, path)
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            errors[0] += 1
+            conn = None
+            continue
+        latencies.append(time.perf_counter() - start)
+    if conn is not None:
+        conn[1].close()
+
+
+async def load(host, port, total, concurrency):
+    counter, errors, latencies = [0], [0], []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, counter, total, latencies, errors) for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies, errors[0]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def wait_for_port(host, port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP engine benchmark")
+    parser.add_argument("--requests", type=int, default=3000, help="requests per engine (default: 3000)")
+    parser.add_argument("--concurrency", type=int, default=50, help="concurrent clients (default: 50)")
+    parser.add_argument("--delay", type=float, default=0.0, help="artificial response delay (default: 0)")
+    parser.add_argument("--port", type=int, default=18099, help="local port to use (default: 18099)")
+    parser.add_argument("--engines", nargs="*", choices=ENGINES, help="only run these engines")
+    args = parser.parse_args()
+
+    print(f"{'engine':<10} {'requests':>9} {'errors':>7} {'req/s':>9} "
+          f"{'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for port_offset, engine in enumerate(ENGINES):
+        if args.engines and engine not in args.engines:
+            continue
+        port = args.port + port_offset
+        server = multiprocessing.Process(target=run_server, args=(engine, port, args.delay), daemon=True)
+        server.start()
+        if not wait_for_port("127.0.0.1", port):
+            print(f"{engine:<10} server did not start")
+            server.terminate()
+            continue
+
+        wall, latencies, errors = asyncio.run(load("127.0.0.1", port, args.requests, args.concurrency))
+        server.terminate()
+        server.join(5)
+
+        if not latencies:
+            print(f"{engine:<10} {0:>9} {errors:>7} no successful requests")
+            continue
+        print(f"{engine:<10} {len(latencies):>9} {errors:>7} {len(latencies) / wall:>9.1f} "
+              f"{percentile(latencies, 50) * 1000:>9.2f} {percentile(latencies, 99) * 1000:>9.2f} "
+              f"{max(latencies) * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
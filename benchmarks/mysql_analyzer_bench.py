@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+MySQL query analyzer benchmark
+worst case cost per query for the compiled analyzer and for the old loop
+of re.search calls, on inputs built to make backtracking regexes blow up
+
+    python benchmarks/mysql_analyzer_bench.py --lengths 250 500 1000 65536
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from honeypot.query_analyzer import QueryAnalyzer
+
+# '.*or.*'.*='.* is cubic on the quote-or input, 1000 characters already take seconds
+REGEX_MAX_LENGTH = 1000
+
+# the patterns and substring checks _analyze_query used to run
+OLD_PATTERNS = [
+    r"'.*or.*'.*='.*", r"union.*select", r"sleep\s*\(\d+\)", r"benchmark\s*\(",
+    r"load_file\s*\(.*\)", r"into\s+outfile", r"into\s+dumpfile", r"xp_cmdshell",
+    r"exec\s*\(", r"--\s*$", r"/\*.*\*/",
+]
+OLD_SUBSTRINGS = [
+    "drop table", "drop database", "delete from", "truncate table",
+    "grant ", "revoke ", "create user", "alter user",
+]
+
+# name -> unit repeated up to the wanted length
+INPUTS = {
+    "quote-or": "'or",
+    "union": "union ",
+    "load_file": "load_file(",
+    "comment": "/*",
+    "sleep": "sleep(1",
+    "benign": "select id, name from users where id = 42 and ",
+}
+
+
+def old_analyze(query):
+    query_lower = query.lower()
+    hits = [p for p in OLD_PATTERNS if re.search(p, query_lower, re.IGNORECASE)]
+    return hits + [s for s in OLD_SUBSTRINGS if s in query_lower]
+
+
+def time_call(func, query, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(query)
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MySQL query analyzer benchmark")
+    parser.add_argument("--lengths", type=int, nargs="*", default=[250, 500, 1000, 4096, 65536, 1 << 20],
+                        help="query lengths to test (default: 250 500 1000 4096 65536 1048576)")
+    parser.add_argument("--rounds", type=int, default=3, help="calls per measurement (default: 3)")
+    args = parser.parse_args()
+
+    analyzer = QueryAnalyzer.from_file()
+    print(f"{'input':<10} {'length':>8} {'compiled ms':>12} {'regex ms':>10}")
+    for name, unit in INPUTS.items():
+        for length in args.lengths:
+            query = (unit * (length // len(unit) + 1))[:length]
+            new = time_call(analyzer.analyze, query, args.rounds)
+            # past this the old analyzer only stalls the run
+            if length <= REGEX_MAX_LENGTH:
+                old = f"{time_call(old_analyze, query, args.rounds) * 1000:>10.2f}"
+            else:
+                old = f"{'-':>10}"
+            print(f"{name:<10} {length:>8} {new * 1000:>12.2f} {old}")
+
+
+if __name__ == "__main__":
+    main()
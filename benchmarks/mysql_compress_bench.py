@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+MySQL compressed protocol benchmark
+bytes on the wire and CPU per row of large fake table result sets, sent
+as they are and through CompressedStream, plus what inflating them costs
+the client
+
+    python benchmarks/mysql_compress_bench.py --rows 100000 --tables wp_users transactions
+"""
+import argparse
+import os
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from honeypot.mysql_honeypot import MySQLHoneypot
+from honeypot.mysql_protocol import COMPRESSED_HEADER_SIZE, CompressedStream, PacketReader
+
+
+def inflate(data):
+    """What a client does with the compressed packets"""
+    pos = 0
+    total = 0
+    while pos < len(data):
+        length = int.from_bytes(data[pos:pos + 3], "little")
+        raw_length = int.from_bytes(data[pos + 4:pos + 7], "little")
+        payload = data[pos + COMPRESSED_HEADER_SIZE:pos + COMPRESSED_HEADER_SIZE + length]
+        total += len(zlib.decompress(payload)) if raw_length else len(payload)
+        pos += COMPRESSED_HEADER_SIZE + length
+    return total
+
+
+def run(honeypot, query, compress, level):
+    """(bytes sent, seconds spent building them, seconds to inflate)"""
+    transport = CompressedStream(PacketReader(), level=level) if compress else None
+    key = honeypot._result_key(query.lower())
+    start = time.process_time()
+    chunks = list(honeypot._chunks(honeypot._rows(key, 1), transport))
+    elapsed = time.process_time() - start
+
+    inflated = 0.0
+    if compress:
+        start = time.process_time()
+        for chunk in chunks:
+            inflate(chunk)
+        inflated = time.process_time() - start
+    return sum(map(len, chunks)), elapsed, inflated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MySQL compressed protocol benchmark")
+    parser.add_argument("--rows", type=int, default=50000, help="rows per result set (default: 50000)")
+    parser.add_argument("--tables", nargs="*", default=["wp_users", "transactions", "wp_posts", "sessions"],
+                        help="fake tables to select from (default: wp_users transactions wp_posts sessions)")
+    parser.add_argument("--level", type=int, default=6, help="zlib level (default: 6)")
+    args = parser.parse_args()
+
+    honeypot = MySQLHoneypot()
+    print(f"{'table':<14} {'rows':>8} {'mode':<6} {'bytes/row':>10} {'ratio':>6} {'server us/row':>14} {'client us/row':>14}")
+    for table in args.tables:
+        database = next((db for db, tables in honeypot.fake_tables.items() if table in tables), None)
+        if database is None:
+            print(f"{table}: not in fake_tables")
+            continue
+        query = f"SELECT * FROM {database}.{table} LIMIT {args.rows}"
+        rows = min(honeypot._table_spec(database, table)[0].row_count, args.rows)
+        plain, _, _ = run(honeypot, query, False, args.level)
+        for compress in (False, True):
+            size, elapsed, inflated = run(honeypot, query, compress, args.level)
+            print(f"{table:<14} {rows:>8} {'zlib' if compress else 'plain':<6} {size / rows:>10.1f} "
+                  f"{plain / size:>6.2f} {elapsed / rows * 1e6:>14.2f} {inflated / rows * 1e6:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+MySQL SELECT dispatch benchmark
+time for the honeypot to pick the answer to a query (statement split,
+analysis and fake table lookup) on whitespace-heavy inputs that make
+backtracking patterns quadratic. Exits 1 when a query takes longer than
+--max-ms, so it doubles as a regression check
+
+    python benchmarks/mysql_select_bench.py --lengths 5000 20000 65536
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from honeypot.mysql_honeypot import MySQLHoneypot
+from honeypot.mysql_session import MySQLSession
+
+# name -> (head, unit repeated up to the wanted length, tail)
+INPUTS = {
+    "no-from": ("select a", " ", "x"),
+    "after-table": ("select * from wp_users", " ", "x"),
+    "after-limit": ("select * from wp_users limit 5", " ", "x"),
+    "after-dot": ("select * from `wordpress`", " ", "x"),
+    "fields": ("select ", "a ", "from wp_users"),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MySQL SELECT dispatch benchmark")
+    parser.add_argument("--lengths", type=int, nargs="*", default=[5000, 20000, 65536, 1 << 20],
+                        help="query lengths to test (default: 5000 20000 65536 1048576)")
+    parser.add_argument("--max-ms", type=float, default=250.0,
+                        help="slowest acceptable query in ms (default: 250)")
+    args = parser.parse_args()
+
+    honeypot = MySQLHoneypot()
+    session = MySQLSession(1, "127.0.0.1")
+    session.database = "wordpress"
+    slowest = 0.0
+    print(f"{'input':<12} {'length':>8} {'ms':>10}")
+    for name, (head, unit, tail) in INPUTS.items():
+        for length in args.lengths:
+            query = head + unit * ((length - len(head) - len(tail)) // len(unit)) + tail
+            start = time.perf_counter()
+            response = honeypot._handle_query(session, 1, query)
+            if not isinstance(response, bytes):
+                # streamed rows, only the first batch counts
+                next(response)
+            elapsed = (time.perf_counter() - start) * 1000
+            slowest = max(slowest, elapsed)
+            print(f"{name:<12} {len(query):>8} {elapsed:>10.2f}")
+
+    if slowest > args.max_ms:
+        print(f"slowest query took {slowest:.2f} ms, more than {args.max_ms} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
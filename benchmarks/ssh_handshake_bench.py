@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+SSH handshake benchmark
+measures how many key exchanges per second one core can serve for each
+algorithm profile / host key combination, using a local paramiko client
+
+    python benchmarks/ssh_handshake_bench.py --count 200
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import time
+
+import paramiko
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from honeypot.ssh_honeypot import (ALGORITHM_PROFILES, DEFAULT_BANNER,
+                                   apply_algorithm_profile, load_host_keys)
+
+# (profile, host key types) pairs to compare, the first one is the old setup
+SCENARIOS = [
+    ("paramiko", ("rsa",)),
+    ("paramiko", ("ed25519", "ecdsa", "rsa")),
+    ("openssh", ("ed25519", "ecdsa", "rsa")),
+    ("fast", ("ed25519",)),
+    ("fast", ("ecdsa",)),
+]
+
+
+class BenchServer(paramiko.ServerInterface):
+    def get_allowed_auths(self, username):
+        return "password"
+
+
+def run_server(port, profile, key_types, key_dir, count, ready, results):
+    os.chdir(key_dir)
+    host_keys = load_host_keys(key_types, logging.getLogger("bench"))
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", port))
+    sock.listen(128)
+    ready.set()
+
+    negotiated = None
+    cpu_start = time.process_time()
+    for _ in range(count):
+        client, _ = sock.accept()
+        transport = paramiko.Transport(client)
+        for host_key in host_keys:
+            transport.add_server_key(host_key)
+        apply_algorithm_profile(transport, profile)
+        transport.local_version = DEFAULT_BANNER
+
+        try:
+            transport.start_server(server=BenchServer())
+        except (paramiko.SSHException, EOFError, OSError):
+            # the client may hang up before our side has seen its NEWKEYS
+            pass
+        if negotiated is None:
+            negotiated = (transport.host_key_type, transport.remote_cipher, transport.remote_mac)
+        # wait for the client to hang up
+        transport.join(10)
+        transport.close()
+        client.close()
+    cpu_used = time.process_time() - cpu_start
+
+    sock.close()
+    results.put((cpu_used, negotiated))
+
+
+def run_scenario(port, profile, key_types, key_dir, count):
+    ready = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    server = multiprocessing.Process(
+        target=run_server,
+        args=(port, profile, key_types, key_dir, count, ready, results),
+        daemon=True
+    )
+    server.start()
+    ready.wait(30)
+
+    wall_start = time.perf_counter()
+    for _ in range(count):
+        sock = socket.create_connection(("127.0.0.1", port))
+        transport = paramiko.Transport(sock)
+        transport.start_client(timeout=10)
+        transport.close()
+    wall = time.perf_counter() - wall_start
+
+    cpu_used, (host_key_type, cipher, mac) = results.get(timeout=60)
+    server.join(10)
+    return {
+        "wall_rate": count / wall,
+        "cpu_per_handshake": cpu_used / count,
+        "core_rate": count / cpu_used if cpu_used else float("inf"),
+        "host_key": host_key_type,
+        "cipher": cipher,
+        "mac": mac,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSH handshake benchmark")
+    parser.add_argument("--count", type=int, default=100, help="handshakes per scenario (default: 100)")
+    parser.add_argument("--port", type=int, default=22299, help="local port to use (default: 22299)")
+    parser.add_argument("--profiles", nargs="*", choices=sorted(ALGORITHM_PROFILES),
+                        help="only run scenarios using these profiles")
+    args = parser.parse_args()
+
+    logging.getLogger("paramiko").setLevel(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as key_dir:
+        # generate the keys once, outside of the measured runs
+        os.chdir(key_dir)
+        load_host_keys(("ed25519", "ecdsa", "rsa"), logging.getLogger("bench"))
+
+        print(f"{'profile':<10} {'host keys':<20} {'negotiated':<56} "
+              f"{'wall hs/s':>10} {'cpu ms/hs':>10} {'hs/s/core':>10}")
+        for port_offset, (profile, key_types) in enumerate(SCENARIOS):
+            if args.profiles and profile not in args.profiles:
+                continue
+            result = run_scenario(args.port + port_offset, profile, key_types, key_dir, args.count)
+            negotiated = f"{result['host_key']}/{result['cipher']}/{result['mac']}"
+            print(f"{profile:<10} {','.join(key_types):<20} {negotiated:<56} "
+                  f"{result['wall_rate']:>10.1f} {result['cpu_per_handshake'] * 1000:>10.2f} "
+                  f"{result['core_rate']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,14 +18,36 @@ if not os.path.exists(LOG_DIR):
 # SSH Configuration
 SSH_PORT = 2222
 SSH_BANNER = "SSH-2.0-OpenSSH_8.9p1 Ubuntu-3ubuntu0.6"
+SSH_MAX_SESSIONS = 100
+SSH_BACKLOG = 128
+SSH_OVERLOAD_POLICY = "banner"  # reject, queue or banner
+SSH_QUEUE_TIMEOUT = 5.0
+SSH_RATE_LIMIT = 0.5  # new connections per second per IP
+SSH_RATE_BURST = 10
+SSH_TARPIT_MAX = 4096
+SSH_ALGORITHM_PROFILE = "openssh"  # paramiko, openssh or fast
+SSH_HOST_KEY_TYPES = ("ed25519", "ecdsa", "rsa")
 
 # HTTP Configuration
 HTTP_DEFAULT_PORT = 8080
-DEFAULT_SERVICE = "wordpress"
+DEFAULT_SERVICE = "wordpress"  # default HTTP persona
+HTTP_PERSONAS_DIR = os.path.join(BASE_DIR, "personas")
+HTTP_DELAY = 0.3  # seconds, per-route overrides live in each persona.json
+HTTP_DELAY_JITTER = 0.1
+HTTP_RULES_FILE = os.path.join(BASE_DIR, "config", "http_rules.txt")
+HTTP_BODY_DIR = os.path.join(BASE_DIR, "captures", "bodies")
+HTTP_MAX_BODY_MB = 8
+HTTP_BODY_STORE_MB = 1024
+HTTP_ENGINE = "async"  # async or werkzeug
+HTTP_WORKERS = 16
+HTTP_MAX_CONNECTIONS = 1024
+HTTP_KEEPALIVE_TIMEOUT = 5.0
 
 # MySQL Configuration
 MYSQL_PORT = 3306
 MYSQL_VERSION = "8.0.29"
+MYSQL_RULES_FILE = os.path.join(BASE_DIR, "config", "mysql_rules.txt")
+MYSQL_ENGINE = "async"  # async or threaded
 
 # RDP Configuration
 RDP_PORT = 3389
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Content-addressed storage for HTTP request bodies
+bodies are streamed to disk in fixed size chunks while being hashed, and
+stored once per SHA-256 no matter how many bots send the same payload.
+The app then reads the body back from the stored file, so memory use does
+not depend on the body size
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+CHUNK_SIZE = 65536
+HEAD_SIZE = 65536  # kept in memory for the detector
+
+
+class BodyRecord:
+    """What the store knows about one request body"""
+    __slots__ = ("sha256", "size", "stored_size", "truncated", "new", "path", "head")
+
+    def __init__(self, sha256, size, stored_size, truncated, new, path, head):
+        self.sha256 = sha256
+        self.size = size
+        self.stored_size = stored_size
+        self.truncated = truncated
+        self.new = new
+        self.path = path  # None if the store was full
+        self.head = head
+
+    def to_dict(self):
+        return {
+            "sha256": self.sha256,
+            "size": self.size,
+            "stored_size": self.stored_size,
+            "truncated": self.truncated,
+            "new": self.new,
+        }
+
+
+class BodyStore:
+    """
+    <directory>/<first two hex digits>/<sha256>, bodies longer than
+    max_body_size are cut there (the hash covers what was kept), and once
+    max_total_size is reached new bodies are hashed but not kept
+    """
+    def __init__(self, directory, logger, max_body_size=8 << 20, max_total_size=1 << 30):
+        self.directory = Path(directory)
+        self.tmp_dir = self.directory / "tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self.logger = logger
+        self.max_body_size = max_body_size
+        self.max_total_size = max_total_size
+
+        self.lock = threading.Lock()
+        self.total_size = sum(
+            path.stat().st_size for path in self.directory.glob("??/*") if path.is_file()
+        )
+
+    def path_for(self, sha256):
+        return self.directory / sha256[:2] / sha256
+
+    def capture(self, stream, length=None):
+        """
+        Read a body from stream (at most length bytes if given) into the store
+        returns (BodyRecord, open file holding the kept bytes)
+        """
+        digest = hashlib.sha256()
+        head = bytearray()
+        size = 0
+        stored = 0
+        fd, tmp_name = tempfile.mkstemp(dir=self.tmp_dir)
+        spool = os.fdopen(fd, "w+b")
+        try:
+            while length is None or size < length:
+                want = CHUNK_SIZE if length is None else min(CHUNK_SIZE, length - size)
+                chunk = stream.read(want)
+                if not chunk:
+                    break
+                size += len(chunk)
+                # past the cap the rest is read and dropped
+                keep = chunk[:max(0, self.max_body_size - stored)]
+                if keep:
+                    digest.update(keep)
+                    spool.write(keep)
+                    stored += len(keep)
+                    if len(head) < HEAD_SIZE:
+                        head += keep[:HEAD_SIZE - len(head)]
+            spool.flush()
+        except BaseException:
+            spool.close()
+            os.unlink(tmp_name)
+            raise
+
+        sha256 = digest.hexdigest()
+        path = self.path_for(sha256)
+        new = False
+        with self.lock:
+            if path.exists():
+                os.unlink(tmp_name)
+            elif self.total_size + stored <= self.max_total_size:
+                path.parent.mkdir(exist_ok=True)
+                os.replace(tmp_name, path)
+                self.total_size += stored
+                new = True
+            else:
+                # store full: the temp file only lives as long as the request
+                os.unlink(tmp_name)
+                path = None
+
+        spool.seek(0)
+        record = BodyRecord(sha256, size, stored, size > stored, new, path, bytes(head))
+        if new:
+            self.logger.info(
+                f"Stored new HTTP body {sha256} ({stored} bytes{', truncated' if record.truncated else ''})",
+                extra={'body': record}
+            )
+        return record, spool
+
+    def wsgi(self, app):
+        """Wrap a WSGI app so every request body goes through the store first"""
+        def middleware(environ, start_response):
+            try:
+                length = int(environ.get("CONTENT_LENGTH") or 0)
+            except ValueError:
+                length = 0
+            chunked = environ.get("HTTP_TRANSFER_ENCODING", "").lower() == "chunked"
+            if length <= 0 and not chunked:
+                return app(environ, start_response)
+
+            record, spool = self.capture(environ["wsgi.input"], None if chunked else length)
+            # the app reads the kept bytes back from disk, not from the socket
+            environ["wsgi.input"] = spool
+            environ["CONTENT_LENGTH"] = str(record.stored_size)
+            environ.pop("HTTP_TRANSFER_ENCODING", None)
+            environ["honeypot.body"] = record
+            try:
+                return app(environ, start_response)
+            finally:
+                spool.close()
+        return middleware
@@ -3,12 +3,27 @@
 Here we read the cmd line args and validate them and print the banner with config
 """
 import argparse
+import os
 import sys
 from colorama import init, Fore, Style
 
+from config import settings
+
 # init colorama
 init(autoreset=True)
 
+def persona_mapping(key_type):
+    """argparse type for KEY=PERSONA pairs"""
+    def parse(value):
+        key, sep, name = value.partition("=")
+        if not sep or not key or not name:
+            raise argparse.ArgumentTypeError(f"expected KEY=PERSONA, got '{value}'")
+        try:
+            return key_type(key.strip()), name.strip()
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid key in '{value}'")
+    return parse
+
 def create_parser():
     parser = argparse.ArgumentParser(
         description='Multi-Service Honeypot System',
@@ -34,7 +49,7 @@ def create_parser():
     parser.add_argument(
         "--http",
         action="store_true", 
-        help="Start HTTP honeypot (WordPress)"
+        help="Start HTTP honeypot, see --http-persona"
     )
     parser.add_argument(
         "--mysql",
@@ -59,24 +74,185 @@ def create_parser():
         default=2222,
         help="Port for SSH honeypot (default: 2222)"
     )
+    parser.add_argument(
+        "--ssh-max-sessions",
+        type=int,
+        default=settings.SSH_MAX_SESSIONS,
+        help="Max concurrent SSH sessions (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--ssh-backlog",
+        type=int,
+        default=settings.SSH_BACKLOG,
+        help="SSH listen backlog (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--ssh-overload",
+        choices=["reject", "queue", "banner"],
+        default=settings.SSH_OVERLOAD_POLICY,
+        help="What to do with SSH connections over the limit (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--ssh-queue-timeout",
+        type=float,
+        default=settings.SSH_QUEUE_TIMEOUT,
+        help="Seconds a queued SSH connection may wait for a worker (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--ssh-rate-limit",
+        type=float,
+        default=settings.SSH_RATE_LIMIT,
+        help="New SSH connections per second allowed per IP, 0 disables (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--ssh-rate-burst",
+        type=int,
+        default=settings.SSH_RATE_BURST,
+        help="SSH connections an IP may open in a burst (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--ssh-tarpit-max",
+        type=int,
+        default=settings.SSH_TARPIT_MAX,
+        help="Max connections held in the SSH tarpit (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--ssh-algorithms",
+        choices=["paramiko", "openssh", "fast"],
+        default=settings.SSH_ALGORITHM_PROFILE,
+        help="SSH kex/host key/cipher profile (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--ssh-host-keys",
+        type=lambda value: tuple(v.strip() for v in value.split(",") if v.strip()),
+        default=settings.SSH_HOST_KEY_TYPES,
+        help="Comma separated SSH host key types: ed25519, ecdsa, rsa (default: all)"
+    )
     parser.add_argument(
         "--http-port", 
         type=int,
         default=8080,
         help="Port for HTTP honeypot (default: 8080)"
     )
+    parser.add_argument(
+        "--http-delay",
+        type=float,
+        default=settings.HTTP_DELAY,
+        help="Artificial HTTP response delay in seconds (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--http-delay-jitter",
+        type=float,
+        default=settings.HTTP_DELAY_JITTER,
+        help="Random +/- jitter added to the HTTP delay (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--http-rules",
+        default=None,
+        help="HTTP detection rules file (default: config/http_rules.txt)"
+    )
+    parser.add_argument(
+        "--http-body-dir",
+        default=None,
+        help="Directory for captured HTTP request bodies (default: captures/bodies)"
+    )
+    parser.add_argument(
+        "--http-max-body",
+        type=int,
+        default=settings.HTTP_MAX_BODY_MB,
+        help="MiB of each HTTP request body kept, the rest is dropped (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--http-body-store",
+        type=int,
+        default=settings.HTTP_BODY_STORE_MB,
+        help="MiB of disk the HTTP body store may use (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--http-persona",
+        default=settings.DEFAULT_SERVICE,
+        help="Default HTTP persona: wordpress, jenkins, phpmyadmin, tomcat (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--http-persona-port",
+        dest="http_persona_ports",
+        type=persona_mapping(int),
+        action="append",
+        default=[],
+        metavar="PORT=PERSONA",
+        help="Also listen on PORT as PERSONA, can be repeated"
+    )
+    parser.add_argument(
+        "--http-persona-host",
+        dest="http_persona_hosts",
+        type=persona_mapping(str.lower),
+        action="append",
+        default=[],
+        metavar="HOST=PERSONA",
+        help="Serve PERSONA to requests for the Host header HOST, can be repeated"
+    )
+    parser.add_argument(
+        "--http-personas-dir",
+        default=None,
+        help="Directory holding the HTTP personas (default: personas/)"
+    )
+    parser.add_argument(
+        "--http-log-noise",
+        action="store_true",
+        help="Log every scanner probe in full instead of answering known noise paths early"
+    )
+    parser.add_argument(
+        "--http-engine",
+        choices=["async", "werkzeug"],
+        default=settings.HTTP_ENGINE,
+        help="HTTP server engine (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--http-workers",
+        type=int,
+        default=settings.HTTP_WORKERS,
+        help="Threads running the HTTP app for the async engine (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--http-max-connections",
+        type=int,
+        default=settings.HTTP_MAX_CONNECTIONS,
+        help="Max open HTTP connections for the async engine (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--http-keepalive",
+        type=float,
+        default=settings.HTTP_KEEPALIVE_TIMEOUT,
+        help="Seconds an idle HTTP keep-alive connection stays open (default: %(default)s)"
+    )
     parser.add_argument(
         "--mysql-port",
         type=int,
         default=3306,
         help="MySQL port (default: 3306)"
     )
+    parser.add_argument(
+        "--mysql-engine",
+        choices=["async", "threaded"],
+        default=settings.MYSQL_ENGINE,
+        help="MySQL server engine: one event loop or a thread per client (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--mysql-rules",
+        default=None,
+        help="MySQL query rules file (default: config/mysql_rules.txt)"
+    )
     parser.add_argument(
         "--rdp-port",
         type=int,
         default=3389,
         help="RDP port (default: 3389)"
     )
+    parser.add_argument(
+        "--json-log",
+        action="store_true",
+        help="Also write structured events to logs/honeypot_events_*.jsonl"
+    )
     
     return parser
 
@@ -102,6 +278,54 @@ def validate_args(args):
         if port < 1 or port > 65535:
             errors.append(f"Invalid {name}: {port}. Must be between 1-65535")
     
+    # capacity limits
+    if args.ssh_max_sessions < 1:
+        errors.append(f"Invalid ssh-max-sessions: {args.ssh_max_sessions}. Must be at least 1")
+    if args.ssh_backlog < 1:
+        errors.append(f"Invalid ssh-backlog: {args.ssh_backlog}. Must be at least 1")
+    if args.ssh_queue_timeout <= 0:
+        errors.append(f"Invalid ssh-queue-timeout: {args.ssh_queue_timeout}. Must be positive")
+    if args.ssh_rate_limit < 0:
+        errors.append(f"Invalid ssh-rate-limit: {args.ssh_rate_limit}. Must not be negative")
+    if args.ssh_rate_burst < 1:
+        errors.append(f"Invalid ssh-rate-burst: {args.ssh_rate_burst}. Must be at least 1")
+    if args.ssh_tarpit_max < 0:
+        errors.append(f"Invalid ssh-tarpit-max: {args.ssh_tarpit_max}. Must not be negative")
+    
+    if args.http_delay < 0 or args.http_delay_jitter < 0:
+        errors.append("Invalid http-delay/http-delay-jitter: must not be negative")
+    if args.http_rules and not os.path.isfile(args.http_rules):
+        errors.append(f"Invalid http-rules: {args.http_rules} does not exist")
+    if args.mysql_rules and not os.path.isfile(args.mysql_rules):
+        errors.append(f"Invalid mysql-rules: {args.mysql_rules} does not exist")
+    if args.http_max_body < 1 or args.http_body_store < 1:
+        errors.append("Invalid http-max-body/http-body-store: must be at least 1 MiB")
+    if args.http_workers < 1:
+        errors.append(f"Invalid http-workers: {args.http_workers}. Must be at least 1")
+    if args.http_max_connections < 1:
+        errors.append(f"Invalid http-max-connections: {args.http_max_connections}. Must be at least 1")
+    if args.http_keepalive <= 0:
+        errors.append(f"Invalid http-keepalive: {args.http_keepalive}. Must be positive")
+    
+    # personas are directories holding a persona.json
+    personas_dir = args.http_personas_dir or settings.HTTP_PERSONAS_DIR
+    if not os.path.isdir(personas_dir):
+        errors.append(f"Invalid http-personas-dir: {personas_dir} does not exist")
+    else:
+        for name in [args.http_persona] + [n for _, n in args.http_persona_ports + args.http_persona_hosts]:
+            if not os.path.isfile(os.path.join(personas_dir, name, "persona.json")):
+                errors.append(f"Invalid HTTP persona: {name} not found in {personas_dir}")
+    for port, _ in args.http_persona_ports:
+        if port < 1 or port > 65535:
+            errors.append(f"Invalid http-persona-port: {port}. Must be between 1-65535")
+    
+    # host key types
+    if not args.ssh_host_keys:
+        errors.append("Invalid ssh-host-keys: at least one key type is required")
+    for key_type in args.ssh_host_keys:
+        if key_type not in ('ed25519', 'ecdsa', 'rsa'):
+            errors.append(f"Invalid ssh-host-keys entry: {key_type}. Must be ed25519, ecdsa or rsa")
+    
     return errors
 
 def print_banner():
@@ -163,17 +387,28 @@ def main():
     print(f"  • Modes: {', '.join(modes)}")
     if args.ssh:
         print(f"  • SSH Port: {args.ssh_port}")
+        print(f"  • SSH Max Sessions: {args.ssh_max_sessions} (overload: {args.ssh_overload})")
+        print(f"  • SSH Rate Limit: {args.ssh_rate_limit}/s per IP (burst: {args.ssh_rate_burst})")
+        print(f"  • SSH Algorithms: {args.ssh_algorithms} (host keys: {', '.join(args.ssh_host_keys)})")
     if args.http:
         print(f"  • HTTP Port: {args.http_port}")
-        print(f"  • HTTP Service: WordPress")
+        print(f"  • HTTP Persona: {args.http_persona}")
+        for port, name in args.http_persona_ports:
+            print(f"  • HTTP Persona on port {port}: {name}")
+        print(f"  • HTTP Delay: {args.http_delay}s (jitter: ±{args.http_delay_jitter}s)")
+        print(f"  • HTTP Engine: {args.http_engine} (workers: {args.http_workers}, "
+              f"max connections: {args.http_max_connections})")
     if args.mysql:
         print(f"  • MySQL Port: {args.mysql_port}")
         print(f"  • MySQL Version: 8.0.29 (fake)")
+        print(f"  • MySQL Engine: {args.mysql_engine}")
     if args.rdp:
         print(f"  • RDP Port: {args.rdp_port}")
         print(f"  • RDP Server: Windows Server 2019 (fake)")
     print(f"  • Log Level: INFO")
     print(f"  • Log File: honeypot.log")
+    if args.json_log:
+        print(f"  • JSON Events: logs/honeypot_events_*.jsonl")
     
     print(f"\n{Fore.YELLOW}[*] Starting honeypot system...{Style.RESET_ALL}")
     
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Multi-pattern detection for HTTP requests
+rules are compiled once into an Aho-Corasick automaton, a request's path,
+query and body are scanned together in one pass and every matching rule
+is reported, not just the first one
+"""
+from collections import deque, namedtuple
+from pathlib import Path
+
+from config import settings
+
+Rule = namedtuple("Rule", "id scope pattern")
+
+SCOPES = ("path", "query", "body")
+DEFAULT_RULES_FILE = Path(settings.HTTP_RULES_FILE)
+
+# joins the scanned fields, never part of a pattern so matches cannot span fields
+SEPARATOR = "\x00"
+
+
+def load_rules(path=DEFAULT_RULES_FILE):
+    """Read '<id> <scope> <pattern>' lines, # starts a comment"""
+    rules = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split(None, 2)
+            if len(parts) != 3:
+                raise ValueError(f"{path}:{line_number}: expected '<id> <scope> <pattern>'")
+            rule_id, scope, pattern = parts
+            if scope not in SCOPES and scope != "any":
+                raise ValueError(f"{path}:{line_number}: unknown scope '{scope}'")
+            rules.append(Rule(rule_id, scope, pattern))
+    return rules
+
+
+class PatternMatcher:
+    """
+    Aho-Corasick automaton over lowercase substrings
+    scan cost depends on the text length, not on the number of patterns
+    """
+    def __init__(self, patterns):
+        self.patterns = [p.lower() for p in patterns]
+        self.goto = [{}]  # node -> {char: node}
+        self.fail = [0]
+        self.output = [()]  # node -> indexes of patterns ending here
+
+        for index, pattern in enumerate(self.patterns):
+            if not pattern or SEPARATOR in pattern:
+                raise ValueError(f"Invalid pattern: {pattern!r}")
+            node = 0
+            for char in pattern:
+                nxt = self.goto[node].get(char)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][char] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                node = nxt
+            self.output[node] += (index,)
+
+        # breadth first so a node's fail target is finished before the node
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(char, 0)
+                # patterns that are suffixes of this one end here too
+                self.output[child] += self.output[self.fail[child]]
+
+    def finditer(self, text):
+        """Yield (end offset, pattern index) for every match in lowercased text"""
+        goto, fail, output = self.goto, self.fail, self.output
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                for index in output[node]:
+                    yield position, index
+
+
+class HTTPDetector:
+    """
+    Compiled rule set, scan() returns the ids of every rule that matched
+    """
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.matcher = PatternMatcher(rule.pattern for rule in self.rules)
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_RULES_FILE):
+        return cls(load_rules(path))
+
+    def scan(self, path="", query="", body=""):
+        # lower each field first, lower() can change a string's length
+        path, query, body = path.lower(), query.lower(), body.lower()
+        text = SEPARATOR.join((path, query, body))
+        query_start = len(path) + 1
+        body_start = query_start + len(query) + 1
+
+        hits = []
+        seen = set()
+        for position, index in self.matcher.finditer(text):
+            if index in seen:
+                continue
+            rule = self.rules[index]
+            if rule.scope != "any":
+                scope = "path" if position < query_start else "query" if position < body_start else "body"
+                if scope != rule.scope:
+                    continue
+            seen.add(index)
+            hits.append(rule.id)
+        return hits
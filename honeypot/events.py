@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Structured event records for the log sinks
+an event keeps references to what the request already has (the WSGI
+environ, the stored body record) and only turns them into dicts when a
+sink asks for them, the text log never does
+"""
+import time
+
+
+class HTTPEvent:
+    """One HTTP request as seen by the honeypot"""
+    __slots__ = ("timestamp", "ip", "port", "method", "path", "query", "host", "user_agent",
+                 "referer", "content_type", "forwarded_for", "rules", "body", "persona", "_environ")
+
+    def __init__(self, environ, port, path, body=None, rules=(), persona=None):
+        self.timestamp = time.time()
+        self.ip = environ.get("REMOTE_ADDR", "")
+        self.port = port
+        self.method = environ.get("REQUEST_METHOD", "")
+        self.path = path
+        self.query = environ.get("QUERY_STRING", "")
+        self.host = environ.get("HTTP_HOST")
+        self.user_agent = environ.get("HTTP_USER_AGENT")
+        self.referer = environ.get("HTTP_REFERER")
+        self.content_type = environ.get("CONTENT_TYPE")
+        self.forwarded_for = environ.get("HTTP_X_FORWARDED_FOR")
+        self.rules = tuple(rules)
+        self.body = body  # BodyRecord from the body store, the body itself is on disk
+        self.persona = persona
+        self._environ = environ
+
+    @property
+    def suspicious(self):
+        return bool(self.rules)
+
+    @property
+    def body_sha256(self):
+        return self.body.sha256 if self.body else None
+
+    @property
+    def headers(self):
+        """Every request header, built from the environ on first use"""
+        headers = {}
+        for key, value in self._environ.items():
+            if key.startswith("HTTP_"):
+                name = key[5:]
+            elif key in ("CONTENT_TYPE", "CONTENT_LENGTH") and value:
+                name = key
+            else:
+                continue
+            headers[name.replace("_", "-").title()] = value
+        return headers
+
+    def to_dict(self, full_headers=True):
+        event = {
+            "type": "http_request",
+            "timestamp": self.timestamp,
+            "ip": self.ip,
+            "port": self.port,
+            "method": self.method,
+            "path": self.path,
+            "query": self.query,
+            "host": self.host,
+            "user_agent": self.user_agent,
+            "referer": self.referer,
+            "content_type": self.content_type,
+            "forwarded_for": self.forwarded_for,
+            "body": self.body.to_dict() if self.body else None,
+            "rules": list(self.rules),
+            "persona": self.persona,
+        }
+        if full_headers:
+            event["headers"] = self.headers
+        return event
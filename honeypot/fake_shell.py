@@ -0,0 +1,677 @@
+#!/usr/bin/env python3
+"""
+Fake shell for the SSH honeypot
+the filesystem tree is built once and shared read-only by every session,
+each session only keeps a small copy-on-write overlay of its own changes
+"""
+import posixpath
+import re
+import shlex
+from types import MappingProxyType
+
+USERNAME = "honeypot"
+HOSTNAME = "ubuntu"
+HOME_DIR = "/home/honeypot"
+
+# keep per-session state in the kilobytes
+MAX_OVERLAY_ENTRIES = 64
+MAX_OVERLAY_FILE_SIZE = 4096
+
+FILE_DATE = "Jan  6 14:32"
+
+UNAME = {
+    "-s": "Linux",
+    "-n": HOSTNAME,
+    "-r": "5.15.0-91-generic",
+    "-v": "#101-Ubuntu SMP Tue Nov 14 13:30:08 UTC 2023",
+    "-m": "x86_64",
+    "-o": "GNU/Linux",
+}
+UNAME_ALL = "Linux ubuntu 5.15.0-91-generic #101-Ubuntu SMP Tue Nov 14 13:30:08 UTC 2023 x86_64 x86_64 x86_64 GNU/Linux"
+
+ID_OUTPUT = ("uid=1000(honeypot) gid=1000(honeypot) groups=1000(honeypot),4(adm),24(cdrom),"
+             "27(sudo),30(dip),46(plugdev),120(lpadmin),132(lxd),133(sambashare)")
+
+PS_OUTPUT = """USER         PID %CPU %MEM    VSZ   RSS TTY      STAT START   TIME COMMAND
+root           1  0.0  0.2 167780 11452 ?        Ss   Jan06   0:04 /sbin/init
+root         412  0.0  0.1  47540 15012 ?        S<s  Jan06   0:01 /lib/systemd/systemd-journald
+root         455  0.0  0.0  25208  6116 ?        Ss   Jan06   0:00 /lib/systemd/systemd-udevd
+systemd+     612  0.0  0.1  89364  6540 ?        Ssl  Jan06   0:00 /lib/systemd/systemd-timesyncd
+root         701  0.0  0.0   6896  2884 ?        Ss   Jan06   0:00 /usr/sbin/cron -f
+syslog       705  0.0  0.0 222400  5340 ?        Ssl  Jan06   0:00 /usr/sbin/rsyslogd -n -iNONE
+mysql        812  0.3  9.8 2412488 395272 ?      Ssl  Jan06   4:18 /usr/sbin/mysqld
+root         840  0.0  0.1  15432  9032 ?        Ss   Jan06   0:00 sshd: /usr/sbin/sshd -D [listener] 0 of 10-100 startups
+www-data     901  0.0  0.4 203872 18120 ?        S    Jan06   0:00 /usr/sbin/apache2 -k start
+honeypot    2231  0.0  0.1  10036  5196 pts/0    Ss   14:32   0:00 -bash
+honeypot    2290  0.0  0.0  10844  3464 pts/0    R+   14:33   0:00 ps aux"""
+
+PASSWD = """root:x:0:0:root:/root:/bin/bash
+daemon:x:1:1:daemon:/usr/sbin:/usr/sbin/nologin
+bin:x:2:2:bin:/bin:/usr/sbin/nologin
+sys:x:3:3:sys:/dev:/usr/sbin/nologin
+sync:x:4:65534:sync:/bin:/bin/sync
+www-data:x:33:33:www-data:/var/www:/usr/sbin/nologin
+nobody:x:65534:65534:nobody:/nonexistent:/usr/sbin/nologin
+systemd-network:x:100:102:systemd Network Management,,,:/run/systemd:/usr/sbin/nologin
+syslog:x:104:111::/home/syslog:/usr/sbin/nologin
+sshd:x:110:65534::/run/sshd:/usr/sbin/nologin
+mysql:x:114:120:MySQL Server,,,:/nonexistent:/bin/false
+honeypot:x:1000:1000:honeypot,,,:/home/honeypot:/bin/bash
+"""
+
+CPUINFO_CORE = """processor\t: {n}
+vendor_id\t: GenuineIntel
+cpu family\t: 6
+model\t\t: 85
+model name\t: Intel(R) Xeon(R) Gold 6230 CPU @ 2.10GHz
+stepping\t: 7
+cpu MHz\t\t: 2095.078
+cache size\t: 28160 KB
+physical id\t: 0
+siblings\t: 2
+core id\t\t: {n}
+cpu cores\t: 2
+flags\t\t: fpu vme de pse tsc msr pae mce cx8 apic sep mtrr pge mca cmov pat pse36 clflush mmx fxsr sse sse2 ss ht syscall nx pdpe1gb rdtscp lm constant_tsc rep_good nopl xtopology cpuid pni pclmulqdq ssse3 fma cx16 pcid sse4_1 sse4_2 x2apic movbe popcnt aes xsave avx f16c rdrand hypervisor lahf_lm abm 3dnowprefetch avx2 avx512f avx512dq
+bogomips\t: 4190.15
+
+"""
+
+MEMINFO = """MemTotal:        4025404 kB
+MemFree:          712344 kB
+MemAvailable:    2417788 kB
+Buffers:          141092 kB
+Cached:          1622320 kB
+SwapCached:            0 kB
+SwapTotal:       2097148 kB
+SwapFree:        2097148 kB
+"""
+
+FREE_OUTPUT = """               total        used        free      shared  buff/cache   available
+Mem:         3931040     1569740      695648        2448     1665652     2361120
+Swap:        2097148           0     2097148"""
+
+# every file in the base tree, directories are derived from the paths
+BASE_FILES = {
+    "/etc/passwd": PASSWD,
+    "/etc/group": "root:x:0:\nadm:x:4:syslog,honeypot\nsudo:x:27:honeypot\nhoneypot:x:1000:\n",
+    "/etc/shadow": "",
+    "/etc/hostname": f"{HOSTNAME}\n",
+    "/etc/hosts": f"127.0.0.1 localhost\n127.0.1.1 {HOSTNAME}\n",
+    "/etc/issue": "Ubuntu 22.04.3 LTS \\n \\l\n",
+    "/etc/os-release": ('PRETTY_NAME="Ubuntu 22.04.3 LTS"\nNAME="Ubuntu"\nVERSION_ID="22.04"\n'
+                        'VERSION="22.04.3 LTS (Jammy Jellyfish)"\nID=ubuntu\nID_LIKE=debian\n'),
+    "/etc/resolv.conf": "nameserver 127.0.0.53\noptions edns0 trust-ad\n",
+    "/etc/crontab": "SHELL=/bin/sh\nPATH=/usr/local/sbin:/usr/local/bin:/sbin:/bin:/usr/sbin:/usr/bin\n",
+    "/etc/ssh/sshd_config": "Include /etc/ssh/sshd_config.d/*.conf\nPermitRootLogin no\nPasswordAuthentication yes\n",
+    "/etc/mysql/my.cnf": "[mysqld]\nbind-address = 127.0.0.1\n",
+    "/proc/cpuinfo": CPUINFO_CORE.format(n=0) + CPUINFO_CORE.format(n=1),
+    "/proc/meminfo": MEMINFO,
+    "/proc/version": f"Linux version 5.15.0-91-generic (buildd@lcy02-amd64-045) {UNAME['-v']}\n",
+    "/proc/uptime": "1284391.52 2519032.17\n",
+    "/var/log/syslog": "",
+    "/var/log/auth.log": "",
+    "/var/www/html/index.html": "<html><body><h1>It works!</h1></body></html>\n",
+    "/var/www/html/wp-config.php": ("<?php\ndefine('DB_NAME', 'wordpress');\ndefine('DB_USER', 'wp_admin');\n"
+                                   "define('DB_PASSWORD', 'Wp@dm1n2023!');\ndefine('DB_HOST', 'localhost');\n"),
+    f"{HOME_DIR}/.bashrc": "# ~/.bashrc: executed by bash(1) for non-login shells.\n",
+    f"{HOME_DIR}/.profile": "# ~/.profile: executed by the command interpreter for login shells.\n",
+    f"{HOME_DIR}/.bash_history": "sudo apt update\nmysql -u root -p\ncd /var/www/html\nnano wp-config.php\n",
+    f"{HOME_DIR}/Documents/notes.txt": "backup server: 10.0.0.12\ntodo: rotate mysql root password\n",
+    f"{HOME_DIR}/.ssh/authorized_keys": "",
+}
+
+BASE_DIRS = (
+    "/bin", "/boot", "/dev", "/etc", "/home", "/lib", "/media", "/mnt", "/opt",
+    "/proc", "/root", "/run", "/sbin", "/srv", "/sys", "/tmp", "/usr", "/usr/bin",
+    "/usr/lib", "/usr/local", "/usr/sbin", "/usr/share", "/var", "/var/lib",
+    "/var/log", "/var/tmp", "/var/www",
+    f"{HOME_DIR}/Desktop", f"{HOME_DIR}/Downloads", f"{HOME_DIR}/Music",
+    f"{HOME_DIR}/Pictures", f"{HOME_DIR}/Public", f"{HOME_DIR}/Templates",
+    f"{HOME_DIR}/Videos",
+)
+
+BIN_FILES = ("bash", "cat", "chmod", "cp", "curl", "echo", "grep", "ls", "mkdir",
+             "mv", "ps", "rm", "sh", "touch", "uname", "wget")
+
+# readable only by root
+PROTECTED_PATHS = frozenset({"/root", "/etc/shadow"})
+# everything else is root-owned, so the user may only change files under these
+WRITABLE_DIRS = (HOME_DIR + "/", "/tmp/", "/var/tmp/")
+
+# stderr redirects and fd juggling (2>/dev/null, 2>&1) are dropped before parsing,
+# quoted strings are matched first so redirects inside them are left alone
+STDERR_REDIRECT = re.compile(r"""'[^']*'|"(?:\\.|[^"\\])*"|\\.|(?:^|(?<=\s))(\d?>&\d|2>>?\s*[^\s;&|'"]+)""")
+
+
+class FakeFilesystem:
+    """
+    Read-only filesystem tree shared by every SSH session
+    """
+    def __init__(self):
+        files = dict(BASE_FILES)
+        for name in BIN_FILES:
+            files[f"/bin/{name}"] = ""
+            files[f"/usr/bin/{name}"] = ""
+
+        children = {"/": set()}
+        for path in list(files) + list(BASE_DIRS):
+            parent, name = posixpath.split(path)
+            while True:
+                children.setdefault(parent, set()).add(name)
+                if parent == "/":
+                    break
+                parent, name = posixpath.split(parent)
+        for path in BASE_DIRS:
+            children.setdefault(path, set())
+
+        self.files = MappingProxyType(files)
+        self.dirs = MappingProxyType({path: tuple(sorted(names)) for path, names in children.items()})
+
+
+class ShellSession:
+    """
+    Per-session view of the shared filesystem: cwd plus a copy-on-write
+    overlay holding only the files and directories this session touched
+    """
+    __slots__ = ("fs", "cwd", "files", "dirs", "removed", "tty")
+
+    def __init__(self, fs):
+        self.fs = fs
+        self.cwd = HOME_DIR
+        self.files = {}      # path -> content written by this session
+        self.dirs = set()    # directories created by this session
+        self.removed = set() # base paths deleted by this session
+        self.tty = True      # False while a command's output goes to a pipe or a file
+
+    def prompt(self):
+        if self.cwd == HOME_DIR:
+            display = "~"
+        elif self.cwd.startswith(HOME_DIR + "/"):
+            display = "~" + self.cwd[len(HOME_DIR):]
+        else:
+            display = self.cwd
+        return f"{USERNAME}@{HOSTNAME}:{display}$ "
+
+    def resolve(self, path):
+        if path == "~" or path.startswith("~/"):
+            path = HOME_DIR + path[1:]
+        path = posixpath.normpath(posixpath.join(self.cwd, path))
+        # normpath keeps a leading "//"
+        return "/" + path.lstrip("/")
+
+    def _hidden(self, path):
+        if not self.removed:
+            return False
+        while path != "/":
+            if path in self.removed:
+                return True
+            path = posixpath.dirname(path)
+        return False
+
+    def is_dir(self, path):
+        if path in self.dirs:
+            return True
+        return path in self.fs.dirs and not self._hidden(path)
+
+    def is_file(self, path):
+        if path in self.files:
+            return True
+        return path in self.fs.files and not self._hidden(path)
+
+    def read(self, path):
+        if path in self.files:
+            return self.files[path]
+        return self.fs.files[path]
+
+    def listdir(self, path):
+        names = set()
+        if path in self.fs.dirs and not self._hidden(path):
+            names.update(name for name in self.fs.dirs[path]
+                         if posixpath.join(path, name) not in self.removed)
+        for entry in self.files.keys() | self.dirs:
+            parent, name = posixpath.split(entry)
+            if parent == path:
+                names.add(name)
+        return sorted(names)
+
+    def write(self, path, content, append=False):
+        if path not in self.files and len(self.files) + len(self.dirs) >= MAX_OVERLAY_ENTRIES:
+            return False
+        if append and self.is_file(path):
+            content = self.read(path) + content
+        self.files[path] = content[:MAX_OVERLAY_FILE_SIZE]
+        self.removed.discard(path)
+        return True
+
+    def mkdir(self, path):
+        if len(self.files) + len(self.dirs) >= MAX_OVERLAY_ENTRIES:
+            return False
+        self.dirs.add(path)
+        self.removed.discard(path)
+        return True
+
+    def remove(self, path):
+        self.files.pop(path, None)
+        if path in self.dirs:
+            self.dirs.discard(path)
+            prefix = path + "/"
+            for entry in [p for p in self.files if p.startswith(prefix)]:
+                del self.files[entry]
+            self.dirs = {d for d in self.dirs if not d.startswith(prefix)}
+        if path in self.fs.files or path in self.fs.dirs:
+            self.removed.add(path)
+            if path in self.fs.dirs:
+                # so a directory made again at this path starts out empty
+                prefix = path + "/"
+                self.removed.update(p for p in self.fs.files if p.startswith(prefix))
+                self.removed.update(p for p in self.fs.dirs if p.startswith(prefix))
+
+
+class CommandEngine:
+    """
+    Runs shell command lines against a ShellSession, commands are looked
+    up in a dispatch table built once
+    """
+    def __init__(self, fs=None):
+        self.fs = fs or FakeFilesystem()
+        self.commands = {
+            "ls": self.cmd_ls,
+            "ll": self.cmd_ll,
+            "cat": self.cmd_cat,
+            "cd": self.cmd_cd,
+            "pwd": self.cmd_pwd,
+            "whoami": self.cmd_whoami,
+            "id": self.cmd_id,
+            "uname": self.cmd_uname,
+            "hostname": self.cmd_hostname,
+            "echo": self.cmd_echo,
+            "touch": self.cmd_touch,
+            "rm": self.cmd_rm,
+            "mkdir": self.cmd_mkdir,
+            "wget": self.cmd_wget,
+            "curl": self.cmd_curl,
+            "ps": self.cmd_ps,
+            "uptime": self.cmd_uptime,
+            "w": self.cmd_uptime,
+            "free": self.cmd_free,
+            "nproc": self.cmd_nproc,
+            "chmod": self.cmd_silent,
+            "export": self.cmd_silent,
+            "clear": self.cmd_silent,
+            "history": self.cmd_history,
+            "which": self.cmd_which,
+            "grep": self.cmd_grep,
+            "head": self.cmd_head,
+            "tail": self.cmd_tail,
+            "wc": self.cmd_wc,
+            "sort": self.cmd_sort,
+            "less": self.cmd_pager,
+            "more": self.cmd_pager,
+        }
+
+    def new_session(self):
+        return ShellSession(self.fs)
+
+    def run(self, session, command_line):
+        """
+        Runs a full command line (with ; && || | and > >>) and returns its output
+        """
+        command_line = STDERR_REDIRECT.sub(lambda m: " " if m.group(1) else m.group(0), command_line)
+        try:
+            lexer = shlex.shlex(command_line, posix=True, punctuation_chars=";&|>")
+            lexer.whitespace_split = True
+            tokens = list(lexer)
+        except ValueError:
+            tokens = command_line.split()
+
+        output = []
+        argv = []
+        redirect = None
+        piped = None
+        for token in tokens + [";"]:
+            if token in (";", "&&", "||", "|", "&"):
+                if argv:
+                    session.tty = token != "|" and redirect is None
+                    result = self._run_one(session, argv, piped)
+                    if redirect is not None:
+                        result = self._redirect(session, result, *redirect)
+                    piped = result if token == "|" else None
+                    if piped is None and result:
+                        output.append(result)
+                argv = []
+                redirect = None
+            elif token in (">", ">>"):
+                redirect = (token, None)
+            elif token.strip(";&|>") == "":
+                continue
+            elif redirect is not None and redirect[1] is None:
+                redirect = (redirect[0], token)
+            else:
+                argv.append(token)
+
+        return "\n".join(output)
+
+    def _run_one(self, session, argv, stdin=None):
+        name = posixpath.basename(argv[0])
+        handler = self.commands.get(name)
+        if handler is None:
+            return f"{argv[0]}: command not found"
+        return handler(session, argv[1:], stdin)
+
+    def _redirect(self, session, result, mode, target):
+        if target is None:
+            return "bash: syntax error near unexpected token `newline'"
+        path = session.resolve(target)
+        if path == "/dev/null":
+            return ""
+        if session.is_dir(path):
+            return f"bash: {target}: Is a directory"
+        if not session.is_dir(posixpath.dirname(path)):
+            return f"bash: {target}: No such file or directory"
+        if not self._writable(path):
+            return f"bash: {target}: Permission denied"
+        if not session.write(path, result + "\n" if result else "", append=mode == ">>"):
+            return f"bash: {target}: No space left on device"
+        return ""
+
+    @staticmethod
+    def _writable(path):
+        return path.startswith(WRITABLE_DIRS)
+
+    @staticmethod
+    def _split_flags(args):
+        flags = "".join(a[1:] for a in args if a.startswith("-") and len(a) > 1)
+        paths = [a for a in args if not a.startswith("-") or a == "-"]
+        return flags, paths
+
+    def _long_entry(self, session, path, name):
+        owned = path.startswith(HOME_DIR) or path in session.files or path in session.dirs
+        owner = USERNAME if owned else "root"
+        if session.is_dir(path):
+            return f"drwxr-xr-x 2 {owner} {owner}  4096 {FILE_DATE} {name}"
+        size = len(session.read(path))
+        mode = "-rwxr-xr-x" if "/bin/" in path else "-rw-r--r--"
+        return f"{mode} 1 {owner} {owner} {size:5d} {FILE_DATE} {name}"
+
+    def cmd_ls(self, session, args, stdin=None, long_format=False):
+        flags, paths = self._split_flags(args)
+        long_format = long_format or "l" in flags
+        show_all = "a" in flags
+
+        output = []
+        for target in paths or ["."]:
+            path = session.resolve(target)
+            if path in PROTECTED_PATHS:
+                output.append(f"ls: cannot open directory '{target}': Permission denied")
+                continue
+            if session.is_file(path):
+                output.append(self._long_entry(session, path, target) if long_format else target)
+                continue
+            if not session.is_dir(path):
+                output.append(f"ls: cannot access '{target}': No such file or directory")
+                continue
+
+            names = session.listdir(path)
+            if not show_all:
+                names = [n for n in names if not n.startswith(".")]
+            if long_format:
+                output.append(f"total {len(names) * 4}")
+                if show_all:
+                    output.append(self._long_entry(session, path, "."))
+                    output.append(self._long_entry(session, posixpath.dirname(path), ".."))
+                output.extend(self._long_entry(session, posixpath.join(path, n), n) for n in names)
+            elif names:
+                # one name per line unless a terminal is reading, like coreutils
+                output.append(("  " if session.tty else "\n").join(names))
+        return "\n".join(output)
+
+    def cmd_ll(self, session, args, stdin=None):
+        return self.cmd_ls(session, ["-la"] + args)
+
+    def cmd_cat(self, session, args, stdin=None):
+        if not args and stdin is not None:
+            return stdin
+        output = []
+        for target in args:
+            if target.startswith("-"):
+                continue
+            path = session.resolve(target)
+            if path in PROTECTED_PATHS:
+                output.append(f"cat: {target}: Permission denied")
+            elif session.is_dir(path):
+                output.append(f"cat: {target}: Is a directory")
+            elif not session.is_file(path):
+                output.append(f"cat: {target}: No such file or directory")
+            else:
+                output.append(session.read(path).rstrip("\n"))
+        return "\n".join(output)
+
+    def cmd_cd(self, session, args, stdin=None):
+        target = args[0] if args else "~"
+        path = session.resolve(target)
+        if path in PROTECTED_PATHS:
+            return f"bash: cd: {target}: Permission denied"
+        if session.is_file(path):
+            return f"bash: cd: {target}: Not a directory"
+        if not session.is_dir(path):
+            return f"bash: cd: {target}: No such file or directory"
+        session.cwd = path
+        return ""
+
+    def cmd_pwd(self, session, args, stdin=None):
+        return session.cwd
+
+    def cmd_whoami(self, session, args, stdin=None):
+        return USERNAME
+
+    def cmd_id(self, session, args, stdin=None):
+        return ID_OUTPUT
+
+    def cmd_uname(self, session, args, stdin=None):
+        flags, _ = self._split_flags(args)
+        if "a" in flags:
+            return UNAME_ALL
+        if not flags:
+            return UNAME["-s"]
+        return " ".join(UNAME[f"-{f}"] for f in "snrvmo" if f in flags)
+
+    def cmd_hostname(self, session, args, stdin=None):
+        return HOSTNAME
+
+    def cmd_echo(self, session, args, stdin=None):
+        if args and args[0] == "-n":
+            args = args[1:]
+        return " ".join(args)
+
+    def cmd_touch(self, session, args, stdin=None):
+        for target in args:
+            if target.startswith("-"):
+                continue
+            path = session.resolve(target)
+            if session.is_file(path) or session.is_dir(path):
+                continue
+            if not session.is_dir(posixpath.dirname(path)):
+                return f"touch: cannot touch '{target}': No such file or directory"
+            if not self._writable(path):
+                return f"touch: cannot touch '{target}': Permission denied"
+            if not session.write(path, ""):
+                return f"touch: cannot touch '{target}': No space left on device"
+        return ""
+
+    def cmd_rm(self, session, args, stdin=None):
+        flags, paths = self._split_flags(args)
+        output = []
+        for target in paths:
+            path = session.resolve(target)
+            if not session.is_file(path) and not session.is_dir(path):
+                if "f" not in flags:
+                    output.append(f"rm: cannot remove '{target}': No such file or directory")
+            elif session.is_dir(path) and "r" not in flags and "R" not in flags:
+                output.append(f"rm: cannot remove '{target}': Is a directory")
+            elif not self._writable(path):
+                output.append(f"rm: cannot remove '{target}': Permission denied")
+            else:
+                session.remove(path)
+        return "\n".join(output)
+
+    def cmd_mkdir(self, session, args, stdin=None):
+        flags, paths = self._split_flags(args)
+        for target in paths:
+            path = session.resolve(target)
+            if session.is_dir(path) or session.is_file(path):
+                if "p" not in flags:
+                    return f"mkdir: cannot create directory '{target}': File exists"
+                continue
+            # -p creates every missing parent, outermost first
+            missing = [path]
+            parent = posixpath.dirname(path)
+            while "p" in flags and not session.is_dir(parent) and not session.is_file(parent):
+                missing.append(parent)
+                parent = posixpath.dirname(parent)
+            if not session.is_dir(parent):
+                error = "Not a directory" if session.is_file(parent) else "No such file or directory"
+                return f"mkdir: cannot create directory '{target}': {error}"
+            for path in reversed(missing):
+                if not self._writable(path):
+                    return f"mkdir: cannot create directory '{target}': Permission denied"
+                if not session.mkdir(path):
+                    return f"mkdir: cannot create directory '{target}': No space left on device"
+        return ""
+
+    @staticmethod
+    def _url_parts(url):
+        rest = url.split("://", 1)[-1]
+        host = rest.split("/", 1)[0].split(":", 1)[0] or "localhost"
+        name = rest.rstrip("/").rsplit("/", 1)[-1] if "/" in rest else "index.html"
+        return host, name or "index.html"
+
+    def cmd_wget(self, session, args, stdin=None):
+        urls = [a for a in args if not a.startswith("-")]
+        if not urls:
+            return "wget: missing URL\nUsage: wget [OPTION]... [URL]...\n\nTry `wget --help' for more options."
+
+        output = []
+        for url in urls:
+            host, name = self._url_parts(url)
+            if not self._writable(session.resolve(name)):
+                output.append(f"{name}: Permission denied\n\nCannot write to '{name}' (Permission denied).")
+                continue
+            session.write(session.resolve(name), "")
+            output.append(
+                f"--2025-01-06 14:33:02--  {url}\n"
+                f"Resolving {host} ({host})... 93.184.216.34\n"
+                f"Connecting to {host} ({host})|93.184.216.34|:80... connected.\n"
+                f"HTTP request sent, awaiting response... 200 OK\n"
+                f"Length: unspecified [application/octet-stream]\n"
+                f"Saving to: '{name}'\n\n"
+                f"{name}                  [ <=>                ]       0  --.-KB/s    in 0s\n\n"
+                f"2025-01-06 14:33:03 (0.00 B/s) - '{name}' saved [0]"
+            )
+        return "\n".join(output)
+
+    def cmd_curl(self, session, args, stdin=None):
+        urls = [a for a in args if not a.startswith("-")]
+        if not urls:
+            return "curl: try 'curl --help' or 'curl --manual' for more information"
+        host, _ = self._url_parts(urls[-1])
+        return f"curl: (6) Could not resolve host: {host}"
+
+    def cmd_ps(self, session, args, stdin=None):
+        if not args:
+            return ("    PID TTY          TIME CMD\n"
+                    "   2231 pts/0    00:00:00 bash\n"
+                    "   2290 pts/0    00:00:00 ps")
+        return PS_OUTPUT
+
+    def cmd_uptime(self, session, args, stdin=None):
+        return " 14:33:02 up 14 days, 20:46,  1 user,  load average: 0.08, 0.03, 0.01"
+
+    def cmd_free(self, session, args, stdin=None):
+        return FREE_OUTPUT
+
+    def cmd_nproc(self, session, args, stdin=None):
+        return "2"
+
+    def cmd_history(self, session, args, stdin=None):
+        lines = self.fs.files[f"{HOME_DIR}/.bash_history"].splitlines()
+        return "\n".join(f"{i:5d}  {line}" for i, line in enumerate(lines, 1))
+
+    def cmd_which(self, session, args, stdin=None):
+        return "\n".join(f"/usr/bin/{name}" for name in args
+                         if name in self.commands and session.is_file(f"/usr/bin/{name}"))
+
+    def cmd_silent(self, session, args, stdin=None):
+        return ""
+
+    def _input_text(self, session, name, paths, stdin):
+        """
+        Text a filter command works on: the named files, else what was piped in
+        """
+        if not paths:
+            return stdin or ""
+        chunks = []
+        for target in paths:
+            path = session.resolve(target)
+            if path in PROTECTED_PATHS:
+                chunks.append(f"{name}: {target}: Permission denied")
+            elif session.is_file(path):
+                chunks.append(session.read(path).rstrip("\n"))
+            else:
+                chunks.append(f"{name}: {target}: No such file or directory")
+        return "\n".join(chunks)
+
+    @staticmethod
+    def _line_count(args, default=10):
+        for i, arg in enumerate(args):
+            if arg == "-n" and i + 1 < len(args) and args[i + 1].isdigit():
+                return int(args[i + 1]), args[:i] + args[i + 2:]
+            if arg[:1] == "-" and arg[1:].isdigit():
+                return int(arg[1:]), args[:i] + args[i + 1:]
+        return default, args
+
+    def cmd_grep(self, session, args, stdin=None):
+        flags, words = self._split_flags(args)
+        if not words:
+            return "Usage: grep [OPTION]... PATTERNS [FILE]...\nTry 'grep --help' for more information."
+        pattern, paths = words[0], words[1:]
+        if "i" in flags:
+            pattern = pattern.lower()
+
+        matches = []
+        for line in self._input_text(session, "grep", paths, stdin).splitlines():
+            found = pattern in (line.lower() if "i" in flags else line)
+            if found != ("v" in flags):
+                matches.append(line)
+        if "c" in flags:
+            return str(len(matches))
+        return "\n".join(matches)
+
+    def cmd_head(self, session, args, stdin=None):
+        count, args = self._line_count(args)
+        _, paths = self._split_flags(args)
+        lines = self._input_text(session, "head", paths, stdin).splitlines()
+        return "\n".join(lines[:count])
+
+    def cmd_tail(self, session, args, stdin=None):
+        count, args = self._line_count(args)
+        _, paths = self._split_flags(args)
+        lines = self._input_text(session, "tail", paths, stdin).splitlines()
+        return "\n".join(lines[-count:] if count else [])
+
+    def cmd_wc(self, session, args, stdin=None):
+        flags, paths = self._split_flags(args)
+        text = self._input_text(session, "wc", paths, stdin)
+        lines = len(text.splitlines())
+        if "l" in flags:
+            return str(lines)
+        return f"{lines:7d} {len(text.split()):7d} {len(text) + 1 if text else 0:7d}"
+
+    def cmd_sort(self, session, args, stdin=None):
+        flags, paths = self._split_flags(args)
+        lines = sorted(self._input_text(session, "sort", paths, stdin).splitlines(),
+                       reverse="r" in flags)
+        return "\n".join(lines)
+
+    def cmd_pager(self, session, args, stdin=None):
+        _, paths = self._split_flags(args)
+        return self._input_text(session, "less", paths, stdin)
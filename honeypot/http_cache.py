@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+In-memory HTTP responses for the honeypot's fixed pages and static files
+everything that does not depend on the request (body, gzip body, ETag,
+headers) is computed once when the page or file is loaded
+"""
+import gzip
+import hashlib
+import mimetypes
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+
+from flask import Response
+
+
+def accepts_gzip(accept_encoding):
+    """True if an Accept-Encoding header allows gzip (q=0 means refused)"""
+    if not accept_encoding:
+        return False
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        name, _, value = params.strip().partition("=")
+        if name.strip().lower() != "q":
+            return True
+        try:
+            return float(value) > 0
+        except ValueError:
+            return False
+    return False
+
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header against one ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class CachedPage:
+    """
+    A pre-rendered page: identity and gzip bodies with their own ETag and
+    header list, answered with 304 when the client already has it. Error
+    and login-failure pages (status other than 200) get neither, like the
+    servers the personas imitate: no validators, no 304, no gzip
+    """
+    def __init__(self, content, headers=None, mimetype="text/html; charset=utf-8", status=200):
+        body = content.encode("utf-8") if isinstance(content, str) else bytes(content)
+        self.status = status
+        self.body = body
+        if status != 200:
+            self.cacheable = False
+            self.headers = (
+                ("Content-Type", mimetype), *(headers or {}).items(), ("Content-Length", str(len(self.body)))
+            )
+            return
+        self.cacheable = True
+        self.gzip_body = gzip.compress(body, compresslevel=9, mtime=0)
+
+        digest = hashlib.sha1(body).hexdigest()[:16]
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gzip"'
+
+        common = [("Content-Type", mimetype), *(headers or {}).items(), ("Vary", "Accept-Encoding")]
+        self.headers = tuple(common + [
+            ("ETag", self.etag),
+            ("Content-Length", str(len(self.body))),
+        ])
+        self.gzip_headers = tuple(common + [
+            ("Content-Encoding", "gzip"),
+            ("ETag", self.gzip_etag),
+            ("Content-Length", str(len(self.gzip_body))),
+        ])
+        # a 304 repeats the validators but carries no body
+        self.not_modified_headers = tuple((k, v) for k, v in self.headers if k not in ("Content-Type", "Content-Length"))
+        self.gzip_not_modified_headers = tuple(
+            (k, v) for k, v in self.gzip_headers if k not in ("Content-Type", "Content-Length", "Content-Encoding")
+        )
+
+    def respond(self, request):
+        if not self.cacheable:
+            return Response(self.body, status=self.status, headers=self.headers)
+        if accepts_gzip(request.headers.get("Accept-Encoding")):
+            body, headers, etag, not_modified = self.gzip_body, self.gzip_headers, self.gzip_etag, self.gzip_not_modified_headers
+        else:
+            body, headers, etag, not_modified = self.body, self.headers, self.etag, self.not_modified_headers
+
+        if request.method in ("GET", "HEAD") and etag_matches(request.headers.get("If-None-Match"), etag):
+            return Response(status=304, headers=not_modified)
+        return Response(body, status=self.status, headers=headers)
+
+
+def parse_range(range_header, size):
+    """
+    Parse a single "bytes=" range into (start, end) inclusive
+    returns None to serve the whole file, or "unsatisfiable"
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        # multipart ranges are optional, fall back to a full response
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not first:
+            # suffix range, the last N bytes
+            length = int(last)
+            if length <= 0:
+                return "unsatisfiable"
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return "unsatisfiable"
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+class StaticAsset:
+    """
+    One file held in memory with its validators and header list
+    """
+    def __init__(self, name, data, mtime):
+        self.name = name
+        self.body = data
+        self.size = len(data)
+        self.mtime = int(mtime)
+        self.mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        self.etag = f'"{hashlib.sha1(data).hexdigest()[:16]}"'
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+
+        self.validators = (
+            ("ETag", self.etag),
+            ("Last-Modified", self.last_modified),
+            ("Accept-Ranges", "bytes"),
+        )
+        self.headers = (
+            ("Content-Type", self.mimetype),
+            ("Content-Length", str(self.size)),
+        ) + self.validators
+
+    def not_modified(self, request):
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match:
+            return etag_matches(if_none_match, self.etag)
+        if_modified_since = request.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                return self.mtime <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def respond(self, request):
+        if request.method not in ("GET", "HEAD"):
+            return Response(status=405, headers=(("Allow", "GET, HEAD"),))
+        if self.not_modified(request):
+            return Response(status=304, headers=self.validators)
+
+        range_header = request.headers.get("Range")
+        if_range = request.headers.get("If-Range")
+        if range_header and (not if_range or if_range.strip() in (self.etag, self.last_modified)):
+            byte_range = parse_range(range_header, self.size)
+            if byte_range == "unsatisfiable":
+                return Response(status=416, headers=(("Content-Range", f"bytes */{self.size}"),))
+            if byte_range is not None:
+                start, end = byte_range
+                return Response(
+                    self.body[start:end + 1],
+                    status=206,
+                    headers=(
+                        ("Content-Type", self.mimetype),
+                        ("Content-Length", str(end - start + 1)),
+                        ("Content-Range", f"bytes {start}-{end}/{self.size}"),
+                    ) + self.validators
+                )
+
+        return Response(self.body, status=200, headers=self.headers)
+
+
+class StaticAssetCache:
+    """
+    Every file under a directory, loaded into memory at startup
+    the directory is re-scanned at most once per check_interval, on the
+    request path, and only files whose mtime or size changed are re-read
+    """
+    def __init__(self, directory, logger, check_interval=2.0, max_file_size=8 << 20):
+        self.directory = Path(directory)
+        self.logger = logger
+        self.check_interval = check_interval
+        self.max_file_size = max_file_size
+
+        self.assets = {}  # name relative to directory -> StaticAsset
+        self.signatures = {}  # name -> (mtime_ns, size)
+        self.lock = threading.Lock()
+        self.next_check = 0.0
+        self._scan()
+
+    def get(self, name):
+        now = time.monotonic()
+        if now >= self.next_check and self.lock.acquire(blocking=False):
+            # one request pays for the re-scan, the others keep the old snapshot
+            try:
+                self.next_check = now + self.check_interval
+                self._scan()
+            finally:
+                self.lock.release()
+        return self.assets.get(name)
+
+    def respond(self, request, name):
+        """Response for an asset, or None if there is no such file"""
+        asset = self.get(name)
+        if asset is None:
+            return None
+        return asset.respond(request)
+
+    def _scan(self):
+        assets = {}
+        signatures = {}
+        if self.directory.is_dir():
+            for path in self.directory.rglob("*"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                if not path.is_file() or stat.st_size > self.max_file_size:
+                    continue
+                name = path.relative_to(self.directory).as_posix()
+                signature = (stat.st_mtime_ns, stat.st_size)
+                signatures[name] = signature
+
+                if self.signatures.get(name) == signature and name in self.assets:
+                    assets[name] = self.assets[name]
+                    continue
+                try:
+                    assets[name] = StaticAsset(name, path.read_bytes(), stat.st_mtime)
+                except OSError as e:
+                    self.logger.error(f"Failed to load static asset {name}: {e}")
+                    continue
+                if name in self.assets:
+                    self.logger.info(f"Reloaded static asset {name} ({stat.st_size} bytes)")
+
+        for name in self.assets.keys() - assets.keys():
+            self.logger.info(f"Static asset {name} removed")
+        # swap whole dicts so readers never see a half-built snapshot
+        self.signatures = signatures
+        self.assets = assets
@@ -2,301 +2,271 @@
 """
 HTTP Honeypot Module
 """
-from flask import Flask, request, Response, send_file
-from pathlib import Path
-import time
+from flask import Flask, request
+from http import HTTPStatus
 import logging
+import threading
+from pathlib import Path
+from urllib.parse import unquote_plus
+from config import settings
+from honeypot.body_store import BodyStore
+from honeypot.detection import DEFAULT_RULES_FILE, HTTPDetector
+from honeypot.events import HTTPEvent
+from honeypot.http_server import AsyncHTTPServer, DeferredWSGIServer, ResponseDelay, ResponseScheduler
+from honeypot.noise import CannedResponse, NoiseRouter
+from honeypot.personas import DEFAULT_PERSONA, PERSONAS_DIR, PersonaSelector, load_personas
+
+# artificial latency (seconds) so responses look like a real backend,
+# per-route delays come from the persona
+DEFAULT_DELAY = settings.HTTP_DELAY
+DEFAULT_DELAY_JITTER = settings.HTTP_DELAY_JITTER
 
-WORDPRESS_TEMPLATE = {
-    "title": "WordPress Site",
-    "admin_path": "/wp-admin",
-    "login_path": "/wp-login.php",
-    "version": "WordPress 6.4.3",
-    "headers": {"Server": "Apache/2.4.58 (Ubuntu)", "X-Powered-By": "PHP/8.2.12"},
+HTTP_METHODS = ['GET', 'HEAD', 'POST', 'PUT', 'DELETE', 'PATCH', 'OPTIONS']
+
+# scanner noise answered by the web server itself, before the application runs
+NOISE_PATHS = {
+    "/.env": "not_found",
+    "/.aws/credentials": "not_found",
+    "/.ds_store": "not_found",
+    "/config.json": "not_found",
+    "/phpinfo.php": "not_found",
+    "/info.php": "not_found",
+    "/test.php": "not_found",
+    "/server-status": "forbidden",
+    "/hnap1/": "not_found",
+    "/sdk": "not_found",
+    "/boaform/admin/formlogin": "not_found",
+    "/solr/admin/info/system": "not_found",
+    "/.well-known/security.txt": "not_found",
+}
+NOISE_PREFIXES = {
+    "/.git/": "forbidden",
+    "/.svn/": "forbidden",
+    "/cgi-bin/": "forbidden",
+    "/phpmyadmin": "not_found",
+    "/pma": "not_found",
+    "/vendor/phpunit/": "not_found",
+    "/actuator": "not_found",
+    "/owa/": "not_found",
+    "/ecp/": "not_found",
+    "/remote/": "not_found",
+}
+# install paths of an application a persona imitates, real traffic when that persona answers
+PERSONA_PREFIXES = {
+    "phpmyadmin": ("/phpmyadmin", "/pma"),
 }
+NOISE_SUMMARY_INTERVAL = 60  # seconds between aggregated noise log lines
+
+APACHE_ERROR_PAGE = """<!DOCTYPE HTML PUBLIC "-//IETF//DTD HTML 2.0//EN">
+<html><head>
+<title>{code} {title}</title>
+</head><body>
+<h1>{title}</h1>
+<p>{text}</p>
+<hr>
+<address>{server} Server at localhost Port 80</address>
+</body></html>
+"""
+
+# request bodies, stored once per SHA-256
+BODY_DIR = Path(settings.HTTP_BODY_DIR)
+DEFAULT_MAX_BODY_MB = settings.HTTP_MAX_BODY_MB  # longer bodies are cut, the rest is dropped
+DEFAULT_BODY_STORE_MB = settings.HTTP_BODY_STORE_MB
+
+DEFAULT_ENGINE = settings.HTTP_ENGINE
+DEFAULT_WORKERS = settings.HTTP_WORKERS
+DEFAULT_MAX_CONNECTIONS = settings.HTTP_MAX_CONNECTIONS
+DEFAULT_KEEPALIVE_TIMEOUT = settings.HTTP_KEEPALIVE_TIMEOUT
+
+def create_noise_router(persona, logger):
+    """
+    Canned answers for the NOISE_PATHS / NOISE_PREFIXES probes, in the persona's style
+    entries that would hide one of the persona's own routes or assets are left out
+    """
+    served = [path.lower() for path in persona.routes]
+    if persona.assets:
+        served.extend("/" + name.lower() for name in persona.assets.assets)
+    owned = PERSONA_PREFIXES.get(persona.name, ())
+    paths = {path: key for path, key in NOISE_PATHS.items() if path not in served}
+    prefixes = {
+        prefix: key for prefix, key in NOISE_PREFIXES.items()
+        if prefix not in owned and not any(path.startswith(prefix) for path in served)
+    }
 
-def create_flask_app(args, logger):
+    not_found = persona.not_found
+    status = f"{not_found.status} {HTTPStatus(not_found.status).phrase}"
+    headers = [(k, v) for k, v in not_found.headers if k != "Content-Length"]
+    responses = {"not_found": CannedResponse(status, headers, not_found.body)}
+    
+    if persona.server and persona.server.startswith("Apache"):
+        body = APACHE_ERROR_PAGE.format(code=403, title="Forbidden", server=persona.server,
+                                        text="You don't have permission to access this resource.")
+        responses["forbidden"] = CannedResponse(
+            "403 Forbidden",
+            [("Server", persona.server), ("Content-Type", "text/html; charset=iso-8859-1")],
+            body
+        )
+    else:
+        responses["forbidden"] = responses["not_found"]
+    return NoiseRouter(logger, paths, prefixes, responses, NOISE_SUMMARY_INTERVAL)
+
+def create_flask_app(args, logger, selector):
     app = Flask(__name__)
-    template = WORDPRESS_TEMPLATE
+    detector = HTTPDetector.from_file(getattr(args, 'http_rules', None) or DEFAULT_RULES_FILE)
 
     @app.before_request
     def before_request():
-        time.sleep(0.3)  # simulate delay
-        
-        # log the req
-        client_ip = request.remote_addr
-        extra = {
-            'ip': client_ip,
-            'port': args.http_port,
-            'method': request.method,
-            'path': request.path,
-            'headers': dict(request.headers),
-        }
+        persona = selector.select(request.environ)
+        request.environ['honeypot.persona'] = persona
         
-        # suspicious activity
-        is_suspicious = False
-        suspicious_paths = ['/wp-admin', '/wp-login', '/admin', '/shell', '/cmd']
-        path_lower = request.path.lower()
+        # suspicious activity, every matching rule is reported
+        query_string = unquote_plus(request.query_string.decode('utf-8', errors='ignore'))
+        # the body itself is in the body store, only its head is scanned
+        stored_body = request.environ.get('honeypot.body')
+        body = stored_body.head.decode('utf-8', errors='ignore') if stored_body else ''
+        if request.mimetype == 'application/x-www-form-urlencoded':
+            body = unquote_plus(body)
+        rules = detector.scan(request.path, query_string, body)
         
-        for path in suspicious_paths:
-            if path in path_lower:
-                is_suspicious = True
-                extra['suspicious_paths'] = path
-                break
+        # headers are only built if a structured sink wants them
+        port = int(request.environ.get('SERVER_PORT') or args.http_port)
+        event = HTTPEvent(request.environ, port, request.path, stored_body, rules, persona.name)
         
-        # check for SQL injection
-        query_string = request.query_string.decode('utf-8', errors='ignore').lower()
-        sql_patterns = ["' or '1'='1", "' or 1=1--", "union select", "select * from"]
-        
-        for pattern in sql_patterns:
-            if pattern in query_string:
-                is_suspicious = True
-                extra['sql_injection'] = pattern
-                break
-        
-        if is_suspicious:
+        if rules:
             logger.info(
-                f"Suspicious HTTP request - IP: {client_ip}, "
-                f"Method: {request.method}, Path: {request.path}",
-                extra=extra
+                f"Suspicious HTTP request - IP: {event.ip}, "
+                f"Method: {event.method}, Path: {event.path}, Rules: {', '.join(rules)}",
+                extra={'event': event}
             )
         else:
             logger.info(
-                f"HTTP request - IP: {client_ip}, "
-                f"Method: {request.method}, Path: {request.path}",
-                extra=extra
+                f"HTTP request - IP: {event.ip}, "
+                f"Method: {event.method}, Path: {event.path}",
+                extra={'event': event}
             )
 
-    @app.route('/', methods=['GET', 'POST'])
-    def index():
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>{template['title']}</title>
-            <link rel="stylesheet" href="/wp-content/themes/twentyTwenty/style.css">
-        </head>
-        <body>
-            <div class="wp-site-blocks">
-                <main>
-                    <article>
-                        <h2>Hello world!</h2>
-                        <p>Welcome to WordPress. This is your first post</p>
-                        <p><a href="{template['login_path']}">Log in</a></p>
-                    </article>
-                </main>
-                <footer>Powered by {template['version']}</footer>
-            </div>
-        </body>
-        </html>
-        """
-        
-        response = Response(html, mimetype='text/html')
-        for key, value in template['headers'].items():
-            response.headers[key] = value
-        return response
-
-    @app.route('/logo.png')
-    def serve_logo():
-        current_path = Path(__file__).resolve() 
-        project_root = current_path.parent.parent
-        images_dir = project_root / "images"
-        logo_path = images_dir / "logo.png"  
-        
-        if not logo_path.exists():
-            raise FileNotFoundError("logo.png not found in /images directory")
-        
-        return send_file(str(logo_path), mimetype='image/png')
+    def log_login(persona, username, password):
+        extra = {
+            'ip': request.remote_addr,
+            'username': username,
+            'password': password,
+            'login_page': request.path,
+            'persona': persona.name,
+        }
+        logger.info(
+            f"HTTP Login attempt - IP: {request.remote_addr}, "
+            f"Username: '{username}', Password: '{password}'",
+            extra=extra
+        )
 
-    @app.route('/wp-login.php', methods=['GET', 'POST'])
-    def login_page():
-        if request.method == 'POST':
-            username = request.form.get('username', '')
-            password = request.form.get('password', '')
-            
-            # log login attempt
-            extra = {
-                'ip': request.remote_addr,
-                'username': username,
-                'password': password,
-                'login_page': request.path,
-            }
-            
-            logger.info(
-                f"HTTP Login attempt - IP: {request.remote_addr}, "
-                f"Username: '{username}', Password: '{password}'",
-                extra=extra
-            )
-            
-            # always return invalid credentials
-            return """
-            <div style="margin: 40px; padding: 20px; border: 1px solid #f00; background: #fee;">
-                <h3>Login Error</h3>
-                <p>The username or password you entered is incorrect.</p>
-                <p><a href="/wp-login.php">Try again</a></p>
-            </div>
-            """, 401
+    @app.route('/', defaults={'path': ''}, methods=HTTP_METHODS)
+    @app.route('/<path:path>', methods=HTTP_METHODS)
+    def dispatch(path):
+        persona = request.environ['honeypot.persona']
+        route = persona.routes.get(request.path)
         
-        # show login form
-        html = """
-        <!DOCTYPE html>
-        <html lang="en-US">
-        <head>
-            <meta http-equiv="Content-Type" content="text/html; charset=UTF-8">
-            <title>Log In &lsaquo; WordPress &mdash; WordPress</title>
-            <meta name='robots' content='max-image-preview:large, noindex, noarchive'>
-            <link rel='stylesheet' id='dashicons-css' href='https://wordpress.org/wp-includes/css/dashicons.min.css' type='text/css' media='all'>
-            <link rel='stylesheet' id='buttons-css' href='https://wordpress.org/wp-includes/css/buttons.min.css' type='text/css' media='all'>
-            <link rel='stylesheet' id='forms-css' href='https://wordpress.org/wp-admin/css/forms.min.css' type='text/css' media='all'>
-            <link rel='stylesheet' id='l10n-css' href='https://wordpress.org/wp-admin/css/l10n.min.css' type='text/css' media='all'>
-            <link rel='stylesheet' id='login-css' href='https://wordpress.org/wp-admin/css/login.min.css' type='text/css' media='all'>
-            <meta name='referrer' content='strict-origin-when-cross-origin'>
-            <meta name="viewport" content="width=device-width">
-            <style>
-                /* Additional custom styling to perfect the look */
-                .login h1 a {
-                    background-image: url('/logo.png');
-                    background-size: contain;
-                    background-repeat: no-repeat;
-                    background-position: center;
-                    width: 84px;
-                    height: 84px;
-                }
-            </style>
-        </head>
-        <body class="login no-js login-action-login wp-core-ui locale-en-us">
-        <script type="text/javascript">document.body.className = document.body.className.replace('no-js','js');</script>
+        if route is None:
+            # static files of the persona are served from memory (/logo.png, ...)
+            response = persona.assets.respond(request, path) if persona.assets else None
+            return response or persona.not_found.respond(request)
         
-        <div id="login">
-            <h1><a href="https://wordpress.org/">Powered by WordPress</a></h1>
-            
-            <form name="loginform" id="loginform" action="/wp-login.php" method="post">
-                <p>
-                    <label for="user_login">Username or Email Address</label>
-                    <input type="text" name="username" id="user_login" class="input" value="" size="20" autocapitalize="off" autocomplete="username" required>
-                </p>
-                
-                <div class="user-pass-wrap">
-                    <label for="user_pass">Password</label>
-                    <div class="wp-pwd">
-                        <input type="password" name="password" id="user_pass" class="input password-input" value="" size="20" autocomplete="current-password" required>
-                        <button type="button" class="button button-secondary wp-hide-pw hide-if-no-js" data-toggle="0" aria-label="Show password">
-                            <span class="dashicons dashicons-visibility" aria-hidden="true"></span>
-                        </button>
-                    </div>
-                </div>
-                
-                <p class="forgetmenot">
-                    <input name="rememberme" type="checkbox" id="rememberme" value="forever">
-                    <label for="rememberme">Remember Me</label>
-                </p>
-                
-                <p class="submit">
-                    <input type="submit" name="wp-submit" id="wp-submit" class="button button-primary button-large" value="Log In">
-                    <input type="hidden" name="redirect_to" value="/wp-admin/">
-                    <input type="hidden" name="testcookie" value="1">
-                </p>
-            </form>
-            
-            <p id="nav">
-                <a href="/wp-login.php?action=lostpassword">Lost your password?</a>
-            </p>
-            
-            <p id="backtoblog">
-                <a href="/">&larr; Go to Site</a>
-            </p>
-        </div>
+        if request.method not in route.methods:
+            return "Method Not Allowed", 405
         
-        <script type='text/javascript' src='https://wordpress.org/wp-includes/js/jquery/jquery.min.js'></script>
-        <script type='text/javascript'>
-            (function(){
-                var showButton = document.querySelector('.wp-hide-pw');
-                var passwordInput = document.getElementById('user_pass');
-                
-                if (showButton && passwordInput) {
-                    showButton.addEventListener('click', function() {
-                        if (passwordInput.type === 'password') {
-                            passwordInput.type = 'text';
-                            showButton.querySelector('.dashicons').classList.remove('dashicons-visibility');
-                            showButton.querySelector('.dashicons').classList.add('dashicons-hidden');
-                            showButton.setAttribute('aria-label', 'Hide password');
-                        } else {
-                            passwordInput.type = 'password';
-                            showButton.querySelector('.dashicons').classList.remove('dashicons-hidden');
-                            showButton.querySelector('.dashicons').classList.add('dashicons-visibility');
-                            showButton.setAttribute('aria-label', 'Show password');
-                        }
-                    });
-                }
-            })();
-        </script>
+        login = route.login
+        if login is not None:
+            if login.kind == 'form' and request.method == 'POST':
+                # always return invalid credentials
+                log_login(persona, request.form.get(login.username_field, ''),
+                          request.form.get(login.password_field, ''))
+                return login.page.respond(request)
+            if login.kind == 'basic' and request.authorization:
+                auth = request.authorization
+                log_login(persona, auth.username or '', auth.password or '')
         
-        <div class="clear"></div>
-        </body>
-        </html>
-        """
-        
-        response = Response(html, mimetype='text/html')
-        for key, value in template['headers'].items():
-            response.headers[key] = value
-        return response
-
-    @app.route('/wp-admin', methods=['GET'])
-    def admin_page():
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>WordPress Admin • {template['title']}</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 0; background: #f1f1f1; }}
-                .wp-admin-bar {{ background: #23282d; color: white; padding: 15px; }}
-                .admin-content {{ padding: 20px; }}
-                .notice {{ background: #fff; border-left: 4px solid #00a0d2; padding: 10px; margin: 10px 0; }}
-            </style>
-        </head>
-        <body>
-            <div class="wp-admin-bar">
-                <strong>WordPress Admin</strong> • {template['title']}
-            </div>
-            <div class="admin-content">
-                <h2>Dashboard</h2>
-                <div class="notice">
-                    <p>Please log in to access the WordPress admin area.</p>
-                    <p><a href="/wp-login.php">Log in here</a></p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-            
-        response = Response(html, mimetype='text/html')
-        for key, value in template['headers'].items():
-            response.headers[key] = value
-        return response
-
-    @app.route('/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE', 'PATCH'])
-    def catch_all(path):
-        # return 404 for rest of paths
-        return "404 - Page not found", 404
+        return route.page.respond(request)
 
     return app
 
-def start_http_honeypot(args, logger):
-    app = create_flask_app(args, logger)
+def serve_http(args, logger, app, persona, port, noise):
+    """Run one listener, its delays and Server header come from its persona"""
+    delays = ResponseDelay(
+        getattr(args, 'http_delay', DEFAULT_DELAY),
+        getattr(args, 'http_delay_jitter', DEFAULT_DELAY_JITTER),
+        persona.delays
+    )
+    engine = getattr(args, 'http_engine', DEFAULT_ENGINE)
     
+    try:
+        if engine == "werkzeug":
+            # responses are delayed on a scheduler thread, not by sleeping in the worker
+            server = DeferredWSGIServer(
+                '0.0.0.0',
+                port,
+                noise.wsgi(app) if noise else app,
+                delays,
+                ResponseScheduler(logger)
+            )
+        else:
+            server = AsyncHTTPServer(
+                app,
+                logger,
+                delays,
+                port=port,
+                workers=getattr(args, 'http_workers', DEFAULT_WORKERS),
+                max_connections=getattr(args, 'http_max_connections', DEFAULT_MAX_CONNECTIONS),
+                keepalive_timeout=getattr(args, 'http_keepalive', DEFAULT_KEEPALIVE_TIMEOUT),
+                server_header=persona.server,
+                noise=noise
+            )
+        logger.info(f"HTTP honeypot serving {persona.name} with the {engine} engine on port {port}")
+        server.serve_forever()
+    except Exception as e:
+        logger.error(f"Failed to start HTTP honeypot on port {port}: {e}")
+
+def start_http_honeypot(args, logger):
     # Disable Flask logging
     flask_log = logging.getLogger('werkzeug')
     flask_log.setLevel(logging.ERROR)
     
-    # run flask in dev mode
+    # every persona is rendered once here, requests only look things up
     try:
-        app.run(
-            host='0.0.0.0',
-            port=args.http_port,
-            debug=False,
-            threaded=True,
-            use_reloader=False
+        personas = load_personas(getattr(args, 'http_personas_dir', None) or PERSONAS_DIR, logger)
+        by_port = dict(getattr(args, 'http_persona_ports', None) or [])
+        selector = PersonaSelector(
+            personas,
+            getattr(args, 'http_persona', DEFAULT_PERSONA),
+            by_port,
+            dict(getattr(args, 'http_persona_hosts', None) or [])
         )
-    except Exception as e:
-        logger.error(f"Failed to start HTTP honeypot: {e}")
\ No newline at end of file
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to load HTTP personas: {e}")
+        return
+    
+    app = create_flask_app(args, logger, selector)
+    
+    # every request body is streamed into the store before the app sees it
+    store = BodyStore(
+        getattr(args, 'http_body_dir', None) or BODY_DIR,
+        logger,
+        max_body_size=getattr(args, 'http_max_body', DEFAULT_MAX_BODY_MB) << 20,
+        max_total_size=getattr(args, 'http_body_store', DEFAULT_BODY_STORE_MB) << 20
+    )
+    app = store.wsgi(app)
+    
+    # one listener per port, each with the persona that owns it
+    ports = [args.http_port] + [port for port in by_port if port != args.http_port]
+    for port in ports[1:]:
+        persona = selector.for_port(port)
+        noise = None if getattr(args, 'http_log_noise', False) else create_noise_router(persona, logger)
+        threading.Thread(
+            target=serve_http,
+            args=(args, logger, app, persona, port, noise),
+            daemon=True,
+            name=f"HTTP-{port}"
+        ).start()
+    
+    # known scanner probes are answered and counted before the app runs
+    persona = selector.for_port(args.http_port)
+    noise = None if getattr(args, 'http_log_noise', False) else create_noise_router(persona, logger)
+    serve_http(args, logger, app, persona, args.http_port, noise)
@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+"""
+HTTP serving for the honeypot
+two engines share the same WSGI app and delay policy:
+  async    - asyncio server with keep-alive and connection limits, the
+             delay is an asyncio.sleep on the connection's coroutine
+  werkzeug - threaded werkzeug server, the rendered response is parked on
+             a shared scheduler thread while the worker moves on
+"""
+import asyncio
+import heapq
+import io
+import random
+import selectors
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http import HTTPStatus
+from urllib.parse import unquote_to_bytes
+
+from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler
+
+
+class ResponseDelay:
+    """
+    Per-route artificial latency, routes are matched by path prefix
+    (longest first) and every delay gets +/- jitter
+    """
+    def __init__(self, default, jitter=0.0, routes=None):
+        self.default = default
+        self.jitter = jitter
+        # longest prefix wins
+        self.routes = sorted((routes or {}).items(), key=lambda item: len(item[0]), reverse=True)
+
+    def for_path(self, path):
+        base = self.default
+        for prefix, delay in self.routes:
+            if path.startswith(prefix):
+                base = delay
+                break
+        if self.jitter:
+            base += random.uniform(-self.jitter, self.jitter)
+        return max(0.0, base)
+
+
+class ResponseScheduler:
+    """
+    One thread that writes parked responses once their delay is over. The
+    sockets are non-blocking and written as a selector reports them ready,
+    so a client that stops reading only holds up its own response
+    """
+    SEND_TIMEOUT = 30  # seconds a slow reader gets to take its response
+
+    def __init__(self, logger, name="HTTP-Delay"):
+        self.logger = logger
+        self.name = name
+        self.heap = []  # (due time, sequence, socket, data)
+        self.counter = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+        self.selector = selectors.DefaultSelector()
+        self.outgoing = {}  # socket -> [unsent bytes as a memoryview, deadline]
+        # schedule() writes a byte here so a new response does not wait out the select timeout
+        self.wakeup, self.waker = socket.socketpair()
+        self.wakeup.setblocking(False)
+        self.waker.setblocking(False)
+        self.selector.register(self.wakeup, selectors.EVENT_READ)
+
+    def schedule(self, sock, data, delay):
+        with self.lock:
+            self.counter += 1
+            heapq.heappush(self.heap, (time.monotonic() + delay, self.counter, sock, data))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True, name=self.name)
+                self.thread.start()
+        try:
+            self.waker.send(b"\0")
+        except BlockingIOError:
+            pass  # the loop has wakeups pending already
+
+    def pending(self):
+        with self.lock:
+            return len(self.heap) + len(self.outgoing)
+
+    def _start(self, sock, data, now):
+        try:
+            sock.setblocking(False)
+        except OSError:
+            sock.close()
+            return
+        self.outgoing[sock] = [memoryview(data), now + self.SEND_TIMEOUT]
+        if self._write(sock):
+            self._finish(sock)
+        else:
+            self.selector.register(sock, selectors.EVENT_WRITE)
+
+    def _write(self, sock):
+        """Send as much as the socket takes, True once the response is out or cannot be"""
+        entry = self.outgoing[sock]
+        try:
+            sent = sock.send(entry[0])
+        except BlockingIOError:
+            return False
+        except OSError as e:
+            self.logger.debug(f"Delayed HTTP response not delivered: {e}")
+            entry[0] = entry[0][:0]
+            return True
+        entry[0] = entry[0][sent:]
+        return not entry[0]
+
+    def _finish(self, sock):
+        self.outgoing.pop(sock, None)
+        try:
+            self.selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+        try:
+            sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+        sock.close()
+
+    def _run(self):
+        while True:
+            now = time.monotonic()
+            due = []
+            with self.lock:
+                while self.heap and self.heap[0][0] <= now:
+                    due.append(heapq.heappop(self.heap))
+                timeout = self.heap[0][0] - now if self.heap else None
+            for _, _, sock, data in due:
+                self._start(sock, data, now)
+
+            if self.outgoing:
+                deadline = min(entry[1] for entry in self.outgoing.values()) - now
+                timeout = deadline if timeout is None else min(timeout, deadline)
+            for key, _ in self.selector.select(None if timeout is None else max(0.0, timeout)):
+                if key.fileobj is self.wakeup:
+                    try:
+                        while self.wakeup.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                elif self._write(key.fileobj):
+                    self._finish(key.fileobj)
+
+            now = time.monotonic()
+            for sock in [sock for sock, entry in self.outgoing.items() if entry[1] <= now]:
+                self.logger.debug(f"Delayed HTTP response not delivered: client stopped reading for {self.SEND_TIMEOUT}s")
+                self._finish(sock)
+
+
+class DeferredWSGIRequestHandler(WSGIRequestHandler):
+    """
+    Renders the response into memory, then hands the socket and the bytes
+    to the server's scheduler instead of sleeping in the worker thread
+    """
+    def setup(self):
+        super().setup()
+        self.socket_wfile = self.wfile
+        self.wfile = io.BytesIO()
+
+    def send_response(self, code, message=None):
+        # the persona sends its own Server header, never advertise werkzeug
+        self.log_request(code)
+        self.send_response_only(code, message)
+        self.send_header("Date", self.date_time_string())
+
+    def finish(self):
+        data = self.wfile.getvalue()
+        self.wfile = self.socket_wfile
+
+        noise = getattr(self, "environ", {}).get("honeypot.noise")
+        delay = self.server.delays.for_path(getattr(self, "path", "/")) if data and not noise else 0
+        if delay > 0:
+            self.server.park(self.connection)
+            self.server.scheduler.schedule(self.connection, data, delay)
+        elif data:
+            try:
+                self.wfile.write(data)
+            except OSError:
+                pass
+        super().finish()
+
+
+class DeferredWSGIServer(ThreadedWSGIServer):
+    """
+    Threaded werkzeug server that leaves parked sockets open after the
+    handler returns, the scheduler closes them once the response is sent
+    """
+    def __init__(self, host, port, app, delays, scheduler, backlog=128):
+        self.request_queue_size = backlog
+        super().__init__(host, port, app, handler=DeferredWSGIRequestHandler)
+        self.delays = delays
+        self.scheduler = scheduler
+        self.parked = set()
+        self.parked_lock = threading.Lock()
+
+    def park(self, sock):
+        with self.parked_lock:
+            self.parked.add(sock)
+
+    def shutdown_request(self, request):
+        with self.parked_lock:
+            if request in self.parked:
+                self.parked.discard(request)
+                return
+        super().shutdown_request(request)
+
+
+class AsyncHTTPServer:
+    """
+    asyncio HTTP/1.1 front end for a WSGI app
+    connections, keep-alive and the response delay live on the event loop,
+    only the WSGI call itself runs on a small thread pool
+    """
+    SPOOL_SIZE = 65536  # request bodies past this are spooled to disk
+    def __init__(self, app, logger, delays, host='0.0.0.0', port=8080,
+                 workers=16, max_connections=1024, backlog=512,
+                 keepalive_timeout=5.0, max_keepalive_requests=100,
+                 header_timeout=10.0, body_timeout=60.0, max_header_size=16384, max_body_size=64 << 20,
+                 server_header="Apache/2.4.58 (Ubuntu)", noise=None):
+        self.app = app
+        self.noise = noise
+        self.logger = logger
+        self.delays = delays
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections
+        self.backlog = backlog
+        self.keepalive_timeout = keepalive_timeout
+        self.max_keepalive_requests = max_keepalive_requests
+        self.header_timeout = header_timeout
+        self.max_header_size = max_header_size
+        self.body_timeout = body_timeout
+        self.max_body_size = max_body_size
+        self.server_header = server_header
+
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="HTTP-Worker")
+        self.connections = 0
+        self.rejected = 0
+
+    def serve_forever(self):
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        server = await asyncio.start_server(
+            self._handle_connection,
+            self.host,
+            self.port,
+            backlog=self.backlog,
+            limit=self.max_header_size,
+            reuse_address=True
+        )
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_connection(self, reader, writer):
+        if self.connections >= self.max_connections:
+            self.rejected += 1
+            writer.write(self._render(503, [("Content-Type", "text/plain")], b"Service Unavailable", False))
+            await self._close(writer)
+            return
+
+        self.connections += 1
+        peer = writer.get_extra_info("peername") or ("", 0)
+        try:
+            for served in range(self.max_keepalive_requests):
+                timeout = self.header_timeout if served == 0 else self.keepalive_timeout
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+                except asyncio.LimitOverrunError:
+                    writer.write(self._render(431, [("Content-Type", "text/plain")],
+                                              b"Request Header Fields Too Large", False))
+                    break
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+
+                request = self._parse_head(head)
+                if request is None:
+                    writer.write(self._render(400, [("Content-Type", "text/plain")], b"Bad Request", False))
+                    break
+                method, target, version, headers = request
+
+                try:
+                    body = await asyncio.wait_for(self._read_body(reader, headers), self.body_timeout)
+                except (ValueError, asyncio.LimitOverrunError):
+                    writer.write(self._render(400, [("Content-Type", "text/plain")], b"Bad Request", False))
+                    break
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    break
+                if body is None:
+                    writer.write(self._render(413, [("Content-Type", "text/plain")],
+                                              b"Request Entity Too Large", False))
+                    break
+
+                keep_alive = self._wants_keep_alive(version, headers) and served + 1 < self.max_keepalive_requests
+                environ = self._make_environ(method, target, version, headers, body, peer)
+
+                # scanner noise is answered right here, no thread and no delay
+                canned = self.noise.lookup(environ) if self.noise else None
+                if canned is not None:
+                    body[0].close()
+                    status, response_headers, response_body = canned.status, canned.headers, canned.body
+                else:
+                    loop = asyncio.get_running_loop()
+                    try:
+                        status, response_headers, response_body = await loop.run_in_executor(
+                            self.executor, self._call_app, environ
+                        )
+                    finally:
+                        body[0].close()
+
+                    # the delay parks this coroutine, not a thread
+                    delay = self.delays.for_path(environ["PATH_INFO"])
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+
+                writer.write(self._render(status, response_headers, response_body, keep_alive,
+                                          send_body=method != "HEAD"))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        except Exception as e:
+            self.logger.error(f"HTTP connection error from {peer[0]}: {e}")
+        finally:
+            self.connections -= 1
+            await self._close(writer)
+
+    @staticmethod
+    async def _close(writer):
+        try:
+            writer.close()
+            await writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+    @staticmethod
+    def _parse_head(head):
+        try:
+            lines = head.decode("latin-1").split("\r\n")
+            method, target, version = lines[0].split(" ")
+        except (UnicodeDecodeError, ValueError):
+            return None
+        if not version.startswith("HTTP/1."):
+            return None
+
+        headers = []
+        for line in lines[1:]:
+            if not line:
+                continue
+            name, sep, value = line.partition(":")
+            if not sep:
+                return None
+            headers.append((name.strip(), value.strip()))
+        return method.upper(), target, version, headers
+
+    @staticmethod
+    def _header(headers, name):
+        name = name.lower()
+        for key, value in headers:
+            if key.lower() == name:
+                return value
+        return None
+
+    def _wants_keep_alive(self, version, headers):
+        connection = (self._header(headers, "Connection") or "").lower()
+        if version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    async def _read_body(self, reader, headers):
+        """
+        Spool the request body, in memory up to SPOOL_SIZE and on disk past it
+        returns (file positioned at 0, size), or None if it is too large. Raises
+        ValueError on malformed framing and IncompleteReadError if it is cut short
+        """
+        body = tempfile.SpooledTemporaryFile(max_size=self.SPOOL_SIZE)
+        size = 0
+        try:
+            if (self._header(headers, "Transfer-Encoding") or "").lower() == "chunked":
+                while True:
+                    chunk_size = int((await self._readline(reader)).split(b";")[0].strip(), 16)
+                    if chunk_size < 0:
+                        raise ValueError(f"negative chunk size {chunk_size}")
+                    if chunk_size == 0:
+                        # trailers end with an empty line
+                        while (await self._readline(reader)).strip():
+                            pass
+                        break
+                    if size + chunk_size > self.max_body_size:
+                        body.close()
+                        return None
+                    size += await self._copy(reader, body, chunk_size)
+                    await self._readline(reader)
+            else:
+                length = self._header(headers, "Content-Length")
+                length = int(length) if length else 0
+                if length < 0:
+                    raise ValueError(f"negative Content-Length {length}")
+                if length > self.max_body_size:
+                    body.close()
+                    return None
+                size = await self._copy(reader, body, length)
+        except BaseException:
+            body.close()
+            raise
+
+        body.seek(0)
+        return body, size
+
+    @staticmethod
+    async def _readline(reader):
+        """One line of chunked framing, an over-long line raises ValueError"""
+        line = await reader.readline()
+        if not line.endswith(b"\n"):
+            raise asyncio.IncompleteReadError(line, None)
+        return line
+
+    @staticmethod
+    async def _copy(reader, output, length):
+        remaining = length
+        while remaining:
+            chunk = await reader.read(min(remaining, 65536))
+            if not chunk:
+                raise asyncio.IncompleteReadError(b"", remaining)
+            output.write(chunk)
+            remaining -= len(chunk)
+        return length
+
+    def _make_environ(self, method, target, version, headers, body, peer):
+        path, _, query = target.partition("?")
+        if path.startswith(("http://", "https://")):
+            # absolute-form request target, as sent to proxies
+            path = "/" + path.split("://", 1)[1].partition("/")[2]
+
+        environ = {
+            "REQUEST_METHOD": method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": unquote_to_bytes(path).decode("latin-1"),
+            "QUERY_STRING": query,
+            "RAW_URI": target,
+            "REQUEST_URI": target,
+            "SERVER_NAME": self.host,
+            "SERVER_PORT": str(self.port),
+            "SERVER_PROTOCOL": version,
+            "REMOTE_ADDR": peer[0],
+            "REMOTE_PORT": str(peer[1]),
+            "CONTENT_LENGTH": str(body[1]) if body[1] else "",
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": body[0],
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in headers:
+            key = name.upper().replace("-", "_")
+            if key == "CONTENT_TYPE":
+                environ["CONTENT_TYPE"] = value
+            elif key not in ("CONTENT_LENGTH", "TRANSFER_ENCODING"):
+                key = "HTTP_" + key
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    def _call_app(self, environ):
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = status
+            response["headers"] = headers
+
+        try:
+            result = self.app(environ, start_response)
+            try:
+                body = b"".join(result)
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+        except Exception as e:
+            self.logger.error(f"HTTP application error: {e}")
+            return "500 Internal Server Error", [("Content-Type", "text/plain")], b"Internal Server Error"
+        return response["status"], response["headers"], body
+
+    def _render(self, status, headers, body, keep_alive, send_body=True):
+        code = status if isinstance(status, int) else int(status.split(" ", 1)[0])
+        try:
+            # werkzeug upper-cases reason phrases ("304 NOT MODIFIED"), Apache does not
+            status = f"{code} {HTTPStatus(code).phrase}"
+        except ValueError:
+            pass
+
+        lines = [f"HTTP/1.1 {status}"]
+        has_server = False
+        length = len(body)
+        for name, value in headers:
+            lower = name.lower()
+            if lower == "content-length" and not send_body:
+                # the app already dropped the body of a HEAD response, keep its length
+                length = value
+                continue
+            if lower in ("content-length", "connection", "transfer-encoding", "date"):
+                continue
+            has_server = has_server or lower == "server"
+            lines.append(f"{name}: {value}")
+        if not has_server and self.server_header:
+            lines.append(f"Server: {self.server_header}")
+        lines.append(f"Date: {formatdate(usegmt=True)}")
+        if code >= 200 and code not in (204, 304):
+            lines.append(f"Content-Length: {length}")
+        lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+        return head + body if send_body else head
@@ -1,12 +1,36 @@
 """
 logging system
 """
+import json
 import logging
 import sys
 from pathlib import Path
 from datetime import datetime
 
-def setup_logging():
+# LogRecord attributes that are not user supplied extras
+RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JSONEventFormatter(logging.Formatter):
+    """
+    One JSON object per line, structured events (extra={'event': ...}) are
+    serialized here, so only this sink pays for them
+    """
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key in RECORD_ATTRS:
+                continue
+            entry[key] = value.to_dict() if hasattr(value, "to_dict") else value
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(json_log=False):
     # setup the place for logs
     current_file = Path(__file__).resolve()
     project_root = current_file.parent.parent
@@ -43,4 +67,13 @@ def setup_logging():
     except IOError as e:
         logger.warning(f"could not open log file: {e}")
     
+    # structured log, one JSON object per line
+    if json_log:
+        try:
+            json_handler = logging.FileHandler(log_dir / f"honeypot_events_{timestamp}.jsonl", encoding='utf-8')
+            json_handler.setFormatter(JSONEventFormatter())
+            logger.addHandler(json_handler)
+        except IOError as e:
+            logger.warning(f"could not open JSON log file: {e}")
+    
     return logger
\ No newline at end of file
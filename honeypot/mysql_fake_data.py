@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Fake table contents for the MySQL honeypot
+every table has a schema and a row count. Row n is generated from a
+random.Random seeded with the table name and n, so it is the same on every
+query and across restarts, and any slice of a table can be produced on
+demand: a SELECT over a million row table never holds more than the rows
+of one batch in memory
+"""
+import random
+import re
+import zlib
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from honeypot.mysql_statements import MAX_STATEMENT_CHARS
+
+SelectQuery = namedtuple("SelectQuery", "fields database table offset limit")
+
+FIRST_NAMES = ("james", "mary", "john", "patricia", "robert", "jennifer", "michael", "linda",
+               "william", "elizabeth", "david", "susan", "richard", "jessica", "joseph", "sarah",
+               "thomas", "karen", "charles", "nancy", "daniel", "lisa", "matthew", "sandra")
+LAST_NAMES = ("smith", "johnson", "williams", "brown", "jones", "garcia", "miller", "davis",
+              "rodriguez", "martinez", "wilson", "anderson", "taylor", "thomas", "moore", "jackson",
+              "martin", "lee", "thompson", "white", "harris", "clark", "lewis", "walker")
+DOMAINS = ("gmail.com", "yahoo.com", "hotmail.com", "outlook.com", "company.com", "protonmail.com")
+WORDS = ("lorem", "ipsum", "dolor", "sit", "amet", "update", "order", "invoice", "account",
+         "shipping", "payment", "review", "welcome", "hello", "world", "product", "service")
+STREETS = ("Main St", "Oak Ave", "Pine Rd", "Maple Dr", "Cedar Ln", "Elm St", "Park Ave")
+CITIES = ("New York", "Chicago", "Houston", "Phoenix", "Dallas", "Austin", "Denver", "Seattle")
+HASH_CHARS = "./0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+EPOCH = datetime(2018, 1, 1)
+SPAN = 6 * 365 * 24 * 3600  # seconds of history after EPOCH
+
+
+def _name(rng):
+    return rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+
+
+def _login(rng, n):
+    first, last = _name(rng)
+    return f"{first}{rng.choice(('', '.', '_'))}{last}{n % 97 if n % 3 else ''}"
+
+
+def _email(rng, n):
+    first, last = _name(rng)
+    return f"{first}.{last}{n % 89 if n % 2 else ''}@{rng.choice(DOMAINS)}"
+
+
+def _hash_chars(rng, count):
+    return "".join(rng.choice(HASH_CHARS) for _ in range(count))
+
+
+def _datetime(rng):
+    return (EPOCH + timedelta(seconds=rng.randrange(SPAN))).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _choice(*values):
+    return lambda rng, n: rng.choice(values)
+
+
+# type -> (field type, display length, charset, flags, decimals) of its column definitions
+TYPES = {
+    "id": (0x08, 20, 0x3f, 0x0223, 0),  # BIGINT UNSIGNED NOT NULL PRIMARY KEY AUTO_INCREMENT
+    "int": (0x03, 11, 0x3f, 0x0001, 0),
+    "decimal": (0xf6, 12, 0x3f, 0x0001, 2),
+    "datetime": (0x0c, 19, 0x3f, 0x0081, 0),
+    "string": (0xfd, 765, 0x21, 0x0001, 0),
+}
+
+# kind -> (type, value of row n); values are text, like the text protocol sends them
+KINDS = {
+    "id": ("id", lambda rng, n: str(n)),
+    "ref": ("int", lambda rng, n: str(rng.randint(1, 5000))),
+    "count": ("int", lambda rng, n: str(rng.randint(0, 250))),
+    "amount": ("decimal", lambda rng, n: f"{rng.uniform(1, 5000):.2f}"),
+    "datetime": ("datetime", lambda rng, n: _datetime(rng)),
+    "login": ("string", _login),
+    "email": ("string", _email),
+    "first_name": ("string", lambda rng, n: rng.choice(FIRST_NAMES).title()),
+    "last_name": ("string", lambda rng, n: rng.choice(LAST_NAMES).title()),
+    "full_name": ("string", lambda rng, n: " ".join(part.title() for part in _name(rng))),
+    "phpass": ("string", lambda rng, n: "$P$B" + _hash_chars(rng, 30)),
+    "bcrypt": ("string", lambda rng, n: "$2y$10$" + _hash_chars(rng, 53)),
+    "native": ("string", lambda rng, n: "*" + "".join(rng.choice("0123456789ABCDEF") for _ in range(40))),
+    "token": ("string", lambda rng, n: "%032x" % rng.getrandbits(128)),
+    "ip": ("string", lambda rng, n: ".".join(str(rng.randint(1, 254)) for _ in range(4))),
+    "phone": ("string", lambda rng, n: f"+1-{rng.randint(200, 999)}-{rng.randint(200, 999)}-{rng.randint(1000, 9999)}"),
+    "address": ("string", lambda rng, n: f"{rng.randint(1, 9999)} {rng.choice(STREETS)}, {rng.choice(CITIES)}"),
+    "card": ("string", lambda rng, n: f"************{rng.randint(1000, 9999)}"),
+    "title": ("string", lambda rng, n: " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))).capitalize()),
+    "text": ("string", lambda rng, n: " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 30))).capitalize() + "."),
+    "sku": ("string", lambda rng, n: f"SKU-{rng.randint(10000, 99999)}"),
+    "host": ("string", _choice("localhost", "%", "127.0.0.1", "10.0.0.%")),
+    "plugin": ("string", _choice("mysql_native_password")),
+    "flag": ("string", _choice("Y", "N")),
+    "status": ("string", _choice("active", "active", "active", "inactive", "pending", "banned")),
+    "order_status": ("string", _choice("pending", "processing", "shipped", "delivered", "cancelled", "refunded")),
+    "payment_method": ("string", _choice("visa", "mastercard", "amex", "paypal", "bank_transfer")),
+    "currency": ("string", _choice("USD", "USD", "EUR", "GBP")),
+    "post_type": ("string", _choice("post", "page", "revision", "attachment")),
+    "meta_key": ("string", _choice("_edit_lock", "_edit_last", "_thumbnail_id", "_wp_page_template")),
+    "option_name": ("string", lambda rng, n: f"option_{n}" if n > 8 else ("siteurl", "home", "blogname", "blogdescription",
+                                                                         "admin_email", "users_can_register", "db_version",
+                                                                         "active_plugins")[n - 1]),
+}
+
+# table -> (rows, [(column, kind)]), tables not listed get DEFAULT_SCHEMA
+SCHEMAS = {
+    "user": (12, [("Host", "host"), ("User", "login"), ("Select_priv", "flag"), ("Insert_priv", "flag"),
+                  ("Super_priv", "flag"), ("plugin", "plugin"), ("authentication_string", "native")]),
+    "users": (5000, [("id", "id"), ("username", "login"), ("email", "email"), ("password", "bcrypt"),
+                     ("first_name", "first_name"), ("last_name", "last_name"), ("status", "status"),
+                     ("last_login_ip", "ip"), ("created_at", "datetime")]),
+    "products": (1200, [("id", "id"), ("sku", "sku"), ("name", "title"), ("description", "text"),
+                        ("price", "amount"), ("stock", "count"), ("created_at", "datetime")]),
+    "orders": (250000, [("id", "id"), ("customer_id", "ref"), ("total", "amount"), ("currency", "currency"),
+                        ("status", "order_status"), ("created_at", "datetime")]),
+    "customers": (40000, [("id", "id"), ("first_name", "first_name"), ("last_name", "last_name"),
+                          ("email", "email"), ("phone", "phone"), ("address", "address"), ("created_at", "datetime")]),
+    "invoices": (180000, [("id", "id"), ("order_id", "ref"), ("customer_id", "ref"), ("amount", "amount"),
+                          ("currency", "currency"), ("issued_at", "datetime")]),
+    "wp_users": (1284, [("ID", "id"), ("user_login", "login"), ("user_pass", "phpass"), ("user_nicename", "login"),
+                        ("user_email", "email"), ("user_registered", "datetime"), ("display_name", "full_name")]),
+    "wp_posts": (9000, [("ID", "id"), ("post_author", "ref"), ("post_date", "datetime"), ("post_title", "title"),
+                        ("post_content", "text"), ("post_status", "status"), ("post_type", "post_type")]),
+    "wp_options": (300, [("option_id", "id"), ("option_name", "option_name"), ("option_value", "title"),
+                         ("autoload", "flag")]),
+    "wp_comments": (60000, [("comment_ID", "id"), ("comment_post_ID", "ref"), ("comment_author", "full_name"),
+                            ("comment_author_email", "email"), ("comment_author_IP", "ip"),
+                            ("comment_date", "datetime"), ("comment_content", "text")]),
+    "wp_postmeta": (45000, [("meta_id", "id"), ("post_id", "ref"), ("meta_key", "meta_key"), ("meta_value", "ref")]),
+    "accounts": (90000, [("id", "id"), ("owner", "full_name"), ("email", "email"), ("balance", "amount"),
+                         ("currency", "currency"), ("status", "status"), ("opened_at", "datetime")]),
+    "transactions": (1000000, [("id", "id"), ("account_id", "ref"), ("amount", "amount"), ("currency", "currency"),
+                               ("method", "payment_method"), ("card", "card"), ("created_at", "datetime")]),
+    "payments": (300000, [("id", "id"), ("invoice_id", "ref"), ("amount", "amount"), ("method", "payment_method"),
+                          ("card", "card"), ("paid_at", "datetime")]),
+    "sessions": (500000, [("id", "id"), ("user_id", "ref"), ("token", "token"), ("ip", "ip"),
+                          ("expires_at", "datetime")]),
+    "user_credentials": (20000, [("id", "id"), ("username", "login"), ("email", "email"),
+                                 ("password_hash", "bcrypt"), ("api_key", "token"), ("updated_at", "datetime")]),
+    "user_profiles": (20000, [("id", "id"), ("user_id", "ref"), ("full_name", "full_name"), ("phone", "phone"),
+                              ("address", "address"), ("created_at", "datetime")]),
+    "user_sessions": (150000, [("id", "id"), ("user_id", "ref"), ("session_token", "token"), ("ip", "ip"),
+                               ("created_at", "datetime")]),
+}
+DEFAULT_SCHEMA = (100, [("id", "id"), ("name", "login"), ("value", "title"), ("created_at", "datetime")])
+
+# each pattern is matched at one place or scans forward once, nothing backtracks over the query
+SELECT_RE = re.compile(r"select\s", re.IGNORECASE)
+FROM_RE = re.compile(r"\sfrom\s", re.IGNORECASE)
+TABLE_RE = re.compile(r"\s*([`\w$]+(?:\s*\.\s*[`\w$]+)?)")
+LIMIT_RE = re.compile(r"\blimit\s+(\d+)(?:\s*,\s*(\d+)|\s+offset\s+(\d+))?$", re.IGNORECASE)
+IDENTIFIER_RE = re.compile(r"(?:`?\w+`?\s*\.\s*)?`?(\w+)`?")
+
+
+class FakeTable:
+    """The rows of one table, generated when they are read"""
+    __slots__ = ("name", "columns", "types", "generators", "row_count", "seed")
+
+    def __init__(self, name, row_count, columns):
+        self.name = name
+        self.columns = [column for column, _ in columns]
+        self.types = [KINDS[kind][0] for _, kind in columns]
+        self.generators = [KINDS[kind][1] for _, kind in columns]
+        self.row_count = row_count
+        # crc32 and not hash(), which changes with every interpreter run
+        self.seed = zlib.crc32(name.lower().encode("utf-8")) << 32
+
+    def row(self, n, rng=None):
+        """Row n, counting from 1"""
+        rng = rng or random.Random()
+        rng.seed(self.seed | n)
+        return tuple(generate(rng, n) for generate in self.generators)
+
+    def rows(self, offset=0, limit=None):
+        end = self.row_count if limit is None else min(self.row_count, offset + limit)
+        rng = random.Random()
+        for n in range(offset + 1, end + 1):
+            yield self.row(n, rng)
+
+    def field_indexes(self, fields):
+        """
+        Column positions for a select list: every column for *, otherwise
+        only bare column names are projected and anything else (functions,
+        expressions) gets the whole row. None for count(*)
+        """
+        fields = fields.strip()
+        if re.fullmatch(r"count\s*\(\s*(?:\*|1)\s*\)", fields, re.IGNORECASE):
+            return None
+        lookup = {column.lower(): index for index, column in enumerate(self.columns)}
+        indexes = []
+        for field in fields.split(","):
+            match = IDENTIFIER_RE.fullmatch(field.strip())
+            if not match or match.group(1).lower() not in lookup:
+                return list(range(len(self.columns)))
+            indexes.append(lookup[match.group(1).lower()])
+        return indexes
+
+
+def fake_table(name):
+    row_count, columns = SCHEMAS.get(name, DEFAULT_SCHEMA)
+    return FakeTable(name, row_count, columns)
+
+
+def parse_select(query, max_length=MAX_STATEMENT_CHARS):
+    """
+    SelectQuery of a 'SELECT ... FROM [db.]table ... [LIMIT ...]', None for
+    anything else. Only the first max_length characters are looked at
+    """
+    query = query[:max_length]
+    if not SELECT_RE.match(query):
+        return None
+    # the select list runs to the first FROM, found in one forward scan
+    from_match = FROM_RE.search(query, 6)
+    if not from_match or not query[6:from_match.start()].strip():
+        return None
+    table_match = TABLE_RE.match(query, from_match.end())
+    if not table_match:
+        return None
+    database, _, table = table_match.group(1).replace("`", "").replace(" ", "").rpartition(".")
+    offset, limit = parse_limit(query[table_match.end():]) or (0, None)
+    return SelectQuery(query[6:from_match.start()], database or None, table, offset, limit)
+
+
+def parse_limit(text):
+    """(offset, limit) of the LIMIT clause text ends with, None if it has none"""
+    text = text.rstrip().rstrip(";").rstrip()
+    start = text.lower().rfind("limit")
+    match = LIMIT_RE.match(text, start) if start >= 0 else None
+    if not match:
+        return None
+    first, second, offset_value = match.groups()
+    if second is not None:
+        return int(first), int(second)
+    return int(offset_value or 0), int(first)
@@ -2,16 +2,29 @@
 """
 MySQL Honeypot Module
 """
+import asyncio
 import socket
 import threading
 import struct
 import random
 import time
-import re
-from datetime import datetime
+from config import settings
+from honeypot.mysql_fake_data import TYPES, fake_table, parse_limit, parse_select
+from honeypot.mysql_session import MAX_NAME_CHARS, ConnectionIds, MySQLSession
+from honeypot.mysql_protocol import (CLIENT_COMPRESS, CLIENT_MULTI_STATEMENTS, RECV_SIZE, SERVER_MORE_RESULTS_EXISTS,
+                                     CompressedStream, PacketBuffer, PacketReader, PacketTooLarge, lenenc_int,
+                                     packet_header, packet_offsets)
+from honeypot.mysql_statements import (CLIENT_QUERY_ATTRIBUTES, FIXED_TYPES, TEMPORAL_TYPES, StatementError,
+                                       prepare_ok, query_offset, split_statements, temporal_bytes)
+from honeypot.query_analyzer import DEFAULT_RULES_FILE, QueryAnalyzer, QueryFingerprints
+
+DEFAULT_ENGINE = settings.MYSQL_ENGINE
+IDLE_TIMEOUT = 30  # seconds a session may sit without sending a packet
+INLINE_PACKET_SIZE = 4096  # longer packets are handled on a worker thread by the async engine
+ROW_BATCH = 512  # rows of a fake table framed per write
 
 class MySQLHoneypot:
-    def __init__(self, host='0.0.0.0', port=3306, logger=None):
+    def __init__(self, host='0.0.0.0', port=3306, logger=None, rules_file=None):
         self.host = host
         self.port = port
         self.logger = logger
@@ -24,8 +37,8 @@ class MySQLHoneypot:
         self.status_flags = 0x0002
         self.capability_flags = self._get_capability_flags()
         
-        # Connection tracking
-        self.connection_counter = 0
+        # Connection tracking, ids come from a locked counter shared by all client threads
+        self.connection_ids = ConnectionIds()
         self.active_connections = {}
         
         # Fake data
@@ -37,42 +50,64 @@ class MySQLHoneypot:
             "production": ["accounts", "transactions", "payments", "sessions"],
             "users_db": ["user_credentials", "user_profiles", "user_sessions"],
         }
+        # (database, table) -> (FakeTable, column definitions), built on the first SELECT
+        self.table_specs = {}
+        self.static_specs = self._static_specs()
+        self.static_results = {key: self._result_set(*spec) for key, spec in self.static_specs.items()}
+        self.static_binary = {key: self._result_set(*spec, binary=True) for key, spec in self.static_specs.items()}
+        # prepared statement parameters are described as untyped strings
+        self.param_definition = self._create_column_definition(
+            catalog='def',
+            schema='',
+            table='',
+            org_table='',
+            name='?',
+            org_name='',
+            charset=0x3f,
+            length=0,
+            field_type=0xfd,
+            flags=0x0080,
+            decimals=0
+        )
+        self.count_definition = self._create_column_definition(
+            catalog='def',
+            schema='',
+            table='',
+            org_table='',
+            name='count(*)',
+            org_name='',
+            charset=0x3f,
+            length=21,
+            field_type=0x08,
+            flags=0x0081,
+            decimals=0
+        )
         
-        # Attack patterns
-        self.sql_patterns = [
-            (r"'.*or.*'.*='.*", "SQL Injection (OR bypass)"),
-            (r"union.*select", "Union-based SQLi"),
-            (r"sleep\s*\(\d+\)", "Time-based SQLi"),
-            (r"benchmark\s*\(", "Benchmark-based SQLi"),
-            (r"load_file\s*\(.*\)", "File read attempt"),
-            (r"into\s+outfile", "File write attempt"),
-            (r"into\s+dumpfile", "File dump attempt"),
-            (r"xp_cmdshell", "Command execution attempt"),
-            (r"exec\s*\(", "Code execution attempt"),
-            (r"--\s*$", "SQL comment injection"),
-            (r"/\*.*\*/", "SQL comment obfuscation"),
-        ]
+        # Attack patterns, compiled once into a single pass scanner
+        self.analyzer = QueryAnalyzer.from_file(rules_file or DEFAULT_RULES_FILE)
+        # bots repeat the same queries with other literals, each shape is analyzed once
+        self.fingerprints = QueryFingerprints(self.analyzer, logger)
     
     def _get_capability_flags(self):
+        # no CLIENT_SSL (1 << 11): there is no TLS behind it, no CLIENT_SESSION_TRACK
+        # (1 << 23): OK packets carry no session state, and no
+        # CLIENT_DEPRECATE_EOF (1 << 24): result sets end with EOF packets
         return (
             (1 << 0) |   # CLIENT_LONG_PASSWORD
             (1 << 3) |   # CLIENT_CONNECT_WITH_DB
-            (1 << 4) |   # CLIENT_PROTOCOL_41 (CRITICAL!)
-            (1 << 5) |   # CLIENT_TRANSACTIONS
-            (1 << 6) |   # CLIENT_SECURE_CONNECTION (CRITICAL!)
-            (1 << 7) |   # CLIENT_MULTI_RESULTS
-            (1 << 8) |   # CLIENT_PS_MULTI_RESULTS
-            (1 << 9) |   # CLIENT_PLUGIN_AUTH
-            (1 << 10) |  # CLIENT_CONNECT_ATTRS
-            (1 << 11) |  # CLIENT_PLUGIN_AUTH_LENENC_CLIENT_DATA
-            (1 << 13) |  # CLIENT_DEPRECATE_EOF
-            (1 << 15) |  # CLIENT_SSL (not really, but flag it)
-            (1 << 16) |  # CLIENT_MULTI_STATEMENTS
-            (1 << 17) |  # CLIENT_PS_MULTI_STATEMENTS
-            (1 << 19) |  # CLIENT_SESSION_TRACK
-            (1 << 23) |  # CLIENT_CAN_HANDLE_EXPIRED_PASSWORDS
-            (1 << 24) |  # CLIENT_OPTIONAL_RESULTSET_METADATA
-            (1 << 27)    # CLIENT_QUERY_ATTRIBUTES
+            (1 << 4) |   # CLIENT_NO_SCHEMA
+            CLIENT_COMPRESS |  # 1 << 5
+            (1 << 6) |   # CLIENT_ODBC
+            (1 << 7) |   # CLIENT_LOCAL_FILES
+            (1 << 8) |   # CLIENT_IGNORE_SPACE
+            (1 << 9) |   # CLIENT_PROTOCOL_41 (CRITICAL!)
+            (1 << 10) |  # CLIENT_INTERACTIVE
+            (1 << 13) |  # CLIENT_TRANSACTIONS
+            (1 << 15) |  # CLIENT_SECURE_CONNECTION (CRITICAL!)
+            CLIENT_MULTI_STATEMENTS |  # 1 << 16
+            (1 << 17) |  # CLIENT_MULTI_RESULTS
+            (1 << 19) |  # CLIENT_PLUGIN_AUTH
+            CLIENT_QUERY_ATTRIBUTES  # 1 << 27
         )
     
     def _create_scramble(self):
@@ -126,14 +161,14 @@ class MySQLHoneypot:
         return packet
     
     def _create_packet(self, sequence_id, payload):
-        length = len(payload)
-        header = struct.pack('<I', length)[:3] + struct.pack('<B', sequence_id)
-        return header + payload
+        return packet_header(len(payload), sequence_id) + payload
     
     def _parse_auth(self, data):
         try:
+            data = bytes(data)
+            capabilities = struct.unpack('<I', data[:4])[0] if len(data) >= 4 else 0
             if len(data) < 32:
-                return {"username": "unknown", "auth_hash": "", "database": ""}
+                return {"username": "unknown", "auth_hash": "", "database": "", "capabilities": capabilities}
             
             # skip: capabilities(4) + max_packet(4) + charset(1) + reserved(23)
             pos = 4 + 4 + 1 + 23
@@ -141,7 +176,7 @@ class MySQLHoneypot:
             # extract username 
             username_end = data.find(b'\x00', pos)
             if username_end == -1:
-                return {"username": "unknown", "auth_hash": "", "database": ""}
+                return {"username": "unknown", "auth_hash": "", "database": "", "capabilities": capabilities}
             
             username = data[pos:username_end].decode('utf-8', errors='ignore')
             pos = username_end + 1
@@ -166,28 +201,32 @@ class MySQLHoneypot:
             return {
                 "username": username,
                 "auth_hash": auth_hash,
-                "database": database
+                "database": database,
+                "capabilities": capabilities
             }
             
         except Exception as e:
             if self.logger:
                 self.logger.error(f"Auth parse error: {e}")
-            return {"username": "unknown", "auth_hash": "", "database": ""}
+            return {"username": "unknown", "auth_hash": "", "database": "", "capabilities": 0}
     
-    def _send_ok(self, sock, seq_id, message="", affected_rows=0):
+    def _ok_packet(self, message="", affected_rows=0):
         ok_packet = bytearray()
         ok_packet.append(0x00)  
-        ok_packet.extend(struct.pack('<I', affected_rows)[:3]) 
-        ok_packet.extend(b'\x00\x00')  
+        ok_packet.extend(lenenc_int(affected_rows))
+        ok_packet.append(0x00)  # last insert id
         ok_packet.extend(struct.pack('<H', self.status_flags)) 
         ok_packet.extend(b'\x00\x00')  
         
         if message:
             ok_packet.extend(message.encode())
         
-        sock.send(self._create_packet(seq_id, bytes(ok_packet)))
+        return bytes(ok_packet)
     
-    def _send_error(self, sock, seq_id, error_code, message):
+    def _ok(self, seq_id, message="", affected_rows=0):
+        return self._create_packet(seq_id, self._ok_packet(message, affected_rows))
+    
+    def _error(self, seq_id, error_code, message):
         error_packet = bytearray()
         error_packet.append(0xff)  
         error_packet.extend(struct.pack('<H', error_code))  
@@ -195,372 +234,633 @@ class MySQLHoneypot:
         error_packet.extend(b'HY000')  
         error_packet.extend(message.encode())  
         
-        sock.send(self._create_packet(seq_id, bytes(error_packet)))
+        return self._create_packet(seq_id, bytes(error_packet))
     
     def _analyze_query(self, query, client_ip):
-        query_lower = query.lower()
         alerts = []
         
-        # Check for SQL injection
-        for pattern, description in self.sql_patterns:
-            if re.search(pattern, query_lower, re.IGNORECASE):
-                if self.logger:
-                    self.logger.warning(f"[MySQL] SQL Injection from {client_ip}: {description} - Query: {query[:100]}")
-                alerts.append(description)
-        
-        # Check for sensitive operations
-        sensitive_ops = [
-            ("drop table", "Table deletion attempt"),
-            ("drop database", "Database deletion attempt"),
-            ("delete from", "Data deletion attempt"),
-            ("truncate table", "Table truncation attempt"),
-            ("grant ", "Privilege grant attempt"),
-            ("revoke ", "Privilege revoke attempt"),
-            ("create user", "User creation attempt"),
-            ("alter user", "User modification attempt"),
-        ]
-        
-        for pattern, desc in sensitive_ops:
-            if pattern in query_lower:
-                if self.logger:
-                    self.logger.warning(f"[MySQL] Sensitive operation from {client_ip}: {desc} - Query: {query[:100]}")
-                alerts.append(desc)
+        # SQL injection and sensitive operations, every matching rule is reported
+        fingerprint, rules = self.fingerprints.analyze(query)
+        for rule in rules:
+            if self.logger:
+                if rule.category == "sqli":
+                    self.logger.warning(f"[MySQL] SQL Injection from {client_ip}: {rule.description} - Query: {query[:100]}")
+                else:
+                    self.logger.warning(f"[MySQL] Sensitive operation from {client_ip}: {rule.description} - Query: {query[:100]}")
+            alerts.append(rule.description)
         
         return {
             "type": "attack" if alerts else "normal",
             "alerts": alerts,
-            "query": query
+            "query": query,
+            "fingerprint": fingerprint
         }
     
-    def _handle_show_databases(self, sock, seq_id):
+    def _encode_row(self, columns, row, binary=False):
+        if not binary:
+            return b''.join(self._encode_length_encoded_string(value) for value in row)
+        # binary protocol: header, NULL bitmap (offset by 2 bits), then the non NULL values
+        null_bitmap = bytearray((len(columns) + 9) // 8)
+        values = bytearray()
+        for index, (column, value) in enumerate(zip(columns, row)):
+            if value is None:
+                null_bitmap[(index + 2) // 8] |= 1 << ((index + 2) % 8)
+                continue
+            # field type, 6 bytes from the end of a column definition
+            fmt = FIXED_TYPES.get(column[-6])
+            if fmt:
+                values.extend(struct.pack(fmt, float(value) if fmt in ("<f", "<d") else int(value)))
+            elif column[-6] in TEMPORAL_TYPES:
+                values.extend(temporal_bytes(value))
+            else:
+                values.extend(self._encode_length_encoded_string(value))
+        return b'\x00' + bytes(null_bitmap) + bytes(values)
+    
+    def _result_set(self, columns, rows, seq_id=1, binary=False):
+        """Column count, column definitions, EOF, rows and the last EOF as one buffer"""
+        packets = PacketBuffer(seq_id)
+        packets.add(lenenc_int(len(columns)))
+        for column in columns:
+            packets.add(column)
+        packets.add(self._create_eof_packet())
+        for row in rows:
+            packets.add(self._encode_row(columns, row, binary))
+        packets.add(self._create_eof_packet())
+        return packets
+    
+    def _tables_spec(self, db_name):
+        # tables for database
+        tables = self.fake_tables.get(db_name, self.fake_tables.get("test", ["users", "products"]))
+        col_name = f"Tables_in_{db_name}" if db_name else "Tables_in_test"
+        col_def = self._create_column_definition(
+            catalog='def',
+            schema='information_schema',
+            table='TABLES',
+            org_table='TABLES',
+            name=col_name,
+            org_name='TABLE_NAME',
+            charset=0x21,
+            length=256,
+            field_type=0xfd,
+            flags=0x0001, 
+            decimals=0
+        )
+        return [col_def], [(table,) for table in tables]
+    
+    def _static_specs(self):
+        """(columns, rows) of the result sets that never change"""
+        results = {}
+        
+        results["databases"] = ([self._create_column_definition(
+            catalog='def',
+            schema='information_schema',
+            table='SCHEMATA',
+            org_table='SCHEMATA',
+            name='Database',
+            org_name='SCHEMA_NAME',
+            charset=0x21, 
+            length=256,
+            field_type=0xfd,  
+            flags=0x0001, 
+            decimals=0
+        )], [(db,) for db in self.fake_databases])
+        
+        results["tables", None] = self._tables_spec(None)
+        for db_name in self.fake_tables:
+            results["tables", db_name] = self._tables_spec(db_name)
+        
+        results["version"] = ([self._create_column_definition(
+            catalog='def',
+            schema='',
+            table='',
+            org_table='',
+            name='@@version',
+            org_name='',
+            charset=0x21,
+            length=60,
+            field_type=0xfd, 
+            flags=0x0001,
+            decimals=0x1f
+        )], [(self.server_version,)])
+        
+        results["user"] = ([self._create_column_definition(
+            catalog='def',
+            schema='',
+            table='',
+            org_table='',
+            name='user()',
+            org_name='',
+            charset=0x21,
+            length=77,
+            field_type=0xfd,
+            flags=0x0001,
+            decimals=0x1f
+        )], [("root@localhost",)])
+        
+        # NULL
+        results["database"] = ([self._create_column_definition(
+            catalog='def',
+            schema='',
+            table='',
+            org_table='',
+            name='database()',
+            org_name='',
+            charset=0x21,
+            length=256,
+            field_type=0xfd,
+            flags=0x0000,
+            decimals=0x1f
+        )], [(None,)])
+        
+        results["select 1"] = ([self._create_column_definition(
+            catalog='def',
+            schema='',
+            table='',
+            org_table='',
+            name='1',
+            org_name='',
+            charset=0x3f, 
+            length=1,
+            field_type=0x08,  
+            flags=0x0081,  
+            decimals=0
+        )], [("1",)])
+        
+        return results
+    
+    def _table_spec(self, database, table):
+        """(FakeTable, column definitions) of a table in fake_tables, None for other names"""
+        spec = self.table_specs.get((database, table))
+        if spec is None:
+            if table not in self.fake_tables.get(database, ()):
+                return None
+            fake = fake_table(table)
+            columns = []
+            for name, column_type in zip(fake.columns, fake.types):
+                field_type, length, charset, flags, decimals = TYPES[column_type]
+                columns.append(self._create_column_definition(
+                    catalog='def',
+                    schema=database,
+                    table=table,
+                    org_table=table,
+                    name=name,
+                    org_name=name,
+                    charset=charset,
+                    length=length,
+                    field_type=field_type,
+                    flags=flags,
+                    decimals=decimals
+                ))
+            spec = self.table_specs[database, table] = (fake, columns)
+        return spec
+    
+    def _rows_key(self, query_lower, database):
+        """("rows", database, table, column indexes, offset, limit) for a SELECT on a fake table"""
+        select = parse_select(query_lower)
+        if select is None:
+            return None
+        database = select.database or database
+        if database not in self.fake_tables:
+            # no usable default database, the first one holding the table answers
+            database = next((db for db, tables in self.fake_tables.items() if select.table in tables), None)
+        spec = self._table_spec(database, select.table)
+        if spec is None:
+            return None
+        indexes = spec[0].field_indexes(select.fields)
+        return ("rows", database, select.table, indexes and tuple(indexes), select.offset, select.limit)
+    
+    def _result_key(self, query_lower, database=None):
+        """Which canned result set answers a query, None for a plain OK"""
+        if query_lower.startswith("show databases"):
+            return "databases"
+        if query_lower.startswith("show tables"):
+            return ("tables", database)
+        if not query_lower.startswith("select "):
+            return None
+        
+        key = self._rows_key(query_lower, database)
+        if key is not None:
+            return key
+        if "@@version" in query_lower or "version()" in query_lower:
+            return "version"
+        elif "user()" in query_lower or "current_user" in query_lower:
+            return "user"
+        elif "database()" in query_lower:
+            return "database"
+        elif "select 1" in query_lower or "select '1'" in query_lower:
+            return "select 1"
+        return None
+    
+    def _rows_columns(self, key):
+        _, database, table, indexes, _, _ = key
+        _, columns = self._table_spec(database, table)
+        if indexes is None:
+            return [self.count_definition]
+        return [columns[index] for index in indexes]
+    
+    def _rows(self, key, seq_id, binary=False):
+        """
+        Result set of a fake table, yielded ROW_BATCH rows at a time: rows
+        are generated as the client reads them and never all held at once
+        """
+        _, database, table, indexes, offset, limit = key
+        fake, _ = self._table_spec(database, table)
+        columns = self._rows_columns(key)
+        packets = PacketBuffer(seq_id)
+        packets.add(lenenc_int(len(columns)))
+        for column in columns:
+            packets.add(column)
+        packets.add(self._create_eof_packet())
+        
+        if indexes is None:
+            rows = [(str(fake.row_count),)] if offset == 0 and limit != 0 else []
+        else:
+            rows = fake.rows(offset, limit)
+        for row in rows:
+            packets.add(self._encode_row(columns, [row[index] for index in indexes] if indexes else row, binary))
+            if len(packets) >= ROW_BATCH:
+                yield packets.to_bytes()
+                packets = PacketBuffer(packets.next_seq())
+        packets.add(self._create_eof_packet())
+        yield packets.to_bytes()
+    
+    def _result_columns(self, key):
+        if key[0] == "rows":
+            return self._rows_columns(key)
+        spec = self.static_specs.get(key)
+        if spec is None and key[0] == "tables":
+            spec = self._tables_spec(key[1])
+        return spec[0]
+    
+    def _result(self, key, binary=False):
+        """Prebuilt text or binary result set for a key"""
+        result = (self.static_binary if binary else self.static_results).get(key)
+        if result is None:
+            # only the column name depends on an unknown database
+            result = self._result_set(*self._tables_spec(key[1]), binary=binary)
+        return result
+    
+    def _handle_use_database(self, seq_id, db_name):
+        return self._ok(seq_id, "Database changed")
+    
+    def _record_query(self, session, query, statements):
+        if self.logger:
+            self.logger.info(f"[MySQL] Query from {session.ip}: {query[:100]}")
+        for statement in statements:
+            analysis = self._analyze_query(statement, session.ip)
+            session.record_query(statement, analysis["alerts"])
+    
+    def _handle_query(self, session, seq_id, query):
+        # stacked queries: each statement is analyzed and answered on its own
+        statements = split_statements(query) or [query]
+        self._record_query(session, query, statements)
+        
+        if len(statements) == 1:
+            return self._respond(session, seq_id, statements[0])
+        if not session.capabilities & CLIENT_MULTI_STATEMENTS:
+            return self._error(seq_id, 1064, "You have an error in your SQL syntax; check the manual that corresponds "
+                               f"to your MySQL server version for the right syntax to use near '{statements[1][:80]}' at line 1")
+        return self._chain(session, seq_id, statements)
+    
+    def _more_results(self, chunk, offset):
+        """chunk with SERVER_MORE_RESULTS_EXISTS set in the EOF or OK packet at offset"""
+        data = bytearray(chunk)
+        # status flags: after fe + warnings in an EOF, after 00, affected rows and insert id in an OK
+        pos = offset + 5
+        if data[offset + 4] == 0xfe:
+            pos += 2
+        else:
+            pos += {0xfc: 3, 0xfd: 4, 0xfe: 9}.get(data[pos], 1) + 1
+        data[pos] |= SERVER_MORE_RESULTS_EXISTS
+        return bytes(data)
+    
+    def _chain(self, session, seq_id, statements):
+        """
+        The responses of stacked statements as one multi-result response:
+        sequence ids run on from one result to the next and all but the
+        last end with SERVER_MORE_RESULTS_EXISTS. An error ends the chain,
+        mysqld does not run the statements after it either
+        """
+        for index, statement in enumerate(statements):
+            response = self._respond(session, seq_id, statement)
+            last = None
+            for chunk in ((response,) if isinstance(response, bytes) else response):
+                if last is not None:
+                    yield last
+                offsets = packet_offsets(chunk)
+                seq_id += len(offsets)
+                last = chunk
+            final = offsets[-1]
+            if last[final + 4] == 0xff:
+                yield last
+                return
+            yield self._more_results(last, final) if index < len(statements) - 1 else last
+    
+    def _respond(self, session, seq_id, query):
+        """Response to one statement"""
+        query_lower = query.lower()
+        
+        if query_lower.startswith("use "):
+            db_name = query[4:].split()[0].strip(';`"\'')
+            session.database = db_name[:MAX_NAME_CHARS]
+            return self._handle_use_database(seq_id, db_name)
+        
+        return self._answer(self._result_key(query_lower, session.database), seq_id)
+    
+    def _answer(self, key, seq_id, binary=False):
+        """Response for a result key, a plain OK for None"""
+        if key is None:
+            return self._ok(seq_id, "", 0)
+        if key[0] == "rows":
+            return self._rows(key, seq_id, binary)
+        return self._result(key, binary).to_bytes(seq_id)
+    
+    def _handle_prepare(self, session, seq_id, query):
+        if self.logger:
+            self.logger.info(f"[MySQL] Prepare from {session.ip}: {query[:100]}")
+        
+        key = self._result_key(query.lower(), session.database)
+        columns = self._result_columns(key) if key is not None else ()
+        statement = session.statements.add(query, columns)
+        if statement is None:
+            return self._error(seq_id, 1461, "Can't create more than max_prepared_stmt_count statements")
+        
+        # the result is decided here once, executes only re-read bound LIMIT values
+        statement.result_key = key
+        limit_at = query.lower().rfind("limit")
+        statement.bound_limit = key is not None and key[0] == "rows" and limit_at >= 0 and "?" in query[limit_at:]
+        # built once, a client re-preparing the same text gets a new statement like on mysqld
+        statement.prepare_ok = prepare_ok(statement, self.param_definition, self._create_eof_packet())
+        return statement.prepare_ok.to_bytes(seq_id)
+    
+    def _handle_execute(self, session, seq_id, data):
+        statement = session.statements.get(int.from_bytes(data[1:5], "little"))
+        if statement is None:
+            return self._error(seq_id, 1243, "Unknown prepared statement handler given to mysqld_stmt_execute")
         try:
-            # Column count packet
-            sock.send(self._create_packet(seq_id, b'\x01'))
-            
-            # Column definition
-            col_def = self._create_column_definition(
-                catalog='def',
-                schema='information_schema',
-                table='SCHEMATA',
-                org_table='SCHEMATA',
-                name='Database',
-                org_name='SCHEMA_NAME',
-                charset=0x21, 
-                length=256,
-                field_type=0xfd,  
-                flags=0x0001, 
-                decimals=0
-            )
-            sock.send(self._create_packet(seq_id + 1, col_def))
-            
-            # EOF after column definitions
-            sock.send(self._create_packet(seq_id + 2, self._create_eof_packet()))
-            
-            # Send database rows
-            row_seq = seq_id + 3
-            for db in self.fake_databases:
-                row_data = self._encode_length_encoded_string(db)
-                sock.send(self._create_packet(row_seq, row_data))
-                row_seq += 1
-            
-            # Final EOF
-            sock.send(self._create_packet(row_seq, self._create_eof_packet()))
-            
-        except Exception as e:
+            values = statement.decode_params(data[1:], bool(session.capabilities & CLIENT_QUERY_ATTRIBUTES))
+        except (StatementError, IndexError, struct.error) as e:
             if self.logger:
-                self.logger.error(f"Error in SHOW DATABASES: {e}")
-            self._send_error(sock, seq_id, 1064, "Error processing query")
+                self.logger.warning(f"[MySQL] Malformed execute from {session.ip}: {e}")
+            return self._error(seq_id, 1210, "Incorrect arguments to mysqld_stmt_execute")
+        
+        # the analyzer sees the statement as the server would run it
+        query = statement.bind(values)
+        self._record_query(session, query, [query])
+        key = statement.result_key
+        if statement.bound_limit:
+            limits = parse_limit(query)
+            if limits is not None:
+                key = key[:4] + limits
+        return self._answer(key, seq_id, binary=True)
     
-    def _handle_use_database(self, sock, seq_id, db_name):
-        self._send_ok(sock, seq_id, "Database changed")
+    def _open_session(self, client_ip):
+        session = MySQLSession(self.connection_ids.next(), client_ip)
+        self.active_connections[session.id] = session
+        if self.logger:
+            self.logger.info(f"[MySQL] Connection from {client_ip} (ID: {session.id})")
+        return session
     
-    def _handle_show_tables(self, sock, seq_id, db_name=None):
-        try:
-            # get tables for database
-            tables = self.fake_tables.get(db_name, self.fake_tables.get("test", ["users", "products"]))
-            
-            sock.send(self._create_packet(seq_id, b'\x01'))
-            
-            # column definition
-            col_name = f"Tables_in_{db_name}" if db_name else "Tables_in_test"
-            col_def = self._create_column_definition(
-                catalog='def',
-                schema='information_schema',
-                table='TABLES',
-                org_table='TABLES',
-                name=col_name,
-                org_name='TABLE_NAME',
-                charset=0x21,
-                length=256,
-                field_type=0xfd,
-                flags=0x0001, 
-                decimals=0
+    def _close_session(self, session):
+        self.active_connections.pop(session.id, None)
+        # log session summary
+        if self.logger:
+            self.logger.info(
+                f"[MySQL] Session ended: {session.ip} | Duration: {session.duration:.1f}s | "
+                f"Queries: {session.query_count} | Attacks: {session.attack_count}",
+                extra={'session': session}
             )
-            sock.send(self._create_packet(seq_id + 1, col_def))
-            
-            # EOF after column definitions
-            sock.send(self._create_packet(seq_id + 2, self._create_eof_packet()))
-            
-            # send table rows
-            row_seq = seq_id + 3
-            for table in tables:
-                row_data = self._encode_length_encoded_string(table)
-                sock.send(self._create_packet(row_seq, row_data))
-                row_seq += 1
-            
-            # Final EOF
-            sock.send(self._create_packet(row_seq, self._create_eof_packet()))
-            
-        except Exception as e:
-            if self.logger:
-                self.logger.error(f"Error in SHOW TABLES: {e}")
-            self._send_error(sock, seq_id, 1064, "Error processing query")
     
-    def _handle_select(self, sock, seq_id, query):
-        try:
-            query_lower = query.lower()
-            
-            if "@@version" in query_lower or "version()" in query_lower:
-                sock.send(self._create_packet(seq_id, b'\x01'))
-                
-                col_def = self._create_column_definition(
-                    catalog='def',
-                    schema='',
-                    table='',
-                    org_table='',
-                    name='@@version',
-                    org_name='',
-                    charset=0x21,
-                    length=60,
-                    field_type=0xfd, 
-                    flags=0x0001,
-                    decimals=0x1f
-                )
-                sock.send(self._create_packet(seq_id + 1, col_def))
-                sock.send(self._create_packet(seq_id + 2, self._create_eof_packet()))
-                
-                version = "5.7.29-log"
-                row_data = self._encode_length_encoded_string(version)
-                sock.send(self._create_packet(seq_id + 3, row_data))
-                sock.send(self._create_packet(seq_id + 4, self._create_eof_packet()))
-                
-            elif "user()" in query_lower or "current_user" in query_lower:
-                sock.send(self._create_packet(seq_id, b'\x01'))
-                
-                col_def = self._create_column_definition(
-                    catalog='def',
-                    schema='',
-                    table='',
-                    org_table='',
-                    name='user()',
-                    org_name='',
-                    charset=0x21,
-                    length=77,
-                    field_type=0xfd,
-                    flags=0x0001,
-                    decimals=0x1f
-                )
-                sock.send(self._create_packet(seq_id + 1, col_def))
-                sock.send(self._create_packet(seq_id + 2, self._create_eof_packet()))
-                
-                user = "root@localhost"
-                row_data = self._encode_length_encoded_string(user)
-                sock.send(self._create_packet(seq_id + 3, row_data))
-                sock.send(self._create_packet(seq_id + 4, self._create_eof_packet()))
-                
-            elif "database()" in query_lower:
-                sock.send(self._create_packet(seq_id, b'\x01'))
-                
-                col_def = self._create_column_definition(
-                    catalog='def',
-                    schema='',
-                    table='',
-                    org_table='',
-                    name='database()',
-                    org_name='',
-                    charset=0x21,
-                    length=256,
-                    field_type=0xfd,
-                    flags=0x0000,
-                    decimals=0x1f
-                )
-                sock.send(self._create_packet(seq_id + 1, col_def))
-                sock.send(self._create_packet(seq_id + 2, self._create_eof_packet()))
-                
-                db = "NULL"
-                row_data = b'\xfb' 
-                sock.send(self._create_packet(seq_id + 3, row_data))
-                sock.send(self._create_packet(seq_id + 4, self._create_eof_packet()))
-                
-            elif "select 1" in query_lower or "select '1'" in query_lower:
-                sock.send(self._create_packet(seq_id, b'\x01'))
-                
-                col_def = self._create_column_definition(
-                    catalog='def',
-                    schema='',
-                    table='',
-                    org_table='',
-                    name='1',
-                    org_name='',
-                    charset=0x3f, 
-                    length=1,
-                    field_type=0x08,  
-                    flags=0x0081,  
-                    decimals=0
-                )
-                sock.send(self._create_packet(seq_id + 1, col_def))
-                sock.send(self._create_packet(seq_id + 2, self._create_eof_packet()))
-                
-                row_data = self._encode_length_encoded_string("1")
-                sock.send(self._create_packet(seq_id + 3, row_data))
-                sock.send(self._create_packet(seq_id + 4, self._create_eof_packet()))
-                
-            else:
-                self._send_ok(sock, seq_id, "", 0)
-                
-        except Exception as e:
+    def _handle_auth(self, session, auth_seq, auth_payload):
+        """Log the credentials of the handshake response, always answers OK"""
+        credentials = self._parse_auth(auth_payload)
+        username = credentials['username']
+        auth_hash = credentials['auth_hash']
+        database = credentials['database']
+        
+        # store session info, the capabilities decide how later packets are laid out
+        session.capabilities = credentials['capabilities'] & self.capability_flags
+        session.username = username[:MAX_NAME_CHARS]
+        session.database = database[:MAX_NAME_CHARS]
+        
+        # log auth attempt
+        if self.logger:
+            log_msg = f"[MySQL] Login attempt from {session.ip} | User: {username}"
+            if auth_hash:
+                log_msg += f" | Hash: {auth_hash[:32]}..."
+            if database:
+                log_msg += f" | DB: {database}"
+            self.logger.warning(log_msg)
+        
+        return self._ok(auth_seq + 1, "", 0)
+    
+    def _handle_command(self, session, packet_seq, data):
+        """
+        Answer one command packet, the same for the threaded and the
+        asyncio server. Returns (response, close connection), the response
+        is bytes, an iterator of bytes for streamed result sets, or None
+        """
+        if not data:
+            return None, False
+        
+        command = data[0]
+        
+        if command == 0x03:
+            offset = 1
+            if session.capabilities & CLIENT_QUERY_ATTRIBUTES:
+                try:
+                    offset += query_offset(data[1:])
+                except (StatementError, IndexError, struct.error):
+                    offset = 1
+            query = str(data[offset:], 'utf-8', errors='ignore').strip()
+            return self._handle_query(session, packet_seq + 1, query), False
+        
+        elif command == 0x02:  
+            db_name = str(data[1:], 'utf-8', errors='ignore')
+            session.database = db_name[:MAX_NAME_CHARS]
+            return self._ok(packet_seq + 1, "Database changed"), False
+        
+        elif command == 0x01:
             if self.logger:
-                self.logger.error(f"Error in SELECT: {e}")
-            self._send_error(sock, seq_id, 1064, "Error processing query")
+                self.logger.info(f"[MySQL] Client quit: {session.ip}")
+            return None, True
+        
+        elif command == 0x16:
+            query = str(data[1:], 'utf-8', errors='ignore').strip()
+            return self._handle_prepare(session, packet_seq + 1, query), False
+        
+        elif command == 0x17:
+            return self._handle_execute(session, packet_seq + 1, data), False
+        
+        elif command == 0x18:
+            # COM_STMT_SEND_LONG_DATA has no response
+            statement = session.statements.get(int.from_bytes(data[1:5], "little"))
+            if statement is not None and len(data) >= 7:
+                try:
+                    statement.add_long_data(int.from_bytes(data[5:7], "little"), data[7:])
+                except StatementError:
+                    pass
+            return None, False
+        
+        elif command == 0x19:
+            # COM_STMT_CLOSE has no response either
+            session.statements.close(int.from_bytes(data[1:5], "little"))
+            return None, False
+        
+        elif command == 0x1a:
+            statement = session.statements.get(int.from_bytes(data[1:5], "little"))
+            if statement is None:
+                return self._error(packet_seq + 1, 1243, "Unknown prepared statement handler given to mysqld_stmt_reset"), False
+            statement.long_data.clear()
+            return self._ok(packet_seq + 1), False
+        
+        elif command == 0x0e:
+            # COM_PING
+            return self._ok(packet_seq + 1), False
+        
+        elif command == 0x04:
+            # COM_FIELD_LIST, no columns
+            return self._create_packet(packet_seq + 1, self._create_eof_packet()), False
+        
+        if self.logger:
+            self.logger.warning(f"[MySQL] Unknown command {command:#04x} from {session.ip}")
+        return self._error(packet_seq + 1, 1064, "Unknown command"), False
+    
+    def _chunks(self, response, transport=None):
+        """The bytes to write for a _handle_command response, compressed if the session asked for it"""
+        if response is None:
+            return
+        for chunk in ((response,) if isinstance(response, bytes) else response):
+            yield transport.wrap(chunk) if transport else chunk
+    
+    def _transport(self, session, reader):
+        """CompressedStream around reader once CLIENT_COMPRESS was agreed, None otherwise"""
+        if session.capabilities & CLIENT_COMPRESS:
+            return CompressedStream(reader)
+        return None
+    
+    def _oversized(self, session):
+        if self.logger:
+            self.logger.warning(f"[MySQL] Oversized packet from {session.ip}, closing")
+        return self._error(1, 1153, "Got a packet bigger than 'max_allowed_packet' bytes")
     
     def handle_client(self, client_socket, addr):
-        client_ip = addr[0]
-        connection_id = self.connection_counter + 1
-        self.connection_counter = connection_id
-        
-        session_id = f"{client_ip}_{connection_id}"
-        self.active_connections[session_id] = {
-            "ip": client_ip,
-            "start_time": datetime.now(),
-            "queries": [],
-            "database": None,
-            "username": None,
-        }
+        session = self._open_session(addr[0])
         
         try:
-            if self.logger:
-                self.logger.info(f"[MySQL] Connection from {client_ip} (ID: {connection_id})")
-            
             # send handshake
-            handshake = self._create_handshake(connection_id)
-            client_socket.send(self._create_packet(0, handshake))
+            client_socket.sendall(self._create_packet(0, self._create_handshake(session.id)))
             
-            # receive authentication
-            auth_data = client_socket.recv(4096)
-            if not auth_data or len(auth_data) < 4:
+            # receive authentication, packets may be split or coalesced across reads
+            reader = PacketReader()
+            client_socket.settimeout(IDLE_TIMEOUT)
+            packet = reader.read_packet(client_socket)
+            if packet is None:
                 return
-            
-            # parse auth packet
-            auth_seq = auth_data[3]
-            auth_payload = auth_data[4:] if len(auth_data) > 4 else b''
-            
-            # extract credentials
-            credentials = self._parse_auth(auth_payload)
-            username = credentials['username']
-            auth_hash = credentials['auth_hash']
-            database = credentials['database']
-            
-            # store session info
-            self.active_connections[session_id]["username"] = username
-            self.active_connections[session_id]["database"] = database
-            
-            # log auth attempt
-            if self.logger:
-                log_msg = f"[MySQL] Login attempt from {client_ip} | User: {username}"
-                if auth_hash:
-                    log_msg += f" | Hash: {auth_hash[:32]}..."
-                if database:
-                    log_msg += f" | DB: {database}"
-                self.logger.warning(log_msg)
-            
-            # send auth OK 
-            self._send_ok(client_socket, auth_seq + 1, "", 0)
+            client_socket.sendall(self._handle_auth(session, *packet))
+            # everything after the auth OK is compressed when the client asked for it
+            transport = self._transport(session, reader)
+            reader = transport or reader
             
             while True:
                 try:
-                    client_socket.settimeout(30)
-                    
-                    data = client_socket.recv(4096)
-                    if not data:
+                    packet = reader.read_packet(client_socket)
+                    if packet is None:
                         break
                     
-                    if len(data) < 5:
-                        continue
-                    
-                    packet_seq = data[3]
-                    command = data[4]
-                    
-                    if command == 0x03:
-                        query = data[5:].decode('utf-8', errors='ignore').strip()
-                        
-                        if self.logger:
-                            self.logger.info(f"[MySQL] Query from {client_ip}: {query[:100]}")
-                        
-                        analysis = self._analyze_query(query, client_ip)
-                        
-                        self.active_connections[session_id]["queries"].append({
-                            "query": query,
-                            "time": datetime.now(),
-                            "analysis": analysis
-                        })
-                        
-                        query_lower = query.lower()
-                        
-                        if query_lower.startswith("show databases"):
-                            self._handle_show_databases(client_socket, packet_seq + 1)
-                            
-                        elif query_lower.startswith("use "):
-                            db_name = query[4:].split()[0].strip(';`"\'')
-                            self.active_connections[session_id]["database"] = db_name
-                            self._handle_use_database(client_socket, packet_seq + 1, db_name)
-                            
-                        elif query_lower.startswith("show tables"):
-                            current_db = self.active_connections[session_id]["database"]
-                            self._handle_show_tables(client_socket, packet_seq + 1, current_db)
-                            
-                        elif query_lower.startswith("select "):
-                            self._handle_select(client_socket, packet_seq + 1, query)
-                            
-                        else:
-                            self._send_ok(client_socket, packet_seq + 1, "", 0)
-                        
-                    elif command == 0x02:  
-                        db_name = data[5:].decode('utf-8', errors='ignore')
-                        self.active_connections[session_id]["database"] = db_name
-                        self._send_ok(client_socket, packet_seq + 1, "Database changed")
-                        
-                    elif command == 0x01:
-                        if self.logger:
-                            self.logger.info(f"[MySQL] Client quit: {client_ip}")
+                    response, close = self._handle_command(session, *packet)
+                    for chunk in self._chunks(response, transport):
+                        client_socket.sendall(chunk)
+                    if close:
                         break
-                    
-                    else:
-                        if self.logger:
-                            self.logger.warning(f"[MySQL] Unknown command {command:#04x} from {client_ip}")
-                        self._send_error(client_socket, packet_seq + 1, 1064, "Unknown command")
                 
                 except socket.timeout:
                     if self.logger:
-                        self.logger.info(f"[MySQL] Session timeout: {client_ip}")
+                        self.logger.info(f"[MySQL] Session timeout: {session.ip}")
+                    break
+                except PacketTooLarge:
+                    client_socket.sendall(next(self._chunks(self._oversized(session), transport)))
                     break
                 except Exception as e:
                     if self.logger:
                         self.logger.debug(f"[MySQL] Query error: {e}")
                     break
             
-            # log session summary
-            session = self.active_connections[session_id]
-            duration = (datetime.now() - session["start_time"]).total_seconds()
+        except Exception as e:
             if self.logger:
-                self.logger.info(f"[MySQL] Session ended: {client_ip} | Duration: {duration:.1f}s | Queries: {len(session['queries'])}")
+                self.logger.error(f"[MySQL] Connection error from {session.ip}: {e}")
+        finally:
+            client_socket.close()
+            self._close_session(session)
+    
+    async def _read_packet(self, stream, reader):
+        """Next packet from an asyncio stream, None once the peer closed"""
+        while True:
+            packet = reader.next_packet()
+            if packet is not None:
+                return packet
+            data = await asyncio.wait_for(stream.read(RECV_SIZE), IDLE_TIMEOUT)
+            if not data:
+                return None
+            reader.feed(data)
+    
+    async def handle_client_async(self, stream, writer):
+        """handle_client on the event loop, an idle session costs no thread"""
+        peer = writer.get_extra_info("peername") or ("unknown",)
+        session = self._open_session(peer[0])
+        loop = asyncio.get_running_loop()
+        reader = PacketReader()
+        
+        try:
+            writer.write(self._create_packet(0, self._create_handshake(session.id)))
+            
+            packet = await self._read_packet(stream, reader)
+            if packet is None:
+                return
+            writer.write(self._handle_auth(session, *packet))
+            await writer.drain()
+            transport = self._transport(session, reader)
+            reader = transport or reader
             
+            while True:
+                try:
+                    packet = await self._read_packet(stream, reader)
+                    if packet is None:
+                        break
+                    
+                    if len(packet[1]) > INLINE_PACKET_SIZE:
+                        # long queries are analyzed off the loop so other sessions keep going
+                        response, close = await loop.run_in_executor(None, self._handle_command, session, *packet)
+                    else:
+                        response, close = self._handle_command(session, *packet)
+                    streamed = response is not None and not isinstance(response, bytes)
+                    for chunk in self._chunks(response, transport):
+                        writer.write(chunk)
+                        await writer.drain()
+                        if streamed:
+                            # let the other sessions run between batches
+                            await asyncio.sleep(0)
+                    if close:
+                        break
+                
+                except asyncio.TimeoutError:
+                    if self.logger:
+                        self.logger.info(f"[MySQL] Session timeout: {session.ip}")
+                    break
+                except PacketTooLarge:
+                    writer.write(next(self._chunks(self._oversized(session), transport)))
+                    await writer.drain()
+                    break
+        
+        except (ConnectionError, OSError) as e:
+            if self.logger:
+                self.logger.debug(f"[MySQL] Connection error from {session.ip}: {e}")
         except Exception as e:
             if self.logger:
-                self.logger.error(f"[MySQL] Connection error from {client_ip}: {e}")
+                self.logger.error(f"[MySQL] Connection error from {session.ip}: {e}")
         finally:
-            client_socket.close()
-            if session_id in self.active_connections:
-                del self.active_connections[session_id]
+            writer.close()
+            self._close_session(session)
     
     def _encode_length_encoded_string(self, s):
         if s is None:
@@ -650,10 +950,33 @@ class MySQLHoneypot:
             if self.logger:
                 self.logger.info("[MySQL] Honeypot stopped")
     
+    async def serve_async(self, backlog=1024):
+        server = await asyncio.start_server(self.handle_client_async, self.host, self.port, backlog=backlog)
+        self.running = True
+        if self.logger:
+            self.logger.info(f"[MySQL] Listening on {self.host}:{self.port} (asyncio)")
+        async with server:
+            await server.serve_forever()
+    
+    def start_async(self, backlog=1024):
+        """Same honeypot on one event loop instead of a thread per client"""
+        try:
+            asyncio.run(self.serve_async(backlog))
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"[MySQL] Server error: {e}")
+        finally:
+            self.running = False
+            if self.logger:
+                self.logger.info("[MySQL] Honeypot stopped")
+    
     def stop(self):
         self.running = False
 
 
 def start_mysql_honeypot(args, logger):
-    mysql = MySQLHoneypot(port=args.mysql_port, logger=logger)
-    mysql.start()
\ No newline at end of file
+    mysql = MySQLHoneypot(port=args.mysql_port, logger=logger, rules_file=getattr(args, 'mysql_rules', None))
+    if getattr(args, 'mysql_engine', DEFAULT_ENGINE) == "threaded":
+        mysql.start()
+    else:
+        mysql.start_async()
\ No newline at end of file
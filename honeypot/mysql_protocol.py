@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+MySQL wire protocol framing
+a client can split a packet over several reads or put several packets in
+one, and payloads of 16 MiB and more arrive as a chain of 0xFFFFFF byte
+packets. PacketReader keeps one receive buffer per connection and hands
+out complete payloads as memoryview slices of it. With CLIENT_COMPRESS the
+packets travel inside compressed packets, CompressedStream unwraps them
+on the way in and wraps the responses on the way out
+"""
+import struct
+import zlib
+
+HEADER_SIZE = 4
+MAX_PAYLOAD = 0xFFFFFF  # a packet this long is continued by the next one
+MAX_PACKET_SIZE = 64 << 20  # max_allowed_packet, for a whole chain
+RECV_SIZE = 65536
+BUFFER_SIZE = 4096  # starting size, idle connections should cost little
+CLIENT_COMPRESS = 1 << 5
+CLIENT_MULTI_STATEMENTS = 1 << 16
+SERVER_MORE_RESULTS_EXISTS = 0x0008  # status flag, another result set follows
+COMPRESSED_HEADER_SIZE = 7
+MIN_COMPRESS_LENGTH = 50  # shorter payloads go out uncompressed, like mysqld does it
+COMPRESS_LEVEL = 6
+
+
+class PacketTooLarge(ValueError):
+    """The client announced more than max_packet_size bytes"""
+
+
+class PacketReader:
+    """
+    Growable receive buffer for one connection. Bytes already handed out
+    are never overwritten: when the buffer has to move, the unread tail is
+    copied into a new bytearray, so earlier payload views stay valid
+    """
+    def __init__(self, size=BUFFER_SIZE, max_packet_size=MAX_PACKET_SIZE):
+        self.size = size
+        self.buffer = bytearray()  # allocated on the first read
+        self.start = 0  # first unread byte
+        self.end = 0  # end of received data
+        self.max_packet_size = max_packet_size
+
+    def _reserve(self, size):
+        """
+        Make room for size more bytes after end. The new capacity doubles
+        from self.size until it fits, so a large packet is copied a
+        logarithmic number of times as it comes in
+        """
+        if len(self.buffer) - self.end >= size:
+            return
+        # sized from scratch, so the buffer shrinks again after a big packet
+        pending = self.end - self.start
+        capacity = self.size
+        while capacity - pending < size:
+            capacity *= 2
+        buffer = bytearray(capacity)
+        buffer[:pending] = self.buffer[self.start:self.end]
+        self.buffer = buffer
+        self.start = 0
+        self.end = pending
+
+    def feed(self, data):
+        """Append bytes read by someone else (an asyncio stream)"""
+        self._reserve(len(data))
+        self.buffer[self.end:self.end + len(data)] = data
+        self.end += len(data)
+
+    def fill(self, sock):
+        """recv_into the free end of the buffer, returns 0 once the peer closed"""
+        self._reserve(self.size)
+        with memoryview(self.buffer) as view:
+            count = sock.recv_into(view[self.end:])
+        self.end += count
+        return count
+
+    def next_packet(self):
+        """
+        (sequence id, payload) of the next complete packet, or None if more
+        bytes are needed. For a continued chain the sequence id is the one of
+        its last packet and the parts are joined, once
+        """
+        parts = []
+        pos = self.start
+        total = 0
+        while True:
+            if self.end - pos < HEADER_SIZE:
+                return None
+            length = self.buffer[pos] | self.buffer[pos + 1] << 8 | self.buffer[pos + 2] << 16
+            seq = self.buffer[pos + 3]
+            total += length
+            if total > self.max_packet_size:
+                raise PacketTooLarge(f"packet of more than {self.max_packet_size} bytes")
+            if self.end - pos - HEADER_SIZE < length:
+                # the buffer only grows as the bytes arrive, never from the
+                # announced length: a client sending bare headers costs nothing
+                return None
+            parts.append((pos + HEADER_SIZE, length))
+            pos += HEADER_SIZE + length
+            if length < MAX_PAYLOAD:
+                break
+
+        self.start = pos
+        view = memoryview(self.buffer)
+        if len(parts) == 1:
+            offset, length = parts[0]
+            return seq, view[offset:offset + length]
+        return seq, memoryview(b"".join(view[offset:offset + length] for offset, length in parts))
+
+    def read_packet(self, sock):
+        """Blocking read of the next packet from sock, None once the peer closed"""
+        while True:
+            packet = self.next_packet()
+            if packet is not None:
+                return packet
+            if not self.fill(sock):
+                return None
+
+
+def packet_header(length, seq):
+    return struct.pack('<I', length)[:3] + bytes((seq & 0xFF,))
+
+
+def packet_offsets(data):
+    """Where each packet framed in data starts"""
+    offsets = []
+    pos = 0
+    while pos < len(data):
+        offsets.append(pos)
+        pos += HEADER_SIZE + (data[pos] | data[pos + 1] << 8 | data[pos + 2] << 16)
+    return offsets
+
+
+def lenenc_int(value):
+    """Length encoded integer"""
+    if value < 251:
+        return bytes((value,))
+    if value < (1 << 16):
+        return b'\xfc' + struct.pack('<H', value)
+    if value < (1 << 24):
+        return b'\xfd' + struct.pack('<I', value)[:3]
+    return b'\xfe' + struct.pack('<Q', value)
+
+
+class PacketBuffer:
+    """
+    The packets of one response framed into a single bytearray, written
+    with one sendall. The offsets of the headers are kept so a prebuilt
+    response can be sent again under other sequence ids
+    """
+    def __init__(self, seq=1):
+        self.seq = seq  # sequence id of the first packet
+        self.data = bytearray()
+        self.headers = []
+        self.frozen = None  # bytes of data, built on first send
+
+    def __len__(self):
+        return len(self.headers)
+
+    def add(self, payload):
+        """Frame one payload, splitting it into 0xFFFFFF byte packets if needed"""
+        pos = 0
+        while True:
+            chunk = payload[pos:pos + MAX_PAYLOAD]
+            self.frozen = None
+            self.headers.append(len(self.data))
+            self.data += packet_header(len(chunk), self.seq + len(self.headers) - 1)
+            self.data += chunk
+            pos += len(chunk)
+            # a chunk of exactly 0xFFFFFF bytes is always followed by another one
+            if len(chunk) < MAX_PAYLOAD:
+                return self
+
+    def next_seq(self):
+        return (self.seq + len(self.headers)) & 0xFF
+
+    def to_bytes(self, seq=None):
+        """The framed packets, renumbered from seq if that differs from the build"""
+        if seq is None or seq & 0xFF == self.seq & 0xFF:
+            if self.frozen is None:
+                self.frozen = bytes(self.data)
+            return self.frozen
+        data = bytearray(self.data)
+        for i, offset in enumerate(self.headers):
+            data[offset + 3] = (seq + i) & 0xFF
+        return bytes(data)
+
+
+class CompressedStream:
+    """
+    CLIENT_COMPRESS transport of one connection, around its PacketReader.
+    A compressed packet has a 3 byte length, a sequence id of its own that
+    restarts with every command, the 3 byte length before compression (0
+    when the payload is sent as is) and the payload. Its content is a run
+    of ordinary packets, which may span compressed packets
+    """
+    def __init__(self, reader, threshold=MIN_COMPRESS_LENGTH, level=COMPRESS_LEVEL):
+        self.reader = reader
+        self.threshold = threshold
+        self.level = level
+        self.pending = bytearray()  # start of a compressed packet not fully received
+        self.seq = 0
+
+    def feed(self, data):
+        """Unwrap received bytes into the reader"""
+        self.pending += data
+        pos = 0
+        while len(self.pending) - pos >= COMPRESSED_HEADER_SIZE:
+            length = int.from_bytes(self.pending[pos:pos + 3], "little")
+            raw_length = int.from_bytes(self.pending[pos + 4:pos + 7], "little")
+            if max(length, raw_length) > self.reader.max_packet_size:
+                raise PacketTooLarge(f"compressed packet of more than {self.reader.max_packet_size} bytes")
+            end = pos + COMPRESSED_HEADER_SIZE + length
+            if len(self.pending) < end:
+                break
+            payload = self.pending[pos + COMPRESSED_HEADER_SIZE:end]
+            if raw_length:
+                # max_length caps what a small payload can inflate to
+                payload = zlib.decompressobj().decompress(payload, raw_length)
+            self.reader.feed(payload)
+            self.seq = (self.pending[pos + 3] + 1) & 0xFF
+            pos = end
+        del self.pending[:pos]
+
+    def fill(self, sock):
+        data = sock.recv(RECV_SIZE)
+        if data:
+            self.feed(data)
+        return len(data)
+
+    def next_packet(self):
+        return self.reader.next_packet()
+
+    def read_packet(self, sock):
+        """Blocking read of the next packet from sock, None once the peer closed"""
+        while True:
+            packet = self.reader.next_packet()
+            if packet is not None:
+                return packet
+            if not self.fill(sock):
+                return None
+
+    def wrap(self, data):
+        """
+        Framed packets as compressed packets, one per 0xFFFFFF bytes. Each
+        is a complete zlib stream, clients inflate them one by one
+        """
+        out = bytearray()
+        with memoryview(data) as view:
+            for pos in range(0, max(len(view), 1), MAX_PAYLOAD):
+                chunk = view[pos:pos + MAX_PAYLOAD]
+                raw_length = len(chunk)
+                if raw_length >= self.threshold:
+                    compressed = zlib.compress(chunk, self.level)
+                    # incompressible data is sent as it is
+                    if len(compressed) < raw_length:
+                        chunk = compressed
+                    else:
+                        raw_length = 0
+                else:
+                    raw_length = 0
+                out += struct.pack('<I', len(chunk))[:3] + bytes((self.seq,)) + struct.pack('<I', raw_length)[:3]
+                out += chunk
+                self.seq = (self.seq + 1) & 0xFF
+        return bytes(out)
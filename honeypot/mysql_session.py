@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Per-connection state of the MySQL honeypot
+a session keeps counters and a fixed size ring of its last queries, never
+the full history, so a client looping queries cannot grow it
+"""
+import sys
+import threading
+import time
+from collections import deque
+
+from honeypot.mysql_statements import StatementCache
+
+RECENT_QUERIES = 32
+MAX_QUERY_CHARS = 256  # of each query kept in the ring
+MAX_NAME_CHARS = 256  # of user and database names
+MAX_CONNECTION_ID = 0xFFFFFFFF  # the handshake has 4 bytes for it
+
+
+class ConnectionIds:
+    """Thread safe connection id generator, wraps around like mysqld's"""
+    def __init__(self, start=1):
+        self.lock = threading.Lock()
+        self.next_id = start
+
+    def next(self):
+        with self.lock:
+            connection_id = self.next_id
+            self.next_id = connection_id % MAX_CONNECTION_ID + 1
+        return connection_id
+
+
+class MySQLSession:
+    """One client connection"""
+    __slots__ = ("id", "ip", "started", "start_time", "username", "database",
+                 "queries", "query_count", "attack_count", "alert_counts", "query_chars", "statements", "capabilities")
+
+    def __init__(self, connection_id, ip, recent=RECENT_QUERIES):
+        self.id = connection_id
+        self.ip = ip
+        self.started = time.monotonic()
+        self.start_time = time.time()
+        self.username = None
+        self.database = None
+        self.queries = deque(maxlen=recent)  # (time, query head, alerts)
+        self.query_count = 0
+        self.attack_count = 0
+        self.alert_counts = {}  # alert -> hits, at most one key per rule
+        self.query_chars = 0
+        self.statements = StatementCache()
+        self.capabilities = 0  # agreed with the client during the handshake
+
+    def record_query(self, query, alerts=()):
+        self.query_count += 1
+        self.query_chars += len(query)
+        if alerts:
+            self.attack_count += 1
+            for alert in alerts:
+                self.alert_counts[alert] = self.alert_counts.get(alert, 0) + 1
+        self.queries.append((time.time(), query[:MAX_QUERY_CHARS], tuple(alerts)))
+
+    @property
+    def duration(self):
+        return time.monotonic() - self.started
+
+    def memory_usage(self):
+        """Approximate bytes held by this session"""
+        size = sys.getsizeof(self) + sys.getsizeof(self.queries) + sys.getsizeof(self.alert_counts)
+        for entry in self.queries:
+            size += sys.getsizeof(entry) + sys.getsizeof(entry[1]) + sys.getsizeof(entry[2])
+        for value in (self.ip, self.username, self.database):
+            size += sys.getsizeof(value)
+        for statement in self.statements.statements.values():
+            size += sys.getsizeof(statement) + sys.getsizeof(statement.query) + sum(map(sys.getsizeof, statement.parts))
+            size += sum(len(data) for data in statement.long_data.values())
+        return size
+
+    def to_dict(self):
+        return {
+            "type": "mysql_session",
+            "id": self.id,
+            "ip": self.ip,
+            "start_time": self.start_time,
+            "duration": round(self.duration, 3),
+            "username": self.username,
+            "database": self.database,
+            "queries": self.query_count,
+            "attacks": self.attack_count,
+            "alerts": dict(self.alert_counts),
+            "query_chars": self.query_chars,
+            "recent": [{"time": t, "query": q, "alerts": list(a)} for t, q, a in self.queries],
+        }
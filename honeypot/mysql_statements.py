@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Server side prepared statements for the MySQL honeypot
+a statement is parsed once at COM_STMT_PREPARE: its text is split around
+the ? placeholders and the prepare response is built then. COM_STMT_EXECUTE
+only decodes the bound values and joins them back into the text, which is
+what gets analyzed and logged
+"""
+import re
+import struct
+from collections import OrderedDict
+
+from honeypot.mysql_protocol import PacketBuffer
+
+MAX_STATEMENTS = 64  # per session, like max_prepared_stmt_count but per client
+MAX_LONG_DATA = 65536  # bytes kept per parameter sent with COM_STMT_SEND_LONG_DATA
+MAX_STATEMENT_CHARS = 65536  # of a statement's text, the analyzer reads no further
+
+# strings, quoted identifiers and comments, a ? or ; inside them is not a placeholder or separator
+SKIP_RE = re.compile(r"""
+    '[^'\\]*(?:(?:\\.|'')[^'\\]*)*'?|"[^"\\]*(?:(?:\\.|"")[^"\\]*)*"?|`[^`]*`?
+  | --[^\n]*|\#[^\n]*|/\*.*?(?:\*/|\Z)
+  | (?P<placeholder>\?)
+  | (?P<separator>;)
+""", re.DOTALL | re.VERBOSE)
+
+# binary protocol type -> struct format of the fixed size values
+FIXED_TYPES = {
+    0x01: "<b",  # TINY
+    0x02: "<h",  # SHORT
+    0x03: "<i",  # LONG
+    0x04: "<f",  # FLOAT
+    0x05: "<d",  # DOUBLE
+    0x08: "<q",  # LONGLONG
+    0x09: "<i",  # INT24
+    0x0d: "<h",  # YEAR
+}
+TEMPORAL_TYPES = (0x07, 0x0a, 0x0b, 0x0c)  # TIMESTAMP, DATE, TIME, DATETIME
+NULL_TYPE = 0x06
+PARAMETER_COUNT_AVAILABLE = 0x08  # COM_STMT_EXECUTE flag
+CLIENT_QUERY_ATTRIBUTES = 1 << 27
+
+
+class StatementError(ValueError):
+    """A COM_STMT_* packet that does not fit its statement"""
+
+
+def split_placeholders(query):
+    """The text around each ? placeholder, one more part than placeholders"""
+    parts = []
+    start = 0
+    for match in SKIP_RE.finditer(query):
+        if match.lastgroup == "placeholder":
+            parts.append(query[start:match.start()])
+            start = match.end()
+    parts.append(query[start:])
+    return parts
+
+
+def split_statements(query, max_length=MAX_STATEMENT_CHARS):
+    """
+    The statements of a multi-statement query in one pass over it, blank
+    ones dropped: 'SELECT 1; DROP TABLE x' -> ['SELECT 1', 'DROP TABLE x'].
+    Only the first max_length characters are split, the rest stays with
+    the last statement
+    """
+    statements = []
+    start = 0
+    for match in SKIP_RE.finditer(query, 0, max_length):
+        if match.lastgroup == "separator":
+            statements.append(query[start:match.start()].strip())
+            start = match.end()
+    statements.append(query[start:].strip())
+    return [statement for statement in statements if statement]
+
+
+def _lenenc(data, pos):
+    first = data[pos]
+    if first < 251:
+        return first, pos + 1
+    size = {0xfc: 2, 0xfd: 3, 0xfe: 8}.get(first)
+    if size is None:
+        raise StatementError("bad length encoded integer")
+    return int.from_bytes(data[pos + 1:pos + 1 + size], "little"), pos + 1 + size
+
+
+def _temporal(field_type, raw):
+    """DATE / DATETIME / TIMESTAMP / TIME in their binary layout, as SQL text"""
+    if field_type == 0x0b:
+        if len(raw) < 8:
+            return "00:00:00"
+        negative, days, hour, minute, second = struct.unpack("<BIBBB", raw[:8])
+        text = f"{'-' if negative else ''}{days * 24 + hour:02d}:{minute:02d}:{second:02d}"
+        if len(raw) >= 12:
+            text += f".{struct.unpack('<I', raw[8:12])[0]:06d}"
+        return text
+    if len(raw) < 4:
+        return "0000-00-00"
+    year, month, day = struct.unpack("<HBB", raw[:4])
+    text = f"{year:04d}-{month:02d}-{day:02d}"
+    if len(raw) >= 7:
+        hour, minute, second = raw[4], raw[5], raw[6]
+        text += f" {hour:02d}:{minute:02d}:{second:02d}"
+        if len(raw) >= 11:
+            text += f".{struct.unpack('<I', raw[7:11])[0]:06d}"
+    return text
+
+
+def temporal_bytes(text):
+    """'YYYY-MM-DD[ HH:MM:SS]' in the binary DATE / DATETIME layout"""
+    date, _, clock = text.partition(" ")
+    year, month, day = (int(part) for part in date.split("-"))
+    if not clock:
+        return struct.pack("<BHBB", 4, year, month, day)
+    hour, minute, second = (int(part) for part in clock.split(":"))
+    return struct.pack("<BHBBBBB", 7, year, month, day, hour, minute, second)
+
+
+def read_values(data, pos, types, null_bitmap, long_data=None):
+    """Binary protocol values of the given types from data[pos:], returns (values, end)"""
+    values = []
+    for index, field_type in enumerate(types):
+        if null_bitmap[index // 8] & (1 << (index % 8)) or field_type == NULL_TYPE:
+            values.append(None)
+        elif long_data and index in long_data:
+            # sent in pieces before the execute, nothing in this packet
+            values.append(bytes(long_data[index]).decode("utf-8", errors="replace"))
+        elif field_type in FIXED_TYPES:
+            fmt = FIXED_TYPES[field_type]
+            size = struct.calcsize(fmt)
+            if pos + size > len(data):
+                raise StatementError("packet too short")
+            values.append(struct.unpack(fmt, data[pos:pos + size])[0])
+            pos += size
+        elif field_type in TEMPORAL_TYPES:
+            size = data[pos]
+            values.append(_temporal(field_type, bytes(data[pos + 1:pos + 1 + size])))
+            pos += 1 + size
+        else:
+            # strings, blobs, decimals, json: length encoded
+            size, pos = _lenenc(data, pos)
+            values.append(str(data[pos:pos + size], "utf-8", errors="replace"))
+            pos += size
+    return values, pos
+
+
+def query_offset(data):
+    """
+    Where the SQL starts in a COM_QUERY payload (after the command byte)
+    sent with CLIENT_QUERY_ATTRIBUTES: count, set count, then the
+    attributes laid out like execute parameters
+    """
+    count, pos = _lenenc(data, 0)
+    _, pos = _lenenc(data, pos)
+    if count == 0:
+        return pos
+    null_bitmap = data[pos:pos + (count + 7) // 8]
+    pos += (count + 7) // 8
+    types = bytearray()
+    if data[pos]:
+        pos += 1
+        for _ in range(count):
+            types.append(data[pos])
+            size, pos = _lenenc(data, pos + 2)
+            pos += size
+    else:
+        raise StatementError("query attributes without types")
+    _, pos = read_values(data, pos, types, null_bitmap)
+    return pos
+
+
+def sql_literal(value):
+    """A decoded parameter written back as SQL"""
+    if value is None:
+        return "NULL"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+class PreparedStatement:
+    """One statement of a session, built once and executed any number of times"""
+    __slots__ = ("id", "query", "parts", "param_count", "param_types", "columns", "result_key", "bound_limit",
+                 "prepare_ok", "long_data")
+
+    def __init__(self, statement_id, query, columns=()):
+        self.id = statement_id
+        self.query = query
+        self.parts = split_placeholders(query)
+        self.param_count = len(self.parts) - 1
+        self.param_types = None  # sent with the first execute, reused after that
+        self.columns = tuple(columns)  # column definitions when the result is known up front
+        self.result_key = None  # what answers every execute, see MySQLHoneypot._result_key
+        self.bound_limit = False  # LIMIT takes placeholders, re-read from the bound text
+        self.prepare_ok = None  # PacketBuffer, see MySQLHoneypot._handle_prepare
+        self.long_data = {}  # param index -> bytearray
+
+    def add_long_data(self, index, data):
+        if index >= self.param_count:
+            raise StatementError(f"parameter {index} out of range")
+        chunk = self.long_data.setdefault(index, bytearray())
+        chunk += data[:max(0, MAX_LONG_DATA - len(chunk))]
+
+    def decode_params(self, data, query_attributes=False):
+        """
+        Bound values of a COM_STMT_EXECUTE payload (after the command byte):
+        stmt_id(4) flags(1) iterations(4) [count], null bitmap, new-params
+        flag, types [and names], values. With CLIENT_QUERY_ATTRIBUTES the
+        client may send more values than placeholders, only those are kept
+        """
+        pos = 9
+        count = self.param_count
+        if query_attributes and (count or (len(data) > 4 and data[4] & PARAMETER_COUNT_AVAILABLE)):
+            count, pos = _lenenc(data, pos)
+        if count == 0:
+            return []
+        bitmap_size = (count + 7) // 8
+        null_bitmap = data[pos:pos + bitmap_size]
+        pos += bitmap_size
+        if pos >= len(data):
+            raise StatementError("execute packet too short")
+        if data[pos]:
+            pos += 1
+            types = bytearray()
+            for _ in range(count):
+                if pos + 2 > len(data):
+                    raise StatementError("execute packet too short")
+                types.append(data[pos])
+                pos += 2
+                if query_attributes:
+                    # attribute name, empty for placeholders
+                    size, pos = _lenenc(data, pos)
+                    pos += size
+            self.param_types = bytes(types)
+        else:
+            pos += 1
+        if self.param_types is None or len(self.param_types) != count:
+            raise StatementError("parameter types were never sent")
+
+        values, _ = read_values(data, pos, self.param_types, null_bitmap, self.long_data)
+        self.long_data.clear()
+        return values[:self.param_count]
+
+    def bind(self, values):
+        """The statement text with the values in place of the placeholders"""
+        pieces = [self.parts[0]]
+        for value, part in zip(values, self.parts[1:]):
+            pieces.append(sql_literal(value))
+            pieces.append(part)
+        return "".join(pieces)
+
+
+class StatementCache:
+    """The prepared statements of one session, bounded"""
+    __slots__ = ("statements", "next_id", "limit")
+
+    def __init__(self, limit=MAX_STATEMENTS):
+        self.statements = OrderedDict()
+        self.next_id = 1
+        self.limit = limit
+
+    def __len__(self):
+        return len(self.statements)
+
+    def add(self, query, columns=()):
+        """New PreparedStatement, None once the session holds limit statements"""
+        if len(self.statements) >= self.limit:
+            return None
+        statement = PreparedStatement(self.next_id, query[:MAX_STATEMENT_CHARS], columns)
+        self.statements[statement.id] = statement
+        self.next_id = self.next_id % 0xFFFFFFFF + 1
+        return statement
+
+    def get(self, statement_id):
+        return self.statements.get(statement_id)
+
+    def close(self, statement_id):
+        self.statements.pop(statement_id, None)
+
+
+def prepare_ok(statement, param_definition, eof, seq_id=1):
+    """COM_STMT_PREPARE_OK with the parameter and column definitions"""
+    packets = PacketBuffer(seq_id)
+    packets.add(b"\x00" + struct.pack("<IHHBH", statement.id, len(statement.columns),
+                                       statement.param_count, 0, 0))
+    if statement.param_count:
+        for _ in range(statement.param_count):
+            packets.add(param_definition)
+        packets.add(eof)
+    if statement.columns:
+        for column in statement.columns:
+            packets.add(column)
+        packets.add(eof)
+    return packets
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Fast path for HTTP scanner noise
+plain GET/HEAD probes for well-known paths (/.env, /phpmyadmin, ...) are
+answered from a table of pre-encoded responses before the Flask app runs,
+and counted instead of logged one line per hit
+"""
+import threading
+import time
+
+
+class CannedResponse:
+    """Status, header list and body encoded once"""
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.body = body.encode("utf-8") if isinstance(body, str) else body
+        self.headers = list(headers) + [("Content-Length", str(len(self.body)))]
+
+
+class NoiseRouter:
+    """
+    Exact paths are one dict lookup, prefixes one str.startswith(tuple)
+    only requests without a query string or body qualify, anything
+    carrying a payload goes through the app and gets logged in full
+    """
+    MAX_TRACKED_IPS = 10000  # per summary interval
+
+    def __init__(self, logger, paths, prefixes, responses, interval=60, name="HTTP-Noise"):
+        """
+        paths / prefixes map a lowercase path (or prefix) to a key of
+        responses, which maps that key to a CannedResponse
+        """
+        self.logger = logger
+        self.paths = {path.lower(): responses[key] for path, key in paths.items()}
+        # longest first so the most specific prefix is the one counted
+        self.prefixes = sorted(((p.lower(), responses[key]) for p, key in prefixes.items()),
+                               key=lambda item: len(item[0]), reverse=True)
+        self.prefix_tuple = tuple(prefix for prefix, _ in self.prefixes)
+        self.interval = interval
+        self.name = name
+
+        self.counts = {}  # path or prefix -> hits since the last summary
+        self.ips = set()
+        self.total = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def lookup(self, environ):
+        """CannedResponse for a noise request, None for anything worth recording"""
+        if environ.get("REQUEST_METHOD") not in ("GET", "HEAD") or environ.get("QUERY_STRING"):
+            return None
+        if environ.get("CONTENT_LENGTH") not in (None, "", "0") or "HTTP_TRANSFER_ENCODING" in environ:
+            return None
+
+        path = environ.get("PATH_INFO", "").lower()
+        key = path
+        response = self.paths.get(path)
+        if response is None:
+            if not path.startswith(self.prefix_tuple):
+                return None
+            for key, response in self.prefixes:
+                if path.startswith(key):
+                    break
+
+        self._count(key, environ.get("REMOTE_ADDR", ""))
+        return response
+
+    def wsgi(self, app):
+        """Wrap a WSGI app, noise never reaches it"""
+        def middleware(environ, start_response):
+            response = self.lookup(environ)
+            if response is None:
+                return app(environ, start_response)
+            # lets the request handler skip the artificial delay
+            environ["honeypot.noise"] = True
+            start_response(response.status, response.headers)
+            return [response.body]
+        return middleware
+
+    def _count(self, key, ip):
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+            self.total += 1
+            if len(self.ips) < self.MAX_TRACKED_IPS:
+                self.ips.add(ip)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True, name=self.name)
+                self.thread.start()
+
+    def flush(self):
+        with self.lock:
+            counts, self.counts = self.counts, {}
+            ips, self.ips = self.ips, set()
+            total, self.total = self.total, 0
+        if not total:
+            return
+
+        top = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:10]
+        self.logger.info(
+            f"HTTP noise - {total} requests from {len(ips)} IPs in the last {self.interval}s, "
+            f"top: {', '.join(f'{path} x{count}' for path, count in top)}",
+            extra={'noise': counts, 'noise_ips': len(ips)}
+        )
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+HTTP personas, the fake applications the HTTP honeypot can pretend to be
+each persona is a directory under personas/ with a persona.json and its
+templates. Everything is rendered into CachedPage objects at startup, a
+request only does dictionary lookups
+"""
+import json
+from pathlib import Path
+from string import Template
+from types import MappingProxyType
+
+from config import settings
+from honeypot.http_cache import CachedPage, StaticAssetCache
+
+PERSONAS_DIR = Path(settings.HTTP_PERSONAS_DIR)
+DEFAULT_PERSONA = settings.DEFAULT_SERVICE
+DEFAULT_CONTENT_TYPE = "text/html; charset=utf-8"
+
+
+class LoginTrap:
+    """
+    Where a persona takes credentials: a form field pair on POST, or the
+    HTTP basic auth header on any method
+    """
+    __slots__ = ("kind", "username_field", "password_field", "page")
+
+    def __init__(self, kind, username_field, password_field, page):
+        self.kind = kind
+        self.username_field = username_field
+        self.password_field = password_field
+        self.page = page  # answer to a login attempt, None means the route's page
+
+
+class Route:
+    __slots__ = ("path", "methods", "page", "login")
+
+    def __init__(self, path, methods, page, login):
+        self.path = path
+        self.methods = methods
+        self.page = page
+        self.login = login
+
+
+class Persona:
+    """One fake application, immutable once loaded"""
+    def __init__(self, name, description, server, routes, not_found, delays, assets):
+        self.name = name
+        self.description = description
+        self.server = server
+        self.routes = MappingProxyType(routes)
+        self.not_found = not_found
+        self.delays = MappingProxyType(delays)
+        self.assets = assets
+
+
+def _page(directory, spec, variables, headers, default_status=200):
+    """Render one template into a CachedPage, templates use $name placeholders"""
+    template = spec.get("template")
+    content = ""
+    if template:
+        content = Template((directory / template).read_text(encoding="utf-8")).safe_substitute(variables)
+    return CachedPage(
+        content,
+        {**headers, **spec.get("headers", {})},
+        mimetype=spec.get("content_type", DEFAULT_CONTENT_TYPE),
+        status=spec.get("status", default_status)
+    )
+
+
+def load_persona(directory, logger):
+    directory = Path(directory)
+    with open(directory / "persona.json", encoding="utf-8") as f:
+        config = json.load(f)
+
+    name = config.get("name", directory.name)
+    variables = config.get("variables", {})
+    headers = dict(config.get("headers", {}))
+    if config.get("server"):
+        headers = {"Server": config["server"], **headers}
+
+    routes = {}
+    for spec in config.get("routes", []):
+        login = None
+        login_spec = spec.get("login")
+        if login_spec:
+            kind = login_spec.get("type", "form")
+            if kind not in ("form", "basic"):
+                raise ValueError(f"{directory.name}: unknown login type '{kind}' on {spec['path']}")
+            page = None
+            if kind == "form":
+                page = _page(directory, login_spec, variables, headers)
+            login = LoginTrap(kind, login_spec.get("username", "username"), login_spec.get("password", "password"), page)
+
+        methods = frozenset(m.upper() for m in spec.get("methods", ["GET"]))
+        if "GET" in methods:
+            methods |= {"HEAD"}
+        routes[spec["path"]] = Route(spec["path"], methods, _page(directory, spec, variables, headers), login)
+
+    not_found = _page(directory, config.get("not_found", {}), variables, headers, default_status=404)
+
+    assets = None
+    if config.get("static"):
+        assets = StaticAssetCache((directory / config["static"]).resolve(), logger)
+
+    return Persona(name, config.get("description", ""), config.get("server"), routes, not_found,
+                   config.get("delays", {}), assets)
+
+
+def load_personas(root=PERSONAS_DIR, logger=None):
+    """Every persona under root, keyed by name"""
+    personas = {}
+    for directory in sorted(Path(root).iterdir()):
+        if not (directory / "persona.json").is_file():
+            continue
+        persona = load_persona(directory, logger)
+        personas[persona.name] = persona
+    return MappingProxyType(personas)
+
+
+class PersonaSelector:
+    """
+    Picks the persona for a request: the Host header first, then the port
+    the request came in on, then the default
+    """
+    def __init__(self, personas, default, by_port=None, by_host=None):
+        for name in [default, *(by_port or {}).values(), *(by_host or {}).values()]:
+            if name not in personas:
+                raise ValueError(f"Unknown HTTP persona: {name}")
+        self.default = personas[default]
+        self.by_port = MappingProxyType({str(port): personas[name] for port, name in (by_port or {}).items()})
+        self.by_host = MappingProxyType({host.lower(): personas[name] for host, name in (by_host or {}).items()})
+
+    def for_port(self, port):
+        return self.by_port.get(str(port), self.default)
+
+    def select(self, environ):
+        if self.by_host:
+            host = environ.get("HTTP_HOST", "").lower()
+            if not host.endswith("]"):
+                # drop the port, "[::1]" style IPv6 hosts have none left
+                host = host.rsplit(":", 1)[0]
+            persona = self.by_host.get(host)
+            if persona is not None:
+                return persona
+        return self.by_port.get(environ.get("SERVER_PORT", ""), self.default)
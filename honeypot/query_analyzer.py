@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Rule based analysis of MySQL queries
+every rule is a sequence of substrings that must appear in order. All the
+substrings of all the rules go into one Aho-Corasick automaton, so a query
+is scanned once, in time linear in its length, however many rules there
+are and whatever the attacker puts in it. There is no regex to backtrack.
+Queries are reduced to a fingerprint first and the result is cached per
+fingerprint
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+
+from config import settings
+from honeypot.detection import PatternMatcher
+
+QueryRule = namedtuple("QueryRule", "id category description tokens anchored")
+
+CATEGORIES = ("sqli", "sensitive")
+DEFAULT_RULES_FILE = Path(settings.MYSQL_RULES_FILE)
+GAP = ".*"
+MAX_SCAN_LENGTH = 65536  # characters of a query that are scanned
+
+
+def normalize(query):
+    """Lowercase, whitespace runs become one space"""
+    return " ".join(query.lower().split())
+
+
+def load_rules(path=DEFAULT_RULES_FILE):
+    """Read '<id> <category> <pattern> | <description>' lines, # starts a comment"""
+    rules = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split(None, 2)
+            pattern, sep, description = parts[-1].rpartition(" | ")
+            if len(parts) != 3 or not sep or not pattern:
+                raise ValueError(f"{path}:{line_number}: expected '<id> <category> <pattern> | <description>'")
+            rule_id, category = parts[0], parts[1]
+            if category not in CATEGORIES:
+                raise ValueError(f"{path}:{line_number}: unknown category '{category}'")
+            anchored = pattern.endswith("$")
+            if anchored:
+                pattern = pattern[:-1]
+            # lowercase and single spaced, like the queries they are matched against
+            tokens = tuple(token.lower() for token in pattern.split(GAP))
+            if not all(tokens):
+                raise ValueError(f"{path}:{line_number}: empty substring in '{pattern}'")
+            rules.append(QueryRule(rule_id, category, description.strip(), tokens, anchored))
+    return rules
+
+
+class QueryAnalyzer:
+    """
+    Compiled rule set, analyze() returns every rule that matched, once per
+    rule id, in file order
+    """
+    def __init__(self, rules, max_length=MAX_SCAN_LENGTH):
+        self.rules = list(rules)
+        self.max_length = max_length
+
+        self.tokens = []
+        token_index = {}
+        # token -> [(rule index, position of the token in that rule)]
+        self.waiting = []
+        for rule_index, rule in enumerate(self.rules):
+            for position, token in enumerate(rule.tokens):
+                if token not in token_index:
+                    token_index[token] = len(self.tokens)
+                    self.tokens.append(token)
+                    self.waiting.append([])
+                self.waiting[token_index[token]].append((rule_index, position))
+        self.token_lengths = [len(token) for token in self.tokens]
+        self.matcher = PatternMatcher(self.tokens)
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_RULES_FILE, max_length=MAX_SCAN_LENGTH):
+        return cls(load_rules(path), max_length)
+
+    def analyze(self, query):
+        """
+        Every matching QueryRule. Only the first max_length characters are
+        looked at, so the cost of one call is bounded
+        """
+        text = normalize(query[:self.max_length])
+        last = len(text) - 1
+
+        progress = {}  # rule index -> (substrings found so far, end of the last one)
+        done = set()
+        for end, token in self.matcher.finditer(text):
+            start = end - self.token_lengths[token] + 1
+            for rule_index, position in self.waiting[token]:
+                if rule_index in done:
+                    continue
+                found, previous_end = progress.get(rule_index, (0, -1))
+                # the earliest match of each substring leaves the most room for the next
+                if found != position or start <= previous_end:
+                    continue
+                rule = self.rules[rule_index]
+                if position == len(rule.tokens) - 1:
+                    if rule.anchored and end != last:
+                        continue
+                    done.add(rule_index)
+                else:
+                    progress[rule_index] = (found + 1, end)
+
+        hits = []
+        seen = set()
+        for rule_index in sorted(done):
+            rule = self.rules[rule_index]
+            if rule.id not in seen:
+                seen.add(rule.id)
+                hits.append(rule)
+        return hits
+
+
+# literals, comments and whitespace, in one alternation so they are found in one pass
+TOKEN_RE = re.compile(r"""
+    (?P<string>'(?:[^'\\]|\\.|'')*'?|"(?:[^"\\]|\\.|"")*"?)
+  | (?P<comment>--[^\n]*|\#[^\n]*|/\*(?!!).*?(?:\*/|\Z))
+  | (?P<number>\b(?:0x[0-9a-f]+|\d+(?:\.\d+)?(?:e[+-]?\d+)?)\b)
+  | (?P<space>\s+)
+""", re.IGNORECASE | re.DOTALL | re.VERBOSE)
+LIST_RE = re.compile(r"\?(?:\s?,\s?\?)+")
+MAX_KEY_LENGTH = 1024  # longer fingerprints are keyed by their hash
+
+
+def _replace_token(match):
+    kind = match.lastgroup
+    token = match.group()
+    if kind == "string":
+        # the quotes stay, the rules look at where literals start and end
+        closed = len(token) > 1 and token[-1] == token[0]
+        return "'?'" if closed else "'?"
+    if kind == "comment":
+        if token.startswith("/*"):
+            return "/*?*/" if token.endswith("*/") and len(token) > 3 else "/*?"
+        return "--"
+    if kind == "number":
+        return "?"
+    return " "
+
+
+def fingerprint(query):
+    """
+    The shape of a query: literals become ?, comments lose their text,
+    lists of values collapse to one ? and everything is lowercased
+        SELECT * FROM t WHERE id IN (1, 2, 3) AND name = 'x'
+        -> select * from t where id in (?) and name = '?'
+    executable /*! */ comments are kept, MySQL runs what is inside them
+    """
+    shape = TOKEN_RE.sub(_replace_token, query).strip().lower()
+    return LIST_RE.sub("?", shape)
+
+
+class _Fingerprint:
+    __slots__ = ("text", "rules", "hits", "total")
+
+    def __init__(self, text, rules):
+        self.text = text
+        self.rules = rules
+        self.hits = 0  # since the last summary
+        self.total = 0
+
+
+class QueryFingerprints:
+    """
+    Bounded LRU of analysis results keyed by query fingerprint. Bots repeat
+    the same queries with other literals, those are analyzed once; hit
+    counts per fingerprint give the top queries, logged every interval
+    """
+    def __init__(self, analyzer, logger=None, max_entries=4096, interval=300, name="MySQL-Fingerprints"):
+        self.analyzer = analyzer
+        self.logger = logger
+        self.max_entries = max_entries
+        self.interval = interval
+        self.name = name
+
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def analyze(self, query):
+        """(fingerprint, matching QueryRules) for a query"""
+        text = fingerprint(query[:self.analyzer.max_length])
+        key = text if len(text) <= MAX_KEY_LENGTH else hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                entry.hits += 1
+                entry.total += 1
+                return text, entry.rules
+
+        # the rules only see the fingerprint, so the result is the same for every query sharing it
+        rules = tuple(self.analyzer.analyze(text))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = _Fingerprint(text[:MAX_KEY_LENGTH], rules)
+                if len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            entry.hits += 1
+            entry.total += 1
+            if self.thread is None and self.logger:
+                self.thread = threading.Thread(target=self._run, daemon=True, name=self.name)
+                self.thread.start()
+        return text, rules
+
+    def top(self, count=10):
+        """[(fingerprint, hits)] of the most seen queries still in the cache"""
+        with self.lock:
+            entries = sorted(self.entries.values(), key=lambda entry: entry.total, reverse=True)[:count]
+            return [(entry.text, entry.total) for entry in entries]
+
+    def flush(self):
+        with self.lock:
+            active = [entry for entry in self.entries.values() if entry.hits]
+            counts = sorted(((entry.text, entry.hits) for entry in active), key=lambda item: item[1], reverse=True)
+            for entry in active:
+                entry.hits = 0
+        if not counts or not self.logger:
+            return
+
+        total = sum(hits for _, hits in counts)
+        top = counts[:10]
+        self.logger.info(
+            f"[MySQL] {total} queries, {len(counts)} distinct in the last {self.interval}s, "
+            f"top: {', '.join(f'{text[:60]} x{hits}' for text, hits in top)}",
+            extra={'fingerprints': dict(top)}
+        )
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
@@ -3,6 +3,9 @@
 SSH honeypot module
 here we implement an ssh honeypot using paramiko
 """
+import codecs
+import os
+import queue
 import socket
 import threading
 import time
@@ -10,9 +13,91 @@ from datetime import datetime
 import paramiko
 import paramiko.common
 from colorama import Fore, Style
+from config import settings
+from honeypot.fake_shell import CommandEngine
+from honeypot.tarpit import IPThrottle, Tarpit
 
 DEFAULT_BANNER = "SSH-2.0-OpenSSH_8.9p1 Ubuntu-3ubuntu0.6"
 
+SESSION_TIMEOUT = 60  # 1 minute per shell session
+RECV_CHUNK_SIZE = 4096  # read whatever the client sent, up to this much
+
+# capacity limits for the accept loop
+DEFAULT_MAX_SESSIONS = settings.SSH_MAX_SESSIONS
+DEFAULT_BACKLOG = settings.SSH_BACKLOG
+DEFAULT_OVERLOAD_POLICY = settings.SSH_OVERLOAD_POLICY
+DEFAULT_QUEUE_TIMEOUT = settings.SSH_QUEUE_TIMEOUT
+OVERLOAD_POLICIES = ("reject", "queue", "banner")
+OVERLOAD_LOG_INTERVAL = 10  # seconds between "shedding load" warnings
+
+# per-IP throttling, sources over the limit go to the tarpit
+DEFAULT_RATE_LIMIT = settings.SSH_RATE_LIMIT
+DEFAULT_RATE_BURST = settings.SSH_RATE_BURST
+DEFAULT_TARPIT_MAX = settings.SSH_TARPIT_MAX
+TARPIT_INTERVAL = 10  # seconds between junk banner lines
+
+# host keys, loaded once at startup (generated on first run)
+HOST_KEY_FILES = {
+    "rsa": "ssh_host_key",
+    "ecdsa": "ssh_host_ecdsa_key",
+    "ed25519": "ssh_host_ed25519_key",
+}
+DEFAULT_HOST_KEY_TYPES = settings.SSH_HOST_KEY_TYPES
+
+# algorithm profiles: what we offer during key exchange, in order of preference
+# None keeps paramiko's own default list
+ALGORITHM_PROFILES = {
+    # paramiko defaults, whatever the installed version offers
+    "paramiko": {
+        "kex": None,
+        "key_types": None,
+        "ciphers": None,
+        "digests": None,
+    },
+    # same order as OpenSSH 8.9 on Ubuntu 22.04, minus what paramiko lacks
+    "openssh": {
+        "kex": ("curve25519-sha256@libssh.org", "ecdh-sha2-nistp256", "ecdh-sha2-nistp384",
+                "ecdh-sha2-nistp521", "diffie-hellman-group-exchange-sha256",
+                "diffie-hellman-group16-sha512", "diffie-hellman-group14-sha256"),
+        "key_types": ("ssh-ed25519", "ecdsa-sha2-nistp256", "rsa-sha2-512", "rsa-sha2-256"),
+        "ciphers": ("aes128-ctr", "aes192-ctr", "aes256-ctr",
+                    "aes128-gcm@openssh.com", "aes256-gcm@openssh.com"),
+        "digests": ("hmac-sha2-256-etm@openssh.com", "hmac-sha2-512-etm@openssh.com",
+                    "hmac-sha2-256", "hmac-sha2-512", "hmac-sha1"),
+    },
+    # cheapest handshake that still looks like a modern sshd
+    "fast": {
+        "kex": ("curve25519-sha256@libssh.org", "ecdh-sha2-nistp256"),
+        "key_types": ("ssh-ed25519", "ecdsa-sha2-nistp256", "rsa-sha2-256"),
+        "ciphers": ("aes128-ctr", "aes128-gcm@openssh.com"),
+        "digests": ("hmac-sha2-256-etm@openssh.com", "hmac-sha2-256"),
+    },
+}
+DEFAULT_ALGORITHM_PROFILE = settings.SSH_ALGORITHM_PROFILE
+
+class ChannelWriter:
+    """
+    Buffers shell output (echo, responses, prompts) and sends it as a single
+    channel write per flush, so each processed input chunk costs one write
+    (split into packets only past the peer's max packet size) instead of
+    one per echoed character
+    """
+    def __init__(self, channel):
+        self.channel = channel
+        self.pending = []
+        self.writes = 0
+    
+    def write(self, text):
+        self.pending.append(text)
+    
+    def flush(self):
+        if not self.pending:
+            return
+        data = "".join(self.pending).encode('utf-8')
+        self.pending.clear()
+        self.channel.sendall(data)
+        self.writes += 1
+
 # from paramiko
 class SSHServer(paramiko.ServerInterface):
     def __init__(self, args, logger):
@@ -66,7 +151,63 @@ class SSHServer(paramiko.ServerInterface):
                                     pixelheight, modes):
         return True
 
-def handle_ssh_client(client_socket, client_address, args, logger, host_key):
+def load_host_keys(key_types, logger):
+    """
+    Loads (or generates on first run) one host key per requested type
+    """
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+    
+    host_keys = []
+    for key_type in key_types:
+        key_path = HOST_KEY_FILES[key_type]
+        
+        if not os.path.exists(key_path):
+            if key_type == "rsa":
+                paramiko.RSAKey.generate(2048).write_private_key_file(key_path)
+            elif key_type == "ecdsa":
+                paramiko.ECDSAKey.generate().write_private_key_file(key_path)
+            else:
+                # paramiko can load ed25519 keys but not generate them
+                key_data = ed25519.Ed25519PrivateKey.generate().private_bytes(
+                    serialization.Encoding.PEM,
+                    serialization.PrivateFormat.OpenSSH,
+                    serialization.NoEncryption()
+                )
+                with open(key_path, "wb") as key_file:
+                    key_file.write(key_data)
+            logger.info(f"Generated new SSH host key: {key_path}")
+        
+        if key_type == "rsa":
+            host_keys.append(paramiko.RSAKey(filename=key_path))
+        elif key_type == "ecdsa":
+            host_keys.append(paramiko.ECDSAKey(filename=key_path))
+        else:
+            host_keys.append(paramiko.Ed25519Key(filename=key_path))
+    
+    return host_keys
+
+def apply_algorithm_profile(transport, profile):
+    """
+    Restricts and orders the algorithms a transport offers, names the
+    installed paramiko does not know are skipped
+    """
+    options = transport.get_security_options()
+    supported = {
+        "kex": transport._kex_info,
+        "key_types": transport._key_info,
+        "ciphers": transport._cipher_info,
+        "digests": transport._mac_info,
+    }
+    
+    for field, names in ALGORITHM_PROFILES[profile].items():
+        if names is None:
+            continue
+        names = tuple(name for name in names if name in supported[field])
+        if names:
+            setattr(options, field, names)
+
+def handle_ssh_client(client_socket, client_address, args, logger, host_keys, shell):
     client_ip, client_port = client_address
     
     try:
@@ -74,7 +215,12 @@ def handle_ssh_client(client_socket, client_address, args, logger, host_key):
         logger.info(f"SSH Connection from {client_ip}:{client_port}", extra=extra)
         
         transport = paramiko.Transport(client_socket)
-        transport.add_server_key(host_key)
+        for host_key in host_keys:
+            transport.add_server_key(host_key)
+        apply_algorithm_profile(
+            transport,
+            getattr(args, 'ssh_algorithms', DEFAULT_ALGORITHM_PROFILE)
+        )
         
         transport.local_version = DEFAULT_BANNER
         
@@ -88,97 +234,114 @@ def handle_ssh_client(client_socket, client_address, args, logger, host_key):
 
             channel = transport.accept(20)
             if channel is not None:
-                channel.send("Welcome to Ubuntu 22.04.3 LTS (GNU/Linux 5.15.0-91-generic x86_64)\r\n\r\n")
-                channel.send("Last login: Mon Jan  6 14:32:18 2025 from 192.168.1.100\r\n")
-                channel.send("honeypot@ubuntu:~$ ")
+                session = shell.new_session()
+                output = ChannelWriter(channel)
+                output.write("Welcome to Ubuntu 22.04.3 LTS (GNU/Linux 5.15.0-91-generic x86_64)\r\n\r\n")
+                output.write("Last login: Mon Jan  6 14:32:18 2025 from 192.168.1.100\r\n")
+                output.write(session.prompt())
+                output.flush()
                 
                 # wait for cmd but do not execute them
                 server.event.wait(10)
                 
-                # fake res
-                fake_responses = {
-                    "ls": "Desktop  Documents  Downloads  Music  Pictures  Public  Templates  Videos",
-                    "whoami": "honeypot",
-                    "pwd": "/home/honeypot",
-                    "id": "uid=1000(honeypot) gid=1000(honeypot) groups=1000(honeypot),4(adm),24(cdrom),27(sudo),30(dip),46(plugdev),120(lpadmin),132(lxd),133(sambashare)",
-                    "uname -a": "Linux ubuntu 5.15.0-91-generic #101-Ubuntu SMP Tue Nov 14 13:30:08 UTC 2023 x86_64 x86_64 x86_64 GNU/Linux",
-                }
-                
                 # Keep session alive
-                timeout = 60  # 1 minute timeout
-                start_time = time.time()
+                deadline = time.monotonic() + SESSION_TIMEOUT
+                decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
                 
                 # Buffer for command input
                 command_buffer = ""
+                last_char = ""
+                commands_run = 0
+                session_open = True
 
-                # read command character by character
-                while time.time() - start_time < timeout:
-                    if channel.recv_ready():
-                        try:
-                            data = channel.recv(1).decode('utf-8', errors='ignore')
-                            
-                            if not data:
-                                break
+                # block until input arrives and handle the whole chunk at once
+                while session_open:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    
+                    try:
+                        channel.settimeout(remaining)
+                        data = channel.recv(RECV_CHUNK_SIZE)
+                    except socket.timeout:
+                        break
+                    except Exception as e:
+                        logger.debug(f"Error reading from channel: {e}")
+                        break
+                    
+                    # client disconnected
+                    if not data:
+                        break
+                    
+                    for char in decoder.decode(data):
+                        # a pasted CRLF is one Enter, not two
+                        if char == '\n' and last_char == '\r':
+                            last_char = char
+                            continue
+                        last_char = char
+                        
+                        # Handle Enter key (carriage return or newline)
+                        if char in '\r\n':
+                            command = command_buffer.strip()
+                            command_buffer = ""
                             
-                            char = data
+                            # Echo newline
+                            output.write("\r\n")
                             
-                            # Handle Enter key (carriage return or newline)
-                            if char in ['\r', '\n']:
-                                command = command_buffer.strip()
-                                command_buffer = ""
-                                
-                                # Echo newline
-                                channel.send("\r\n")
+                            if command:
+                                commands_run += 1
+                                logger.info(f"SSH Command received - IP: {client_ip}, Command: '{command}'",
+                                            extra={'ip': client_ip, 'command': command})
                                 
-                                if command:
-                                    logger.info(f"SSH Command received - IP: {client_ip}, Command: '{command}'",
-                                                extra={'ip': client_ip, 'command': command})
-                                    
-                                    # Handle exit commands
-                                    if command.lower() in ['exit', 'logout', 'quit']:
-                                        channel.send("logout\r\n")
-                                        break
-                                    
-                                    # Get response for command
-                                    cmd_lower = command.lower().split()[0] if command else ""
-                                    response = fake_responses.get(cmd_lower, f"bash: {command}: command not found")
-                                    channel.send(f"{response}\r\n")
-                                
-                                # Send new prompt
-                                channel.send("honeypot@ubuntu:~$ ")
-                            
-                            # Handle backspace
-                            elif char in ['\x7f', '\x08']:  # DEL or BS
-                                if command_buffer:
-                                    command_buffer = command_buffer[:-1]
-                                    # Erase character: backspace + space + backspace
-                                    channel.send('\x08 \x08')
-                            
-                            # Handle Ctrl+C
-                            elif char == '\x03':
-                                command_buffer = ""
-                                channel.send("^C\r\nhoneypot@ubuntu:~$ ")
-                            
-                            # Handle Ctrl+D (EOF)
-                            elif char == '\x04':
-                                if not command_buffer:
-                                    channel.send("logout\r\n")
+                                # Handle exit commands
+                                if command.lower() in ['exit', 'logout', 'quit']:
+                                    output.write("logout\r\n")
+                                    session_open = False
                                     break
+                                
+                                # Get response from the fake shell
+                                response = shell.run(session, command)
+                                if response:
+                                    output.write(response.replace("\n", "\r\n") + "\r\n")
                             
-                            # Regular character
-                            elif ord(char) >= 32 or char == '\t':  # Printable characters
-                                command_buffer += char
-                                channel.send(char)  # Echo the character
-                            
-                        except Exception as e:
-                            logger.debug(f"Error reading from channel: {e}")
-                            break
-                    
-                    # if client disconnected
-                    if not transport.is_active():
-                        break
-                    time.sleep(0.01)  # Small sleep to prevent busy waiting
+                            # Send new prompt
+                            output.write(session.prompt())
+                        
+                        # Handle backspace
+                        elif char in '\x7f\x08':  # DEL or BS
+                            if command_buffer:
+                                command_buffer = command_buffer[:-1]
+                                # Erase character: backspace + space + backspace
+                                output.write('\x08 \x08')
+                        
+                        # Handle Ctrl+C
+                        elif char == '\x03':
+                            command_buffer = ""
+                            output.write("^C\r\n" + session.prompt())
+                        
+                        # Handle Ctrl+D (EOF)
+                        elif char == '\x04':
+                            if not command_buffer:
+                                output.write("logout\r\n")
+                                session_open = False
+                                break
+                        
+                        # Regular character
+                        elif char >= ' ' or char == '\t':  # Printable characters
+                            command_buffer += char
+                            output.write(char)  # Echo the character
                     
+                    # one channel write for everything this chunk produced
+                    output.flush()
+                
+                if commands_run:
+                    logger.info(
+                        f"SSH Session ended - IP: {client_ip}, Commands: {commands_run}, "
+                        f"Writes: {output.writes} "
+                        f"({output.writes / commands_run:.1f} per command)",
+                        extra={'ip': client_ip, 'commands': commands_run,
+                               'writes': output.writes}
+                    )
                 channel.close()
         except paramiko.SSHException as e:
             logger.debug(f"SSH negotiation failed: {e}", extra=extra)
@@ -190,18 +353,160 @@ def handle_ssh_client(client_socket, client_address, args, logger, host_key):
     finally:
         client_socket.close()
 
+class SSHAdmissionControl:
+    """
+    Caps the number of concurrent SSH sessions and applies the overload
+    policy to connections that arrive while every worker is busy:
+      reject - close the socket right away
+      queue  - wait for a free worker, but drop it after queue_timeout
+      banner - send the SSH version banner, then drop
+    """
+    def __init__(self, max_sessions, policy, queue_timeout, logger):
+        self.max_sessions = max_sessions
+        self.policy = policy
+        self.queue_timeout = queue_timeout
+        self.logger = logger
+        
+        # only "queue" lets connections wait, and never more than one pool's worth
+        self.max_pending = max_sessions * 2 if policy == "queue" else max_sessions
+        
+        # daemon workers, started on demand, so shutdown never waits on a session
+        self.jobs = queue.SimpleQueue()
+        self.workers = 0
+        self.idle_workers = 0
+        
+        self.lock = threading.Lock()
+        self.in_flight = 0  # running + waiting for a worker
+        self.accepted = 0
+        self.queued = 0
+        self.shed = 0
+        self.last_overload_log = 0.0
+    
+    def stats(self):
+        with self.lock:
+            return {
+                'accepted': self.accepted,
+                'queued': self.queued,
+                'shed': self.shed,
+                'in_flight': self.in_flight,
+            }
+    
+    def submit(self, client_socket, client_address, handler, *handler_args):
+        with self.lock:
+            if self.in_flight < self.max_sessions:
+                enqueued_at = None
+            elif self.in_flight < self.max_pending:
+                enqueued_at = time.monotonic()
+                self.queued += 1
+            else:
+                enqueued_at = False
+                self.shed += 1
+            
+            if enqueued_at is not False:
+                self.in_flight += 1
+        
+        if enqueued_at is False:
+            self._shed(client_socket, client_address)
+            return False
+        
+        with self.lock:
+            spawn_worker = self.idle_workers == 0 and self.workers < self.max_sessions
+            if spawn_worker:
+                self.workers += 1
+                worker_id = self.workers
+        
+        self.jobs.put((client_socket, client_address, enqueued_at, handler, handler_args))
+        if spawn_worker:
+            threading.Thread(
+                target=self._worker,
+                daemon=True,
+                name=f"SSH-Worker-{worker_id}"
+            ).start()
+        return True
+    
+    def shutdown(self):
+        with self.lock:
+            workers = self.workers
+        for _ in range(workers):
+            self.jobs.put(None)
+    
+    def _worker(self):
+        while True:
+            with self.lock:
+                self.idle_workers += 1
+            job = self.jobs.get()
+            with self.lock:
+                self.idle_workers -= 1
+            
+            if job is None:
+                return
+            self._run(*job)
+    
+    def _run(self, client_socket, client_address, enqueued_at, handler, handler_args):
+        try:
+            if enqueued_at is not None and time.monotonic() - enqueued_at > self.queue_timeout:
+                with self.lock:
+                    self.shed += 1
+                self._shed(client_socket, client_address)
+                return
+            
+            with self.lock:
+                self.accepted += 1
+            handler(client_socket, client_address, *handler_args)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+    
+    def _shed(self, client_socket, client_address):
+        try:
+            if self.policy == "banner":
+                client_socket.settimeout(1)
+                client_socket.sendall(f"{DEFAULT_BANNER}\r\n".encode())
+        except OSError:
+            pass
+        finally:
+            client_socket.close()
+        
+        now = time.monotonic()
+        if now - self.last_overload_log >= OVERLOAD_LOG_INTERVAL:
+            self.last_overload_log = now
+            stats = self.stats()
+            self.logger.warning(
+                f"SSH overloaded, shedding connections (policy: {self.policy}) - "
+                f"last IP: {client_address[0]}, Accepted: {stats['accepted']}, "
+                f"Queued: {stats['queued']}, Shed: {stats['shed']}",
+                extra={'ip': client_address[0], **stats}
+            )
+
 def start_ssh_honeypot(args, logger):
-    # generate host key if not exists
-    import os
-    key_path = "ssh_host_key"
+    # host keys are loaded once and shared by every connection
+    host_keys = load_host_keys(
+        getattr(args, 'ssh_host_keys', DEFAULT_HOST_KEY_TYPES),
+        logger
+    )
+    
+    # the fake filesystem is built once and shared by every session
+    shell = CommandEngine()
     
-    if not os.path.exists(key_path):
-        from paramiko import RSAKey
-        key = RSAKey.generate(2048)
-        key.write_private_key_file(key_path)
-        logger.info(f"Generated new SSH host key: {key_path}")
+    max_sessions = getattr(args, 'ssh_max_sessions', DEFAULT_MAX_SESSIONS)
+    backlog = getattr(args, 'ssh_backlog', DEFAULT_BACKLOG)
+    admission = SSHAdmissionControl(
+        max_sessions,
+        getattr(args, 'ssh_overload', DEFAULT_OVERLOAD_POLICY),
+        getattr(args, 'ssh_queue_timeout', DEFAULT_QUEUE_TIMEOUT),
+        logger
+    )
     
-    host_key = paramiko.RSAKey(filename=key_path)
+    throttle = IPThrottle(
+        getattr(args, 'ssh_rate_limit', DEFAULT_RATE_LIMIT),
+        getattr(args, 'ssh_rate_burst', DEFAULT_RATE_BURST)
+    )
+    tarpit = Tarpit(
+        logger,
+        interval=TARPIT_INTERVAL,
+        max_clients=getattr(args, 'ssh_tarpit_max', DEFAULT_TARPIT_MAX),
+        name="SSH-Tarpit"
+    )
     
     # create socket
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -209,19 +514,24 @@ def start_ssh_honeypot(args, logger):
     
     try:
         server_socket.bind(('0.0.0.0', args.ssh_port))
-        server_socket.listen(5) #  max connections
+        server_socket.listen(backlog)
         
-        logger.info(f"SSH honeypot started on port {args.ssh_port}")
+        logger.info(f"SSH honeypot started on port {args.ssh_port} "
+                    f"(max sessions: {max_sessions}, backlog: {backlog})")
         
         while True:
             try:
                 client_socket, client_address = server_socket.accept()
-                client_thread = threading.Thread(
-                    target=handle_ssh_client,
-                    args=(client_socket, client_address, args, logger, host_key),
-                    daemon=True
-                )
-                client_thread.start()
+                
+                # sources hammering us get a slow-drip banner instead of a worker
+                if not throttle.allow(client_address[0]):
+                    if tarpit.park(client_socket, client_address):
+                        logger.info(f"SSH rate limit exceeded - IP: {client_address[0]}, sent to tarpit",
+                                    extra={'ip': client_address[0], 'port': client_address[1]})
+                    continue
+                
+                admission.submit(client_socket, client_address,
+                                 handle_ssh_client, args, logger, host_keys, shell)
                 
             except KeyboardInterrupt:
                 break
@@ -233,4 +543,10 @@ def start_ssh_honeypot(args, logger):
     
     finally:
         server_socket.close()
-        logger.info("SSH honeypot stopped")
\ No newline at end of file
+        admission.shutdown()
+        stats = admission.stats()
+        tarpit_stats = tarpit.stats()
+        logger.info(f"SSH honeypot stopped - Accepted: {stats['accepted']}, "
+                    f"Queued: {stats['queued']}, Shed: {stats['shed']}, "
+                    f"Tarpitted: {tarpit_stats['total_parked']} "
+                    f"({tarpit_stats['bytes_sent']} bytes sent)")
\ No newline at end of file
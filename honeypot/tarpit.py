@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Per-IP connection throttling and a shared tarpit
+abusive sources are parked in the tarpit, where one thread keeps every
+socket alive by dripping a few bytes at a time, so a parked connection
+costs a socket and a heap entry instead of a thread and a transport
+"""
+import heapq
+import os
+import selectors
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+
+class IPThrottle:
+    """
+    Token bucket per source IP, checked once per accepted connection
+    a denied connection leaves the bucket in debt (down to -burst), so
+    sources that keep hammering stay throttled for longer
+    """
+    def __init__(self, rate, burst, max_tracked=65536):
+        self.rate = rate
+        self.burst = burst
+        self.max_tracked = max_tracked
+        self.buckets = OrderedDict()  # ip -> [tokens, last refill]
+        self.lock = threading.Lock()
+
+    def allow(self, ip):
+        if self.rate <= 0:
+            return True
+
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(ip)
+            if bucket is None:
+                bucket = [self.burst, now]
+                self.buckets[ip] = bucket
+                if len(self.buckets) > self.max_tracked:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(ip)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return True
+            bucket[0] = max(-self.burst, bucket[0] - 1)
+            return False
+
+
+class Tarpit:
+    """
+    Holds sockets open and sends each one a short line every interval.
+    For SSH this is valid pre-banner data (RFC 4253 4.2), clients keep
+    waiting for a version string that never comes
+    """
+    def __init__(self, logger, interval=10.0, max_clients=4096, max_hold=3600, name="Tarpit"):
+        self.logger = logger
+        self.interval = interval
+        self.max_clients = max_clients
+        self.max_hold = max_hold
+        self.name = name
+
+        self.selector = selectors.DefaultSelector()
+        self.clients = {}  # client id -> [socket, ip, parked at, bytes sent]
+        self.schedule = []  # heap of (next drip time, client id)
+        self.next_id = 0
+        self.pending = []  # sockets handed over by other threads
+        self.lock = threading.Lock()
+        # written by park() so the loop adopts new sockets without waiting out select()
+        self.wakeup, self.waker = socket.socketpair()
+        self.wakeup.setblocking(False)
+        self.waker.setblocking(False)
+        self.selector.register(self.wakeup, selectors.EVENT_READ)
+
+        self.total_parked = 0
+        self.total_bytes = 0
+        self.thread = None
+
+    def park(self, client_socket, client_address):
+        with self.lock:
+            if len(self.clients) + len(self.pending) >= self.max_clients:
+                full = True
+            else:
+                full = False
+                self.pending.append((client_socket, client_address[0]))
+                self.total_parked += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True, name=self.name)
+                self.thread.start()
+
+        if full:
+            client_socket.close()
+            return False
+        try:
+            self.waker.send(b"\0")
+        except BlockingIOError:
+            pass  # the loop has wakeups pending already
+        return True
+
+    def stats(self):
+        with self.lock:
+            return {
+                'parked': len(self.clients) + len(self.pending),
+                'total_parked': self.total_parked,
+                'bytes_sent': self.total_bytes,
+            }
+
+    def _release(self, client_id, reason):
+        client_socket, ip, parked_at, sent = self.clients.pop(client_id)
+        self.selector.unregister(client_socket)
+        client_socket.close()
+        self.logger.info(
+            f"{self.name} released {ip} ({reason}) - Held: {time.monotonic() - parked_at:.0f}s, "
+            f"Bytes sent: {sent}",
+            extra={'ip': ip, 'held': time.monotonic() - parked_at, 'bytes': sent}
+        )
+
+    def _adopt_pending(self, now):
+        with self.lock:
+            pending, self.pending = self.pending, []
+        for client_socket, ip in pending:
+            # ids are never reused, unlike fds, so stale heap entries are harmless
+            self.next_id += 1
+            try:
+                client_socket.setblocking(False)
+                self.selector.register(client_socket, selectors.EVENT_READ, self.next_id)
+            except (OSError, ValueError):
+                client_socket.close()
+                continue
+            self.clients[self.next_id] = [client_socket, ip, now, 0]
+            heapq.heappush(self.schedule, (now + self.interval, self.next_id))
+
+    def _drip(self, client_id, now):
+        entry = self.clients[client_id]
+        if now - entry[2] >= self.max_hold:
+            self._release(client_id, "max hold time")
+            return
+
+        line = os.urandom(8).hex().encode() + b"\r\n"
+        try:
+            sent = entry[0].send(line)
+        except BlockingIOError:
+            # their receive window is full, even better
+            sent = 0
+        except OSError:
+            self._release(client_id, "connection lost")
+            return
+
+        entry[3] += sent
+        with self.lock:
+            self.total_bytes += sent
+        heapq.heappush(self.schedule, (now + self.interval, client_id))
+
+    def _run(self):
+        while True:
+            now = time.monotonic()
+            self._adopt_pending(now)
+
+            timeout = self.interval
+            if self.schedule:
+                timeout = max(0.0, min(timeout, self.schedule[0][0] - now))
+
+            for key, _ in self.selector.select(timeout):
+                if key.fileobj is self.wakeup:
+                    try:
+                        while self.wakeup.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+
+                client_id = key.data
+                try:
+                    # whatever they send is thrown away, b"" means they gave up
+                    if not key.fileobj.recv(4096):
+                        self._release(client_id, "client closed")
+                except BlockingIOError:
+                    pass
+                except OSError:
+                    self._release(client_id, "connection lost")
+
+            now = time.monotonic()
+            while self.schedule and self.schedule[0][0] <= now:
+                _, client_id = heapq.heappop(self.schedule)
+                if client_id in self.clients:
+                    self._drip(client_id, now)
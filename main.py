@@ -29,7 +29,7 @@ def main():
         args = cli_main()
         
         # logging setup
-        logger = setup_logging()
+        logger = setup_logging(json_log=args.json_log)
         
         threads = []
         
@@ -55,8 +55,11 @@ def main():
             )
             http_thread.start()
             threads.append(http_thread)
+            personas = [args.http_persona]
+            personas += [f"{name} on port {port}" for port, name in args.http_persona_ports]
+            personas += [f"{name} for {host}" for host, name in args.http_persona_hosts]
             logger.info(f"HTTP honeypot started on port {args.http_port} "
-                        f"(fake service: WordPress)")
+                        f"(personas: {', '.join(personas)})")
         
         # start mysql honeypot if requested
         if args.mysql: